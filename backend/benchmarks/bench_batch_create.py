@@ -0,0 +1,77 @@
+"""
+Compares per-item content creation with the bulk insert path.
+
+Usage:
+    python benchmarks/bench_batch_create.py --items 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Allow imports from the backend directory when run as a script
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+import crud, schemas
+from database import Base
+
+
+def make_items(template, count):
+    return [
+        schemas.ContentItemCreate(
+            title=f"Post {index}",
+            template_id=template.id,
+            values=[
+                schemas.ContentValueCreate(field_id=field.id, value=f"{field.name} {index}")
+                for field in template.fields
+            ],
+        )
+        for index in range(count)
+    ]
+
+
+async def run(item_count: int, field_count: int):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{directory}/bench.db")
+        SessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        async with SessionLocal() as db:
+            template = await crud.create_template(db, schemas.PageTemplateCreate(
+                name="Bench",
+                fields=[schemas.TemplateFieldCreate(name=f"Field {n}", data_type="Text") for n in range(field_count)],
+            ))
+            items = make_items(template, item_count)
+
+            start = time.perf_counter()
+            for item in items:
+                await crud.create_content_item(db, item)
+            per_item = time.perf_counter() - start
+
+            start = time.perf_counter()
+            await crud.create_content_items_bulk(db, items)
+            bulk = time.perf_counter() - start
+
+        await engine.dispose()
+
+    print(f"{item_count} items x {field_count} fields")
+    print(f"  per-item: {per_item:8.3f}s  {item_count / per_item:10.0f} items/s")
+    print(f"  bulk:     {bulk:8.3f}s  {item_count / bulk:10.0f} items/s")
+    print(f"  speedup:  {per_item / bulk:8.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--fields", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.items, args.fields))
+
+
+if __name__ == "__main__":
+    main()
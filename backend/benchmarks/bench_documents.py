@@ -0,0 +1,92 @@
+"""
+Compares reads served from the content documents read model with reads from the
+content tables.
+
+Seeds a throwaway database with the read model enabled, then measures the detail,
+list and (uncached) Markdown endpoints with the read model switched off and on.
+
+Usage:
+    python benchmarks/bench_documents.py --items 10000 --fields 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+
+async def run_benchmark(args):
+    # The application reads its configuration at import time, so point it at the
+    # benchmark database before importing anything from the backend.
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{args.database}"
+    os.environ["CONTENT_DOCUMENTS_ENABLED"] = "1"
+    from httpx import AsyncClient, ASGITransport
+
+    import config
+    from cache import render_cache
+    from database import Base, SessionLocal, engine, read_engine
+    from main import app
+    from run import measure
+    from seed import seed_dataset
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    seed_start = time.perf_counter()
+    await seed_dataset(SessionLocal, templates=3, fields=args.fields, items=args.items)
+    print(f"Seeded {args.items} items in {time.perf_counter() - seed_start:.1f}s", file=sys.stderr)
+
+    rng = random.Random(5)
+    results = {}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        async def detail(_):
+            response = await client.get(f"/api/v1/content/{rng.randint(1, args.items)}")
+            response.raise_for_status()
+
+        async def list_page(_):
+            response = await client.get("/api/v1/content/", params={"limit": 100, "skip": rng.randint(0, 100)})
+            response.raise_for_status()
+
+        async def markdown_cold(_):
+            render_cache.clear()
+            response = await client.get(f"/api/v1/content/{rng.randint(1, args.items)}/markdown")
+            response.raise_for_status()
+
+        for enabled in (False, True):
+            config.CONTENT_DOCUMENTS_ENABLED = enabled
+            label = "documents" if enabled else "tables"
+            for name, request in (("detail", detail), ("list", list_page), ("markdown_cold", markdown_cold)):
+                results[f"{name}_{label}"] = await measure(request, args.requests, args.concurrency)
+
+    await engine.dispose()
+    await read_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--fields", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        args.database = os.path.join(directory, "bench_documents.db")
+        results = asyncio.run(run_benchmark(args))
+
+    print(json.dumps(results, indent=2))
+    for name in ("detail", "list", "markdown_cold"):
+        tables, docs = results[f"{name}_tables"], results[f"{name}_documents"]
+        print(f"{name:>13}: p50 {tables['p50_ms']:.2f} -> {docs['p50_ms']:.2f} ms, "
+              f"{tables['ops_per_sec']:.0f} -> {docs['ops_per_sec']:.0f} ops/s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
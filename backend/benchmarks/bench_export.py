@@ -0,0 +1,106 @@
+"""
+Measures bulk export time against the number of render workers, and API latency
+while an export is running.
+
+For each worker count the whole site is exported as a tar archive (to nowhere)
+while a client keeps requesting content items through the ASGI app. With rendering
+in the pool, export time should fall as workers are added up to the core count,
+and the request latency should stay close to the idle figure.
+
+Usage:
+    python benchmarks/bench_export.py --items 20000 --workers 0 1 2 4
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+from run import measure, summarize
+
+
+async def run_benchmark(args):
+    # The application reads its configuration at import time, so point it at the
+    # benchmark database before importing anything from the backend.
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{args.database}"
+    from httpx import AsyncClient, ASGITransport
+
+    import export, render_pool
+    from database import Base, SessionLocal, engine, read_engine
+    from main import app
+    from seed import seed_dataset
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await seed_dataset(SessionLocal, templates=args.templates, fields=args.fields, items=args.items)
+    print(f"Seeded {args.items} items ({os.cpu_count()} CPUs)", file=sys.stderr)
+
+    rng = random.Random(1)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        async def detail(_):
+            response = await client.get(f"/api/v1/content/{rng.randint(1, args.items)}")
+            response.raise_for_status()
+
+        idle = await measure(detail, args.requests, 1)
+        print(f"{'idle':>11}: detail p50 {idle['p50_ms']} ms, p99 {idle['p99_ms']} ms", file=sys.stderr)
+
+        for workers in args.workers:
+            render_pool.render_executor.shutdown()
+            render_pool.render_executor = render_pool.RenderExecutor(workers)
+            done = asyncio.Event()
+
+            async def run_export():
+                try:
+                    async with SessionLocal() as db:
+                        async for _ in export.stream_site_archive(db, batch_size=args.batch_size):
+                            pass
+                finally:
+                    done.set()
+
+            async def detail_until_done():
+                latencies = []
+                while not done.is_set():
+                    request_start = time.perf_counter()
+                    await detail(None)
+                    latencies.append(time.perf_counter() - request_start)
+                return latencies
+
+            start = time.perf_counter()
+            export_task = asyncio.create_task(run_export())
+            latencies = await detail_until_done()
+            await export_task
+            latency = summarize(latencies, time.perf_counter() - start)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{workers:>3} workers: export {elapsed:.2f}s ({args.items / elapsed:.0f} items/s), "
+                f"detail p50 {latency['p50_ms']} ms, p99 {latency['p99_ms']} ms",
+                file=sys.stderr,
+            )
+
+    render_pool.render_executor.shutdown()
+    await engine.dispose()
+    await read_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--templates", type=int, default=3)
+    parser.add_argument("--fields", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=1000, help="Detail requests issued to measure idle latency.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        args.database = os.path.join(directory, "bench_export.db")
+        asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
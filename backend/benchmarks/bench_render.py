@@ -0,0 +1,62 @@
+"""
+Measures the per-item cost of rendering Markdown for a wide template.
+
+Compares rendering with a precompiled TemplateSchema (as the export and build use)
+against looking up each value's compiled field from the loaded TemplateField.
+
+Usage:
+    python benchmarks/bench_render.py --fields 50
+"""
+import argparse
+import copy
+import datetime
+import os
+import sys
+import timeit
+
+# Allow imports from the backend directory when run as a script
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import models, services
+from schema_cache import TemplateSchema
+
+DATA_TYPES = [("Text", "Some text"), ("Number", 42), ("Boolean", True), ("Tags", ["a", "b", "c"]),
+              ("URL", "https://example.com/page"), ("Date", "2024-01-02")]
+
+
+def make_item(field_count: int):
+    fields = [models.TemplateField(id=1, name="Body", data_type="Rich Text", required=True)]
+    for n in range(2, field_count + 1):
+        data_type = DATA_TYPES[n % len(DATA_TYPES)][0]
+        fields.append(models.TemplateField(id=n, name=f"Field {n}", data_type=data_type, required=True))
+    template = models.PageTemplate(id=1, name="Wide", fields=fields)
+
+    values = [models.ContentValue(field_id=1, value="Body " * 200, field=fields[0])]
+    for field in fields[1:]:
+        # Copy each value so that no two fields share a list, as when loaded from the database
+        value = copy.deepcopy(DATA_TYPES[field.id % len(DATA_TYPES)][1])
+        values.append(models.ContentValue(field_id=field.id, value=value, field=field))
+    item = models.ContentItem(id=1, title="Wide item", template_id=1,
+                              created_at=datetime.datetime(2024, 1, 1), values=values)
+    return template, item
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fields", type=int, default=50)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    template, item = make_item(args.fields)
+    schema = TemplateSchema.from_template(template, 0)
+
+    for label, render in [
+        ("compiled schema", lambda: services.generate_markdown_from_item(item, schema)),
+        ("field lookup", lambda: services.generate_markdown_from_item(item)),
+    ]:
+        best = min(timeit.repeat(render, number=args.number, repeat=5)) / args.number
+        print(f"{label:>16}: {best * 1e6:8.1f} us/item ({args.fields} fields)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Measures the storage used by delta-encoded revision history against naive full
+snapshots, and the cost of reconstructing a revision.
+
+Seeds a throwaway database, then updates every item repeatedly through
+crud.update_content_item, changing one field per update as an editor typically
+would. Naive storage is what storing the full item at every revision would take.
+
+Usage:
+    python benchmarks/bench_revisions.py --items 200 --updates 30 --fields 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+
+async def run_benchmark(args):
+    # The application reads its configuration at import time, so point it at the
+    # benchmark database before importing anything from the backend.
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{args.database}"
+    os.environ["REVISION_KEYFRAME_INTERVAL"] = str(args.keyframe_interval)
+    from sqlalchemy import func, select
+
+    import crud, models, revisions, schemas
+    from database import Base, SessionLocal, engine, read_engine
+    from seed import _value, seed_dataset
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    template_ids = await seed_dataset(SessionLocal, templates=1, fields=args.fields, items=args.items)
+
+    rng = random.Random(7)
+    async with SessionLocal() as db:
+        template = schemas.PageTemplate.model_validate(await crud.get_template(db, template_ids[0]))
+        start = time.perf_counter()
+        for _ in range(args.updates):
+            for item_id in range(1, args.items + 1):
+                item = await crud.get_content_item(db, item_id)
+                values = {value.field_id: value.value for value in item.values}
+                field = rng.choice(template.fields)
+                values[field.id] = _value(rng, field.data_type)
+                await crud.update_content_item(db, item_id, schemas.ContentItemUpdate(
+                    title=item.title,
+                    values=[schemas.ContentValueCreate(field_id=field_id, value=value) for field_id, value in values.items()],
+                ))
+        updates = args.items * args.updates
+        print(f"{updates} updates in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        delta_rows, delta_bytes = (await db.execute(
+            select(func.count(), func.sum(func.length(func.json(models.ContentRevision.data))))
+        )).one()
+
+        naive_bytes = 0
+        for item_id in range(1, args.items + 1):
+            state = None
+            for revision in await revisions.list_revisions(db, item_id):
+                state = await revisions.get_revision(db, item_id, revision["number"])
+                naive_bytes += len(json.dumps(revisions._keyframe_data(state), separators=(",", ":")))
+
+        latencies = []
+        for _ in range(args.lookups):
+            number = rng.randint(1, args.updates + 1)
+            lookup_start = time.perf_counter()
+            await revisions.get_revision(db, rng.randint(1, args.items), number)
+            latencies.append(time.perf_counter() - lookup_start)
+
+    print(f"revisions: {delta_rows} rows, keyframe every {revisions.KEYFRAME_INTERVAL}", file=sys.stderr)
+    print(f"    delta: {delta_bytes / 1024:.0f} KiB", file=sys.stderr)
+    print(f"    naive: {naive_bytes / 1024:.0f} KiB ({naive_bytes / delta_bytes:.1f}x)", file=sys.stderr)
+    print(
+        f"   lookup: p50 {statistics.median(latencies) * 1000:.2f} ms, "
+        f"max {max(latencies) * 1000:.2f} ms",
+        file=sys.stderr,
+    )
+
+    await engine.dispose()
+    await read_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=30, help="Updates per item.")
+    parser.add_argument("--fields", type=int, default=20)
+    parser.add_argument("--keyframe-interval", type=int, default=10)
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        args.database = os.path.join(directory, "bench_revisions.db")
+        asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
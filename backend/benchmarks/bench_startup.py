@@ -0,0 +1,97 @@
+"""
+Measures application startup: the time from launching a server process to its first
+successful response, and how much of it is spent importing the application.
+
+Each run starts `uvicorn main:app` against an already migrated throwaway database and
+polls GET /api/v1/templates/ until it answers. The disk cache is warm after the first
+run, so the median reflects an autoscaled worker starting on a host that has run the
+application before. Exits with status 1 if the median exceeds --target-ms.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 10 --target-ms 200
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import {}; print(time.perf_counter() - start)"
+# What any application on this stack imports; the rest of "import main" is our own
+FRAMEWORK_MODULES = "fastapi, sqlalchemy.ext.asyncio, aiosqlite"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_response(env: dict, timeout: float) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"The server exited with status {server.returncode}")
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            try:
+                connection.request("GET", "/api/v1/templates/")
+                if connection.getresponse().status == 200:
+                    return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.002)
+            finally:
+                connection.close()
+        raise RuntimeError(f"No response within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def import_time(env: dict, modules: str) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.format(modules)], cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--target-ms", type=float, default=200)
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds to wait for a server to answer.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(directory, 'bench_startup.db')}")
+        subprocess.run([sys.executable, "cli.py", "migrate"], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+
+        first_response = [time_to_first_response(env, args.timeout) for _ in range(args.runs)]
+        imports = [import_time(env, "main") for _ in range(args.runs)]
+        framework = [import_time(env, FRAMEWORK_MODULES) for _ in range(args.runs)]
+
+    median = statistics.median(first_response) * 1000
+    print(
+        f"first response: p50 {median:.0f} ms, min {min(first_response) * 1000:.0f} ms, "
+        f"max {max(first_response) * 1000:.0f} ms",
+        file=sys.stderr,
+    )
+    print(f"   import main: p50 {statistics.median(imports) * 1000:.0f} ms", file=sys.stderr)
+    print(f"     framework: p50 {statistics.median(framework) * 1000:.0f} ms ({FRAMEWORK_MODULES})", file=sys.stderr)
+    print(f"        target: {args.target_ms:.0f} ms ({'met' if median <= args.target_ms else 'missed'})", file=sys.stderr)
+    return 0 if median <= args.target_ms else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Measures API latency while a template change is carried over to a large template.
+
+Seeds a throwaway database with one template, measures item reads and updates on
+an idle server, then adds a field with a default and removes another, and measures
+the same requests while the background job backfills and cleans up every item.
+
+Usage:
+    python benchmarks/bench_template_change.py --items 100000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+
+async def run_benchmark(args):
+    # The application reads its configuration at import time, so point it at the
+    # benchmark database before importing anything from the backend.
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{args.database}"
+    os.environ["TEMPLATE_CHANGE_BATCH_SIZE"] = str(args.batch_size)
+    os.environ["TEMPLATE_CHANGE_DUTY_CYCLE"] = str(args.duty_cycle)
+    from httpx import AsyncClient, ASGITransport
+
+    import crud, schemas, template_changes
+    from database import Base, SessionLocal, engine, read_engine
+    from main import app
+    from run import measure
+    from seed import _value, seed_dataset
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    seed_start = time.perf_counter()
+    template_ids = await seed_dataset(SessionLocal, templates=1, fields=args.fields, items=args.items)
+    print(f"Seeded {args.items} items in {time.perf_counter() - seed_start:.1f}s", file=sys.stderr)
+    async with SessionLocal() as db:
+        template = schemas.PageTemplate.model_validate(await crud.get_template(db, template_ids[0]))
+
+    rng = random.Random(3)
+    results = {}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        async def read(_):
+            response = await client.get(f"/api/v1/content/{rng.randint(1, args.items)}")
+            response.raise_for_status()
+
+        async def update(_):
+            item_id = rng.randint(1, args.items)
+            item = (await client.get(f"/api/v1/content/{item_id}")).json()
+            values = {value["field_id"]: value["value"] for value in item["values"]}
+            field = rng.choice(template.fields[1:])
+            values[field.id] = _value(rng, field.data_type)
+            response = await client.put(f"/api/v1/content/{item_id}", json={
+                "title": item["title"],
+                "values": [{"field_id": field_id, "value": value} for field_id, value in values.items()],
+            })
+            response.raise_for_status()
+
+        results["idle_read"] = await measure(read, args.requests, args.concurrency)
+        results["idle_update"] = await measure(update, args.requests, args.concurrency)
+
+        response = await client.post(f"/api/v1/templates/{template.id}/changes", json={"operations": [
+            {"op": "add", "field": {"name": "Category", "data_type": "Text", "required": False}, "default": "News"},
+            {"op": "remove", "field_id": template.fields[-1].id},
+        ]})
+        response.raise_for_status()
+        change_id = response.json()["id"]
+        template.fields = template.fields[:-1]
+
+        job_start = time.perf_counter()
+        job = asyncio.create_task(template_changes.runner.run_pending())
+        reads, updates = [], []
+        while not job.done():
+            reads.append(await measure(read, args.requests, args.concurrency))
+            updates.append(await measure(update, args.requests, args.concurrency))
+        await job
+        job_seconds = time.perf_counter() - job_start
+        status = (await client.get(f"/api/v1/templates/{template.id}/changes/{change_id}")).json()
+
+    def worst(rounds):
+        return max(rounds, key=lambda summary: summary["p99_ms"])
+
+    results["during_read"] = worst(reads)
+    results["during_update"] = worst(updates)
+    results["job"] = {
+        "status": status["status"],
+        "items": status["processed"],
+        "seconds": round(job_seconds, 1),
+        "items_per_sec": round(status["processed"] / job_seconds, 1),
+    }
+    await engine.dispose()
+    await read_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--fields", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--duty-cycle", type=float, default=0.33)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per measurement round.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        args.database = os.path.join(directory, "bench_template_change.db")
+        results = asyncio.run(run_benchmark(args))
+
+    print(json.dumps(results, indent=2))
+    for request in ("read", "update"):
+        idle, during = results[f"idle_{request}"], results[f"during_{request}"]
+        print(
+            f"{request:>6}: p50 {idle['p50_ms']:.1f} -> {during['p50_ms']:.1f} ms, "
+            f"p99 {idle['p99_ms']:.1f} -> {during['p99_ms']:.1f} ms (worst round during the job)",
+            file=sys.stderr,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Runs the API and renderer benchmarks against a freshly seeded SQLite database.
+
+Requests go through the ASGI app in-process, so results reflect the application and
+database, not the network. Results are written as JSON and can be compared against a
+stored baseline, in which case the exit status is 1 if any benchmark regressed.
+
+Usage:
+    python benchmarks/run.py --items 10000 --output results.json
+    python benchmarks/run.py --items 10000 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "ops_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+    }
+
+
+async def measure(make_request, count: int, concurrency: int):
+    """
+    Issues `count` requests from `concurrency` concurrent workers and summarizes their latencies.
+    """
+    latencies = []
+    remaining = iter(range(count))
+
+    async def worker():
+        for index in remaining:
+            start = time.perf_counter()
+            await make_request(index)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def measure_sync(function, count: int):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(count):
+        call_start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - call_start)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def run_benchmarks(args):
+    # The application reads its configuration at import time, so point it at the
+    # benchmark database before importing anything from the backend.
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{args.database}"
+    from httpx import AsyncClient, ASGITransport
+
+    import crud, services
+    from cache import render_cache
+    from database import Base, SessionLocal, engine, read_engine
+    from main import app
+    from seed import make_item, seed_dataset
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    seed_start = time.perf_counter()
+    template_ids = await seed_dataset(SessionLocal, templates=args.templates, fields=args.fields, items=args.items)
+    print(f"Seeded {args.items} items in {time.perf_counter() - seed_start:.1f}s", file=sys.stderr)
+
+    async with SessionLocal() as db:
+        template = await crud.get_template(db, template_ids[0])
+
+    rng = random.Random(1)
+    results = {}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        async def create(_):
+            payload = make_item(rng, template, rng.randint(0, 10**9)).model_dump()
+            response = await client.post("/api/v1/content/", json=payload)
+            response.raise_for_status()
+
+        async def list_page(_):
+            response = await client.get("/api/v1/content/", params={"limit": 100})
+            response.raise_for_status()
+
+        async def list_large_page(_):
+            response = await client.get("/api/v1/content/", params={"limit": 1000})
+            response.raise_for_status()
+
+        async def list_ndjson(_):
+            params = {"limit": 5000}
+            response = await client.get("/api/v1/content/", params=params, headers={"Accept": "application/x-ndjson"})
+            response.raise_for_status()
+
+        async def detail(_):
+            response = await client.get(f"/api/v1/content/{rng.randint(1, args.items)}")
+            response.raise_for_status()
+
+        async def markdown_cold(_):
+            render_cache.clear()
+            response = await client.get(f"/api/v1/content/{rng.randint(1, args.items)}/markdown")
+            response.raise_for_status()
+
+        async def markdown_cached(_):
+            response = await client.get("/api/v1/content/1/markdown")
+            response.raise_for_status()
+
+        for name, make_request in [
+            ("create", create),
+            ("list", list_page),
+            ("list_large", list_large_page),
+            ("list_ndjson", list_ndjson),
+            ("detail", detail),
+            ("markdown", markdown_cold),
+            ("markdown_cached", markdown_cached),
+        ]:
+            results[name] = await measure(make_request, args.requests, args.concurrency)
+            print(f"{name:>16}: {results[name]}", file=sys.stderr)
+
+    async with SessionLocal() as db:
+        item = await crud.get_content_item_for_markdown(db, 1)
+    results["render"] = measure_sync(lambda: services.generate_markdown_from_item(item), args.requests * 10)
+    print(f"{'render':>16}: {results['render']}", file=sys.stderr)
+
+    await engine.dispose()
+    await read_engine.dispose()
+    return results
+
+
+# Relative change beyond which a benchmark counts as a regression.
+DEFAULT_TOLERANCE = 0.15
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """
+    Compares results with a baseline run. Returns the list of regressions found.
+    """
+    regressions = []
+    for name, current in results["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        throughput_change = current["ops_per_sec"] / previous["ops_per_sec"] - 1
+        p99_change = current["p99_ms"] / previous["p99_ms"] - 1 if previous["p99_ms"] else 0.0
+        flag = ""
+        if throughput_change < -tolerance or p99_change > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:>16}: ops/s {throughput_change:+7.1%}  p99 {p99_change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run API and renderer benchmarks.")
+    parser.add_argument("--items", type=int, default=10000, help="Number of content items to seed.")
+    parser.add_argument("--templates", type=int, default=3)
+    parser.add_argument("--fields", type=int, default=8, help="Fields per template.")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint benchmark.")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--output", "-o", help="Write results to this JSON file.")
+    parser.add_argument("--baseline", help="Compare results with this JSON file.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        args.database = os.path.join(directory, "bench.db")
+        started = time.time()
+        results = {
+            "meta": {
+                "started_at": started,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "items": args.items,
+                "templates": args.templates,
+                "fields": args.fields,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+            },
+            "results": asyncio.run(run_benchmarks(args)),
+        }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
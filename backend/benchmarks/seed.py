@@ -0,0 +1,72 @@
+"""
+Seeds a database with a synthetic dataset of templates, fields and content items.
+"""
+import random
+
+import crud, schemas
+
+DATA_TYPES = ["Text", "Number", "Boolean", "Tags", "URL"]
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua markdown template content field"
+).split()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _value(rng: random.Random, data_type: str):
+    if data_type == "Rich Text":
+        return "\n\n".join(_sentence(rng, 40) for _ in range(3))
+    if data_type == "Number":
+        return rng.randint(0, 10000)
+    if data_type == "Boolean":
+        return rng.random() < 0.5
+    if data_type == "Tags":
+        return rng.sample(WORDS, 3)
+    if data_type == "URL":
+        return f"https://example.com/{rng.choice(WORDS)}/{rng.randint(1, 1000)}"
+    return _sentence(rng, 6)
+
+
+def make_template(index: int, field_count: int) -> schemas.PageTemplateCreate:
+    """
+    Builds a template with one Rich Text body field and field_count - 1 other fields.
+    """
+    fields = [schemas.TemplateFieldCreate(name="Body", data_type="Rich Text")]
+    fields += [
+        schemas.TemplateFieldCreate(name=f"Field {n}", data_type=DATA_TYPES[n % len(DATA_TYPES)])
+        for n in range(1, field_count)
+    ]
+    return schemas.PageTemplateCreate(name=f"Template {index}", description="Synthetic", fields=fields)
+
+
+def make_item(rng: random.Random, template, index: int) -> schemas.ContentItemCreate:
+    return schemas.ContentItemCreate(
+        title=f"{_sentence(rng, 5)} {index}",
+        template_id=template.id,
+        values=[
+            schemas.ContentValueCreate(field_id=field.id, value=_value(rng, field.data_type))
+            for field in template.fields
+        ],
+    )
+
+
+async def seed_dataset(SessionLocal, templates: int = 3, fields: int = 8, items: int = 10000,
+                       batch_size: int = 2000, seed: int = 42):
+    """
+    Creates the templates and items through the bulk insert path. Returns the template IDs.
+    """
+    rng = random.Random(seed)
+    async with SessionLocal() as db:
+        template_ids = await crud.create_templates_bulk(db, [make_template(n, fields) for n in range(templates)])
+        # Plain copies, since every batch commit expires the loaded templates
+        loaded = [schemas.PageTemplate.model_validate(template)
+                  for template in (await crud.get_templates_by_ids(db, template_ids)).values()]
+
+        for start in range(0, items, batch_size):
+            batch = [make_item(rng, loaded[n % len(loaded)], n) for n in range(start, min(start + batch_size, items))]
+            await crud.create_content_items_bulk(db, batch)
+    return template_ids
@@ -0,0 +1,156 @@
+import dataclasses
+import hashlib
+import json
+import os
+from typing import Awaitable, Callable, Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud, frontmatter, models, render_pool, services
+from schema_cache import TemplateSchema
+
+MANIFEST_NAME = ".build-manifest.json"
+MANIFEST_VERSION = 1
+
+
+@dataclasses.dataclass
+class BuildResult:
+    written: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+
+
+def _digest(payload) -> str:
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def hash_template(template: models.PageTemplate) -> str:
+    """
+    Returns a content hash covering everything about a template that affects rendering.
+    """
+    fields = sorted((field.id, field.name, field.data_type, field.required) for field in template.fields)
+    return _digest([template.id, template.name, fields])
+
+
+def hash_item(item: models.ContentItem, template_hash: str) -> str:
+    """
+    Returns a content hash of an item's (or item snapshot's) title, date, values and the hash of its template.
+    """
+    values = sorted(([value.field_id, value.value] for value in item.values), key=lambda pair: pair[0])
+    return _digest([item.title, item.created_at.isoformat(), item.template_id, template_hash, values])
+
+
+def load_manifest(output_dir: str) -> dict:
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"version": MANIFEST_VERSION, "templates": {}, "items": {}}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "templates": {}, "items": {}}
+    return manifest
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as output:
+        output.write(data)
+    os.replace(temp_path, path)
+
+
+def _remove_file(output_dir: str, relative_path: str):
+    path = os.path.join(output_dir, relative_path)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return
+    # Prune the template directory once its last file is gone.
+    directory = os.path.dirname(path)
+    if directory != os.path.abspath(output_dir) and not os.listdir(directory):
+        os.rmdir(directory)
+
+
+async def build_site(db: AsyncSession, output_dir: str, force: bool = False, batch_size: int = 500,
+                     front_matter_format: str = "yaml",
+                     progress: Optional[Callable[[int], Awaitable[None]]] = None) -> BuildResult:
+    """
+    Materializes every content item as a Markdown file under output_dir, one directory per template.
+
+    A manifest of content hashes is kept alongside the output. Items whose hash and
+    path are unchanged since the previous build are skipped without rendering, and
+    files belonging to items that no longer exist are deleted. Passing force=True
+    re-renders every item but still cleans up orphaned files. Changing the front
+    matter format since the previous build also re-renders every item.
+
+    Items are read as plain snapshots. Changed items are rendered by the render
+    executor while the next batch is fetched and compared against the manifest.
+    `progress` is awaited with the number of items checked after every batch.
+    """
+    if front_matter_format not in frontmatter.FORMATS:
+        raise ValueError(f"Unsupported front matter format: {front_matter_format}")
+
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    previous_manifest = load_manifest(output_dir)
+    previous_items: Dict[str, dict] = previous_manifest["items"]
+    if previous_manifest.get("front_matter", "yaml") != front_matter_format:
+        force = True
+
+    templates = await crud.get_all_templates(db)
+    template_names = {template.id: template.name for template in templates}
+    template_hashes = {template.id: hash_template(template) for template in templates}
+    template_schemas = {template.id: TemplateSchema.from_template(template, 0) for template in templates}
+
+    result = BuildResult()
+    items_manifest = {}
+
+    async def changed_items():
+        # Yields the batch size and the (path, snapshot) pairs of its items that need rendering
+        async for items in render_pool.iter_snapshot_batches(db, batch_size=batch_size):
+            changed = []
+            for item in items:
+                key = str(item.id)
+                item_hash = hash_item(item, template_hashes[item.template_id])
+                path = services.markdown_path_for_item(item, template_names[item.template_id])
+                entry = previous_items.pop(key, None)
+
+                if not force and entry is not None and entry["hash"] == item_hash and entry["path"] == path \
+                        and os.path.exists(os.path.join(output_dir, path)):
+                    result.unchanged += 1
+                else:
+                    if entry is not None and entry["path"] != path:
+                        _remove_file(output_dir, entry["path"])
+                    changed.append((path, item))
+
+                items_manifest[key] = {"hash": item_hash, "path": path}
+            yield len(items), changed
+
+    async def render(batch):
+        snapshots = [snapshot for _, snapshot in batch[1]]
+        return await render_pool.render_executor.render_many(snapshots, template_schemas, front_matter_format)
+
+    checked = 0
+    async for (size, changed), rendered in render_pool.pipeline(changed_items(), render):
+        for (path, _), markdown in zip(changed, rendered):
+            _write_atomic(os.path.join(output_dir, path), markdown.encode("utf-8"))
+            result.written += 1
+        checked += size
+        if progress is not None:
+            await progress(checked)
+
+    # Anything left over in the previous manifest belongs to an item that was deleted.
+    for entry in previous_items.values():
+        _remove_file(output_dir, entry["path"])
+        result.deleted += 1
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "front_matter": front_matter_format,
+        "templates": {str(template_id): digest for template_id, digest in template_hashes.items()},
+        "items": items_manifest,
+    }
+    _write_atomic(os.path.join(output_dir, MANIFEST_NAME), json.dumps(manifest).encode("utf-8"))
+    return result
@@ -0,0 +1,215 @@
+import collections
+import datetime
+import hashlib
+import os
+import threading
+from typing import Optional
+
+import config, metrics
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def make_version_stamp(item_id: int, item_version: int, template_updated_at: Optional[datetime.datetime],
+                       front_matter_format: str = "yaml") -> str:
+    """
+    Returns an opaque stamp that changes whenever the item or its template changes.
+
+    `item_version` is the item's trigger-maintained version, which also moves for
+    writes that leave updated_at alone, such as direct SQL. The stamp doubles as the
+    ETag of the rendered Markdown, so it also differs between front matter formats.
+    """
+    raw = f"{item_id}:{item_version}:{(template_updated_at or EPOCH).isoformat()}"
+    if front_matter_format != "yaml":
+        raw = f"{raw}:{front_matter_format}"
+    return hashlib.sha1(raw.encode("ascii")).hexdigest()[:20]
+
+
+class LRURenderCache:
+    """
+    An in-process LRU cache of rendered Markdown, bounded by entry count and total size.
+
+    Entries are keyed by item ID and store the version stamp they were rendered at,
+    so a lookup with a newer stamp is a miss even before the entry is invalidated.
+    """
+
+    def __init__(self, max_entries: int = config.RENDER_CACHE_MAX_ENTRIES, max_bytes: int = config.RENDER_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, item_id: int, stamp: str, template_id: int) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(item_id)
+            if entry is None or entry[0] != stamp:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(item_id)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, item_id: int, stamp: str, template_id: int, markdown: str):
+        # The bound is on the UTF-8 size, as the entry would take on disk or the wire
+        size = len(markdown.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(item_id)
+            self._entries[item_id] = (stamp, template_id, markdown, size)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted[3]
+
+    def invalidate(self, item_id: int, template_id: int):
+        with self._lock:
+            self._pop(item_id)
+
+    def invalidate_template(self, template_id: int):
+        with self._lock:
+            stale = [item_id for item_id, entry in self._entries.items() if entry[1] == template_id]
+            for item_id in stale:
+                self._pop(item_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _pop(self, item_id: int):
+        entry = self._entries.pop(item_id, None)
+        if entry is not None:
+            self._size -= entry[3]
+
+
+class DiskRenderCache:
+    """
+    A render cache stored as one file per item, shareable between worker processes.
+
+    Files live under <directory>/<template_id>/<item_id>.md with the version stamp
+    on the first line, so a whole template can be invalidated by removing its directory.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _template_dir(self, template_id: int) -> str:
+        return os.path.join(self.directory, str(template_id))
+
+    def get(self, item_id: int, stamp: str, template_id: int) -> Optional[str]:
+        path = os.path.join(self._template_dir(template_id), f"{item_id}.md")
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as cached:
+                if cached.readline().rstrip("\n") == stamp:
+                    self.hits += 1
+                    return cached.read()
+        except FileNotFoundError:
+            pass
+        self.misses += 1
+        return None
+
+    def set(self, item_id: int, stamp: str, template_id: int, markdown: str):
+        template_dir = self._template_dir(template_id)
+        os.makedirs(template_dir, exist_ok=True)
+        path = os.path.join(template_dir, f"{item_id}.md")
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8", newline="") as cached:
+            cached.write(f"{stamp}\n{markdown}")
+        os.replace(temp_path, path)
+
+    def invalidate(self, item_id: int, template_id: int):
+        try:
+            os.remove(os.path.join(self._template_dir(template_id), f"{item_id}.md"))
+        except FileNotFoundError:
+            pass
+
+    def invalidate_template(self, template_id: int):
+        template_dir = self._template_dir(template_id)
+        if not os.path.isdir(template_dir):
+            return
+        for name in os.listdir(template_dir):
+            try:
+                os.remove(os.path.join(template_dir, name))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        for template_id in self._template_ids():
+            self.invalidate_template(template_id)
+
+    def _template_ids(self):
+        # Skips anything else found in the directory, such as files left by other tools
+        return [
+            int(name) for name in os.listdir(self.directory)
+            if name.isdigit() and os.path.isdir(os.path.join(self.directory, name))
+        ]
+
+
+class TieredRenderCache:
+    """
+    Combines the in-process LRU with a shared disk cache behind it.
+    """
+
+    def __init__(self, memory: LRURenderCache, disk: DiskRenderCache):
+        self.memory = memory
+        self.disk = disk
+
+    @property
+    def hits(self):
+        return self.memory.hits + self.disk.hits
+
+    @property
+    def misses(self):
+        return self.disk.misses
+
+    def get(self, item_id: int, stamp: str, template_id: int) -> Optional[str]:
+        markdown = self.memory.get(item_id, stamp, template_id)
+        if markdown is None:
+            markdown = self.disk.get(item_id, stamp, template_id)
+            if markdown is not None:
+                self.memory.set(item_id, stamp, template_id, markdown)
+        return markdown
+
+    def set(self, item_id: int, stamp: str, template_id: int, markdown: str):
+        self.memory.set(item_id, stamp, template_id, markdown)
+        self.disk.set(item_id, stamp, template_id, markdown)
+
+    def invalidate(self, item_id: int, template_id: int):
+        self.memory.invalidate(item_id, template_id)
+        self.disk.invalidate(item_id, template_id)
+
+    def invalidate_template(self, template_id: int):
+        self.memory.invalidate_template(template_id)
+        self.disk.invalidate_template(template_id)
+
+    def clear(self):
+        self.memory.clear()
+        self.disk.clear()
+
+
+def build_render_cache():
+    memory = LRURenderCache()
+    if config.RENDER_CACHE_DIR:
+        return TieredRenderCache(memory, DiskRenderCache(config.RENDER_CACHE_DIR))
+    return memory
+
+
+# The process-wide render cache used by the API.
+render_cache = build_render_cache()
+
+metrics.registry.register(metrics.CounterFunction(
+    "render_cache_hits_total", "Markdown served from the render cache.", lambda: render_cache.hits,
+))
+metrics.registry.register(metrics.CounterFunction(
+    "render_cache_misses_total", "Markdown not found in the render cache.", lambda: render_cache.misses,
+))
@@ -0,0 +1,118 @@
+"""
+Change feed of content items and templates.
+
+Writes in crud.py record a change event per created or updated entity in the same
+transaction as the change itself (a transactional outbox), so the feed never reports a
+change that was rolled back. Consumers read the feed from the last event ID they have
+seen, either by long-polling GET /changes or by registering a webhook (see webhooks.py).
+
+That cursor only misses nothing if events become visible in ID order. SQLite has a
+single writer, so they do. On PostgreSQL, IDs are taken before commit, so record()
+holds a transaction-level advisory lock from the insert to the commit, and a
+transaction cannot take event IDs while an earlier one is still uncommitted. Other
+databases give no such guarantee: an event from a slow transaction can become visible
+after a reader has already passed its ID.
+
+Waiting readers are woken by notify() after commits in this process. Writes made by
+other processes are picked up when a waiting reader polls again, at most
+CHANGES_POLL_INTERVAL seconds later.
+"""
+import asyncio
+import datetime
+from typing import Iterable, List, Set
+
+from sqlalchemy import func, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+import config, models
+
+CONTENT_ITEM = "content_item"
+TEMPLATE = "template"
+
+CREATED = "created"
+UPDATED = "updated"
+
+# Key of the PostgreSQL advisory lock that orders event-writing transactions.
+FEED_LOCK_KEY = 0x6a756c6573
+
+_waiters: Set[asyncio.Future] = set()
+
+
+async def record(db: AsyncSession, entity: str, action: str, entity_ids: Iterable[int]):
+    """
+    Records a change event per entity within the caller's transaction.
+
+    On PostgreSQL this serializes the caller's transaction with other event-writing
+    transactions until it commits, so commit it soon after.
+    """
+    now = datetime.datetime.utcnow()
+    rows = [
+        {"entity": entity, "entity_id": entity_id, "action": action, "created_at": now}
+        for entity_id in entity_ids
+    ]
+    if rows:
+        if db.get_bind().dialect.name == "postgresql":
+            await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": FEED_LOCK_KEY})
+        await db.execute(insert(models.ChangeEvent), rows)
+
+
+def notify():
+    """
+    Wakes readers waiting for changes. Call after committing a transaction that recorded events.
+    """
+    for waiter in _waiters:
+        if not waiter.done():
+            waiter.set_result(None)
+    _waiters.clear()
+
+
+async def wait(timeout: float) -> bool:
+    """
+    Waits up to `timeout` seconds for notify(). Returns True if it was called.
+    """
+    waiter = asyncio.get_running_loop().create_future()
+    _waiters.add(waiter)
+    try:
+        await asyncio.wait_for(waiter, timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        _waiters.discard(waiter)
+
+
+async def get_changes(db: AsyncSession, since: int = 0, limit: int = 100) -> List[models.ChangeEvent]:
+    """
+    Retrieves up to `limit` events after the event ID `since`, oldest first.
+    """
+    query = (
+        select(models.ChangeEvent)
+        .filter(models.ChangeEvent.id > since)
+        .order_by(models.ChangeEvent.id)
+        .limit(limit)
+    )
+    result = await db.execute(query)
+    return result.scalars().all()
+
+
+async def latest_event_id(db: AsyncSession) -> int:
+    return (await db.execute(select(func.max(models.ChangeEvent.id)))).scalar() or 0
+
+
+async def wait_for_changes(db: AsyncSession, since: int, limit: int, timeout: float) -> List[models.ChangeEvent]:
+    """
+    Retrieves events after `since`, waiting up to `timeout` seconds for one if there are none yet.
+
+    The session's connection is released while waiting, so idle long-polls do not hold
+    pooled connections.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        events = await get_changes(db, since, limit)
+        remaining = deadline - loop.time()
+        if events or remaining <= 0:
+            return events
+        await db.close()
+        await wait(min(remaining, config.CHANGES_POLL_INTERVAL))
@@ -0,0 +1,196 @@
+"""
+Command-line entry point for maintenance tasks that are too large for a single API request.
+
+Usage:
+    python cli.py migrate
+    python cli.py export --format tar --output site.tar
+    python cli.py build --output site/
+    python cli.py rebuild-search-index
+    python cli.py rebuild-documents
+    python cli.py check-documents --repair
+    python cli.py template-changes
+    python cli.py jobs
+    python cli.py import ./content --checkpoint import.json
+"""
+import argparse
+import asyncio
+import datetime
+import sys
+
+import build, config, documents, export, frontmatter, importer, jobs, migrations, search, template_changes
+from database import SessionLocal, engine
+
+
+async def run_migrate(args):
+    if args.status:
+        async with SessionLocal() as db:
+            version = await migrations.current_version(db)
+        print(f"Schema version {version}, latest {migrations.HEAD}")
+        return
+    applied = await migrations.migrate(
+        engine, target=args.to, progress=lambda step: print(f"Applying {step.version}: {step.name}")
+    )
+    if not applied:
+        print("The schema is up to date")
+    await engine.dispose()
+
+
+async def run_export(args):
+    async with SessionLocal() as db:
+        stream = export.stream_site_archive(
+            db,
+            archive_format=args.format,
+            template_id=args.template_id,
+            created_after=args.created_after,
+            created_before=args.created_before,
+            batch_size=args.batch_size,
+            front_matter_format=args.front_matter,
+        )
+        with open(args.output, "wb") as output:
+            async for chunk in stream:
+                output.write(chunk)
+
+
+async def run_build(args):
+    async with SessionLocal() as db:
+        result = await build.build_site(
+            db, args.output, force=args.force, batch_size=args.batch_size, front_matter_format=args.front_matter
+        )
+    print(f"{result.written} written, {result.unchanged} unchanged, {result.deleted} deleted")
+
+
+async def run_rebuild_search_index(args):
+    async with SessionLocal() as db:
+        indexed = await search.rebuild_index(db, batch_size=args.batch_size)
+    print(f"{indexed} items indexed")
+
+
+async def run_rebuild_documents(args):
+    async with SessionLocal() as db:
+        written = await documents.rebuild(db, batch_size=args.batch_size)
+    print(f"{written} documents written")
+
+
+async def run_check_documents(args):
+    async with SessionLocal() as db:
+        result = await documents.check(db, batch_size=args.batch_size, repair=args.repair)
+    print(
+        f"{result.checked} items checked: {len(result.missing)} missing or outdated, "
+        f"{len(result.mismatched)} mismatched, {len(result.orphaned)} orphaned documents"
+        + (" (repaired)" if args.repair and not result.ok else "")
+    )
+    for label, item_ids in (("missing", result.missing), ("mismatched", result.mismatched), ("orphaned", result.orphaned)):
+        if item_ids:
+            print(f"  {label}: {', '.join(map(str, item_ids[:20]))}{' ...' if len(item_ids) > 20 else ''}", file=sys.stderr)
+    if not result.ok and not args.repair:
+        sys.exit(1)
+
+
+async def run_template_changes(args):
+    runner = template_changes.TemplateChangeRunner(batch_size=args.batch_size, duty_cycle=args.duty_cycle)
+    count = await runner.run_pending()
+    print(f"{count} template changes run")
+
+
+async def run_jobs(args):
+    pool = jobs.JobPool(duty_cycle=args.duty_cycle)
+    count = await pool.run_pending()
+    print(f"{count} jobs run")
+
+
+async def run_import(args):
+    async with SessionLocal() as db:
+        result = await importer.import_directory(
+            db,
+            args.directory,
+            default_template=args.template,
+            checkpoint_path=args.checkpoint,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            progress=importer.print_progress,
+        )
+    print(
+        f"{result.imported} imported, {result.skipped} skipped, {result.failed} failed, "
+        f"{result.templates_created} templates and {result.fields_created} fields created"
+    )
+    for error in result.errors:
+        print(f"  {error['path']}: {error['error']}", file=sys.stderr)
+
+
+def _duty_cycle(value: str) -> float:
+    try:
+        return config.duty_cycle(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Blog Management System maintenance commands.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Create or upgrade the database schema.")
+    migrate_parser.add_argument("--to", type=int, default=None, help="Stop after this version (default: the latest).")
+    migrate_parser.add_argument("--status", action="store_true", help="Only print the current schema version.")
+    migrate_parser.set_defaults(handler=run_migrate)
+
+    export_parser = subparsers.add_parser("export", help="Export all content as a Markdown archive.")
+    export_parser.add_argument("--format", choices=sorted(export.ARCHIVE_FORMATS), default="tar")
+    export_parser.add_argument("--output", "-o", required=True, help="Path of the archive to write.")
+    export_parser.add_argument("--template-id", type=int, default=None)
+    export_parser.add_argument("--created-after", type=datetime.datetime.fromisoformat, default=None)
+    export_parser.add_argument("--created-before", type=datetime.datetime.fromisoformat, default=None)
+    export_parser.add_argument("--batch-size", type=int, default=500)
+    export_parser.add_argument("--front-matter", choices=frontmatter.FORMATS, default="yaml")
+    export_parser.set_defaults(handler=run_export)
+
+    build_site_parser = subparsers.add_parser("build", help="Incrementally build the site into a directory.")
+    build_site_parser.add_argument("--output", "-o", required=True, help="Directory to write Markdown files to.")
+    build_site_parser.add_argument("--force", action="store_true", help="Re-render every item.")
+    build_site_parser.add_argument("--batch-size", type=int, default=500)
+    build_site_parser.add_argument("--front-matter", choices=frontmatter.FORMATS, default="yaml")
+    build_site_parser.set_defaults(handler=run_build)
+
+    search_parser = subparsers.add_parser("rebuild-search-index", help="Rebuild the full-text search index.")
+    search_parser.add_argument("--batch-size", type=int, default=search.REBUILD_BATCH_SIZE)
+    search_parser.set_defaults(handler=run_rebuild_search_index)
+
+    documents_parser = subparsers.add_parser("rebuild-documents", help="Rebuild the content documents read model.")
+    documents_parser.add_argument("--batch-size", type=int, default=documents.REBUILD_BATCH_SIZE)
+    documents_parser.set_defaults(handler=run_rebuild_documents)
+
+    check_parser = subparsers.add_parser("check-documents", help="Compare content documents with the content tables.")
+    check_parser.add_argument("--batch-size", type=int, default=documents.REBUILD_BATCH_SIZE)
+    check_parser.add_argument("--repair", action="store_true", help="Rebuild wrong documents and delete orphaned ones.")
+    check_parser.set_defaults(handler=run_check_documents)
+
+    changes_parser = subparsers.add_parser("template-changes", help="Run queued and interrupted template changes.")
+    changes_parser.add_argument("--batch-size", type=int, default=config.TEMPLATE_CHANGE_BATCH_SIZE)
+    changes_parser.add_argument("--duty-cycle", type=_duty_cycle, default=config.TEMPLATE_CHANGE_DUTY_CYCLE,
+                                help="Largest share of time spent in batches; 1 runs them back to back.")
+    changes_parser.set_defaults(handler=run_template_changes)
+
+    jobs_parser = subparsers.add_parser("jobs", help="Run queued and interrupted jobs.")
+    jobs_parser.add_argument("--duty-cycle", type=_duty_cycle, default=config.JOB_DUTY_CYCLE,
+                             help="Largest share of time spent in batches; 1 runs them back to back.")
+    jobs_parser.set_defaults(handler=run_jobs)
+
+    import_parser = subparsers.add_parser("import", help="Import a directory of Markdown files.")
+    import_parser.add_argument("directory", help="Directory to import recursively.")
+    import_parser.add_argument("--template", default=None,
+                               help="Template for files without a 'template' front matter key; "
+                                    "defaults to the file's top-level directory.")
+    import_parser.add_argument("--checkpoint", default=None, help="File recording progress, to resume an import.")
+    import_parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count).")
+    import_parser.add_argument("--batch-size", type=int, default=importer.IMPORT_BATCH_SIZE)
+    import_parser.set_defaults(handler=run_import)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
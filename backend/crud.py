@@ -1,8 +1,15 @@
+import datetime
+from typing import List, Optional
+
+from sqlalchemy import func, insert, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.orm import selectinload
 
-import models, schemas
+import changes, documents, models, revisions, schemas, search
+from cache import render_cache
+from pagination import count_cache
+from schema_cache import schema_cache
 
 
 # --- Template CRUD Operations ---
@@ -11,7 +18,12 @@ async def get_template(db: AsyncSession, template_id: int):
     """
     Retrieves a single page template by its ID, including its associated fields.
     """
-    query = select(models.PageTemplate).filter(models.PageTemplate.id == template_id).options(selectinload(models.PageTemplate.fields))
+    query = (
+        select(models.PageTemplate)
+        .filter(models.PageTemplate.id == template_id)
+        .options(selectinload(models.PageTemplate.fields))
+        .execution_options(populate_existing=True)
+    )
     result = await db.execute(query)
     return result.scalar_one_or_none()
 
@@ -23,11 +35,113 @@ async def get_template_by_name(db: AsyncSession, name: str):
     result = await db.execute(query)
     return result.scalar_one_or_none()
 
-async def get_templates(db: AsyncSession, skip: int = 0, limit: int = 100):
+async def get_template_rows(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+    name_prefix: Optional[str] = None,
+) -> List[dict]:
+    """
+    Retrieves a list of page templates ordered by ID, including their fields.
+
+    Templates are returned as plain dicts shaped like schemas.PageTemplate, built
+    straight from column tuples, which is several times cheaper than loading ORM
+    objects and converting them to response models.
+
+    Pass the ID of the last template of the previous page as `after_id` to page with
+    a keyset instead of an offset.
+    """
+    query = _page_templates(
+        _filter_templates(select(models.PageTemplate.name, models.PageTemplate.description, models.PageTemplate.id), name_prefix),
+        skip, after_id,
+    ).limit(limit)
+    templates = [
+        {"name": name, "description": description, "id": template_id, "fields": []}
+        for name, description, template_id in await db.execute(query)
+    ]
+    if templates:
+        fields = {template["id"]: template["fields"] for template in templates}
+        field_rows = await db.execute(
+            select(
+                models.TemplateField.template_id,
+                models.TemplateField.name,
+                models.TemplateField.data_type,
+                models.TemplateField.required,
+                models.TemplateField.id,
+            )
+            .filter(models.TemplateField.template_id.in_(list(fields)), models.TemplateField.removed_at.is_(None))
+            .order_by(models.TemplateField.id)
+        )
+        for template_id, name, data_type, required, field_id in field_rows:
+            fields[template_id].append({"name": name, "data_type": data_type, "required": required, "id": field_id})
+    return templates
+
+async def iter_template_rows(
+    db: AsyncSession,
+    limit: int,
+    skip: int = 0,
+    after_id: Optional[int] = None,
+    name_prefix: Optional[str] = None,
+    chunk_size: int = 500,
+):
+    """
+    Yields a page of up to `limit` templates as lists of up to `chunk_size` rows, as
+    returned by get_template_rows. Chunks after the first are read with a keyset.
+    """
+    while limit > 0:
+        rows = await get_template_rows(db, skip, min(chunk_size, limit), after_id, name_prefix)
+        if rows:
+            yield rows
+        if len(rows) < min(chunk_size, limit):
+            return
+        limit -= len(rows)
+        skip, after_id = 0, rows[-1]["id"]
+
+async def get_template_page_end(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+    name_prefix: Optional[str] = None,
+) -> Optional[int]:
+    """
+    Returns the ID of the last template of a page if the page is full, without loading it.
+    """
+    query = _page_templates(_filter_templates(select(models.PageTemplate.id), name_prefix), skip + limit - 1, after_id)
+    if after_id is not None:
+        query = query.offset(limit - 1)
+    return (await db.execute(query.limit(1))).scalar()
+
+def _page_templates(query, skip: int, after_id: Optional[int]):
+    query = query.order_by(models.PageTemplate.id)
+    if after_id is not None:
+        return query.filter(models.PageTemplate.id > after_id)
+    return query.offset(skip)
+
+async def count_templates(db: AsyncSession, name_prefix: Optional[str] = None) -> int:
+    """
+    Counts page templates matching the filters, served from the count cache when possible.
+    """
+    async def load():
+        query = _filter_templates(select(func.count()).select_from(models.PageTemplate), name_prefix)
+        return (await db.execute(query)).scalar_one()
+    return await count_cache.get_or_load(models.PageTemplate.__tablename__, (name_prefix,), load)
+
+def _filter_templates(query, name_prefix: Optional[str]):
+    if name_prefix:
+        query = query.filter(*_prefix_range(models.PageTemplate.name, name_prefix))
+    return query
+
+def _prefix_range(column, prefix: str):
+    # A range comparison instead of LIKE so that the column's B-tree index is used
+    return column >= prefix, column < prefix + "\U0010ffff"
+
+async def get_all_templates(db: AsyncSession):
     """
-    Retrieves a list of page templates.
+    Retrieves every page template with its fields eagerly loaded.
     """
-    query = select(models.PageTemplate).offset(skip).limit(limit)
+    query = select(models.PageTemplate).order_by(models.PageTemplate.id).options(selectinload(models.PageTemplate.fields))
     result = await db.execute(query)
     return result.scalars().all()
 
@@ -39,19 +153,99 @@ async def create_template(db: AsyncSession, template: schemas.PageTemplateCreate
     db_template = models.PageTemplate(name=template.name, description=template.description)
     db.add(db_template)
 
-    # We need to commit here to get the db_template.id for the fields
-    await db.commit()
-    await db.refresh(db_template)
+    # Flush to get the db_template.id for the fields without ending the transaction
+    await db.flush()
+    template_id = db_template.id
 
     # Create and add the field instances
-    for field_data in template.fields:
-        db_field = models.TemplateField(**field_data.model_dump(), template_id=db_template.id)
-        db.add(db_field)
+    db.add_all(
+        models.TemplateField(**field_data.model_dump(), template_id=template_id)
+        for field_data in template.fields
+    )
+    await changes.record(db, changes.TEMPLATE, changes.CREATED, [template_id])
 
-    # Commit the fields
+    # Commit the template and its fields together, then reload it with its fields eagerly loaded
     await db.commit()
-    await db.refresh(db_template)
-    return db_template
+    changes.notify()
+    render_cache.invalidate_template(template_id)
+    schema_cache.invalidate(template_id)
+    count_cache.invalidate(models.PageTemplate.__tablename__)
+    return await get_template(db, template_id)
+
+async def create_templates_bulk(db: AsyncSession, templates: List[schemas.PageTemplateCreate]) -> List[int]:
+    """
+    Creates many page templates and their fields in a single transaction.
+
+    Templates are inserted with one multi-row INSERT ... RETURNING statement and all
+    fields with another. The input is expected to be validated already. Returns the
+    new template IDs in input order.
+    """
+    if not templates:
+        return []
+
+    result = await db.execute(
+        insert(models.PageTemplate).returning(models.PageTemplate.id, sort_by_parameter_order=True),
+        [{"name": template.name, "description": template.description} for template in templates],
+    )
+    template_ids = result.scalars().all()
+
+    field_rows = [
+        {**field_data.model_dump(), "template_id": template_id}
+        for template_id, template in zip(template_ids, templates)
+        for field_data in template.fields
+    ]
+    if field_rows:
+        await db.execute(insert(models.TemplateField), field_rows)
+    await changes.record(db, changes.TEMPLATE, changes.CREATED, template_ids)
+
+    await db.commit()
+    changes.notify()
+    for template_id in template_ids:
+        render_cache.invalidate_template(template_id)
+        schema_cache.invalidate(template_id)
+    count_cache.invalidate(models.PageTemplate.__tablename__)
+    return template_ids
+
+async def add_template_fields(db: AsyncSession, template_id: int, fields: List[schemas.TemplateFieldCreate]):
+    """
+    Adds fields to an existing template and marks the template as changed.
+    """
+    if not fields:
+        return
+    await db.execute(
+        insert(models.TemplateField),
+        [{**field_data.model_dump(), "template_id": template_id} for field_data in fields],
+    )
+    await db.execute(
+        update(models.PageTemplate)
+        .where(models.PageTemplate.id == template_id)
+        .values(updated_at=datetime.datetime.utcnow())
+    )
+    await changes.record(db, changes.TEMPLATE, changes.UPDATED, [template_id])
+    await db.commit()
+    changes.notify()
+    render_cache.invalidate_template(template_id)
+    schema_cache.invalidate(template_id)
+
+async def get_templates_by_ids(db: AsyncSession, template_ids):
+    """
+    Retrieves the given page templates with their fields, as a mapping keyed by ID.
+    """
+    query = (
+        select(models.PageTemplate)
+        .filter(models.PageTemplate.id.in_(set(template_ids)))
+        .options(selectinload(models.PageTemplate.fields))
+    )
+    result = await db.execute(query)
+    return {template.id: template for template in result.scalars().all()}
+
+async def get_existing_template_names(db: AsyncSession, names):
+    """
+    Returns the subset of the given template names that are already taken.
+    """
+    query = select(models.PageTemplate.name).filter(models.PageTemplate.name.in_(set(names)))
+    result = await db.execute(query)
+    return set(result.scalars().all())
 
 
 # --- Content CRUD Operations ---
@@ -60,17 +254,138 @@ async def get_content_item(db: AsyncSession, item_id: int):
     """
     Retrieves a single content item by its ID, including its values.
     """
-    query = select(models.ContentItem).filter(models.ContentItem.id == item_id).options(selectinload(models.ContentItem.values))
+    query = (
+        select(models.ContentItem)
+        .filter(models.ContentItem.id == item_id)
+        .options(selectinload(models.ContentItem.values))
+        .execution_options(populate_existing=True)
+    )
     result = await db.execute(query)
     return result.scalar_one_or_none()
 
-async def get_content_items(db: AsyncSession, skip: int = 0, limit: int = 100):
+async def get_content_item_rows(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = None,
+    template_id: Optional[int] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+    title_prefix: Optional[str] = None,
+) -> List[dict]:
     """
-    Retrieves a list of content items.
+    Retrieves a list of content items ordered by (created_at, id), including their values.
+
+    Items are returned as plain dicts shaped like schemas.ContentItem, built straight
+    from column tuples, which is several times cheaper than loading ORM objects and
+    converting them to response models.
+
+    Pass the (created_at, id) of the last item of the previous page as `after` to page
+    with a keyset instead of an offset, which costs the same at any depth.
     """
-    query = select(models.ContentItem).offset(skip).limit(limit)
-    result = await db.execute(query)
-    return result.scalars().all()
+    query = _page_content_items(
+        _filter_content_items(
+            select(models.ContentItem.title, models.ContentItem.template_id, models.ContentItem.id, models.ContentItem.created_at),
+            template_id, created_after, created_before, title_prefix,
+        ),
+        skip, after,
+    ).limit(limit)
+    items = [
+        {"title": title, "template_id": item_template_id, "id": item_id, "created_at": created_at, "values": []}
+        for title, item_template_id, item_id, created_at in await db.execute(query)
+    ]
+    if items:
+        values = {item["id"]: item["values"] for item in items}
+        value_rows = await db.execute(
+            select(models.ContentValue.item_id, models.ContentValue.field_id, models.ContentValue.value, models.ContentValue.id)
+            .filter(models.ContentValue.item_id.in_(list(values)))
+            .order_by(models.ContentValue.id)
+        )
+        for item_id, field_id, value, value_id in value_rows:
+            values[item_id].append({"field_id": field_id, "value": value, "id": value_id})
+    return items
+
+async def get_content_item_documents(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = None,
+    **filters,
+) -> List[tuple]:
+    """
+    Retrieves the same page as get_content_item_rows from the content documents read
+    model, as (created_at, id, document) tuples where document is the item's JSON.
+    """
+    query = _page_content_items(
+        _filter_content_items(select(models.ContentItem.created_at, models.ContentItem.id), **filters), skip, after,
+    ).limit(limit)
+    return await documents.get_page(db, query)
+
+async def iter_content_item_rows(db: AsyncSession, limit: int, skip: int = 0, after: Optional[tuple] = None,
+                                 chunk_size: int = 500, **filters):
+    """
+    Yields a page of up to `limit` content items as lists of up to `chunk_size` rows, as
+    returned by get_content_item_rows. Chunks after the first are read with a keyset.
+    """
+    while limit > 0:
+        rows = await get_content_item_rows(db, skip, min(chunk_size, limit), after, **filters)
+        if rows:
+            yield rows
+        if len(rows) < min(chunk_size, limit):
+            return
+        limit -= len(rows)
+        skip, after = 0, (rows[-1]["created_at"], rows[-1]["id"])
+
+async def get_content_page_end(db: AsyncSession, skip: int = 0, limit: int = 100, after: Optional[tuple] = None,
+                               **filters) -> Optional[tuple]:
+    """
+    Returns the (created_at, id) of the last content item of a page if the page is
+    full, without loading it. Only reads the keyset index.
+    """
+    query = _page_content_items(
+        _filter_content_items(select(models.ContentItem.created_at, models.ContentItem.id), **filters),
+        skip + limit - 1, after,
+    )
+    if after is not None:
+        query = query.offset(limit - 1)
+    row = (await db.execute(query.limit(1))).one_or_none()
+    return tuple(row) if row is not None else None
+
+def _page_content_items(query, skip: int, after: Optional[tuple]):
+    query = query.order_by(models.ContentItem.created_at, models.ContentItem.id)
+    if after is not None:
+        return query.filter(tuple_(models.ContentItem.created_at, models.ContentItem.id) > tuple_(*after))
+    return query.offset(skip)
+
+async def count_content_items(
+    db: AsyncSession,
+    template_id: Optional[int] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+    title_prefix: Optional[str] = None,
+) -> int:
+    """
+    Counts content items matching the filters, served from the count cache when possible.
+    """
+    async def load():
+        query = _filter_content_items(
+            select(func.count()).select_from(models.ContentItem),
+            template_id, created_after, created_before, title_prefix,
+        )
+        return (await db.execute(query)).scalar_one()
+    key = (template_id, created_after, created_before, title_prefix)
+    return await count_cache.get_or_load(models.ContentItem.__tablename__, key, load)
+
+def _filter_content_items(query, template_id=None, created_after=None, created_before=None, title_prefix=None):
+    if template_id is not None:
+        query = query.filter(models.ContentItem.template_id == template_id)
+    if created_after is not None:
+        query = query.filter(models.ContentItem.created_at >= created_after)
+    if created_before is not None:
+        query = query.filter(models.ContentItem.created_at < created_before)
+    if title_prefix:
+        query = query.filter(*_prefix_range(models.ContentItem.title, title_prefix))
+    return query
 
 async def create_content_item(db: AsyncSession, item: schemas.ContentItemCreate):
     """
@@ -79,18 +394,145 @@ async def create_content_item(db: AsyncSession, item: schemas.ContentItemCreate)
     db_item = models.ContentItem(title=item.title, template_id=item.template_id)
     db.add(db_item)
 
-    # Commit to get the db_item.id
-    await db.commit()
-    await db.refresh(db_item)
+    # Flush to get the db_item.id without ending the transaction
+    await db.flush()
+    item_id = db_item.id
 
     # Create and add the content values
-    for value_data in item.values:
-        db_value = models.ContentValue(**value_data.model_dump(), item_id=db_item.id)
-        db.add(db_value)
+    db.add_all(
+        models.ContentValue(**value_data.model_dump(), item_id=item_id)
+        for value_data in item.values
+    )
+    await db.flush()
+    await search.index_items(db, [item_id])
+    await documents.refresh(db, [item_id])
+    await revisions.record_created(db, {
+        item_id: revisions.RevisionState(item.title, {value.field_id: value.value for value in item.values})
+    })
+    await changes.record(db, changes.CONTENT_ITEM, changes.CREATED, [item_id])
+
+    await db.commit()
+    changes.notify()
+    render_cache.invalidate(item_id, item.template_id)
+    count_cache.invalidate(models.ContentItem.__tablename__)
+    return await get_content_item(db, item_id)
+
+async def update_content_item(db: AsyncSession, item_id: int, item: schemas.ContentItemUpdate):
+    """
+    Replaces a content item's title and values and records the change as a new revision.
+
+    Changed values are updated in place, new ones inserted and values of fields left
+    out of `item` deleted. Nothing is written if nothing changed. The input is expected
+    to be validated already. Returns None if the item does not exist.
+    """
+    db_item = await get_content_item(db, item_id)
+    if db_item is None:
+        return None
+
+    old = revisions.RevisionState.from_item(db_item)
+    requested = {value.field_id: value.value for value in item.values}
+    # Keep the stored field order: existing fields in place, new fields appended
+    new_values = {field_id: requested[field_id] for field_id in old.values if field_id in requested}
+    new_values.update((field_id, value) for field_id, value in requested.items() if field_id not in old.values)
+    if not await revisions.record_change(db, item_id, old, revisions.RevisionState(item.title, new_values)):
+        return db_item
+
+    db_item.title = item.title
+    for db_value in list(db_item.values):
+        if db_value.field_id not in new_values:
+            await db.delete(db_value)
+        elif not revisions.same_value(db_value.value, new_values[db_value.field_id]):
+            db_value.value = new_values[db_value.field_id]
+    db.add_all(
+        models.ContentValue(item_id=item_id, field_id=field_id, value=value)
+        for field_id, value in new_values.items() if field_id not in old.values
+    )
+    # A change to the values alone would not touch the item row
+    db_item.updated_at = datetime.datetime.utcnow()
+    await db.flush()
+    await search.index_items(db, [item_id])
+    await documents.refresh(db, [item_id])
+    await changes.record(db, changes.CONTENT_ITEM, changes.UPDATED, [item_id])
+    template_id = db_item.template_id
+
+    await db.commit()
+    changes.notify()
+    render_cache.invalidate(item_id, template_id)
+    count_cache.invalidate(models.ContentItem.__tablename__)
+    return await get_content_item(db, item_id)
+
+async def create_content_items_bulk(
+    db: AsyncSession,
+    items: List[schemas.ContentItemCreate],
+    created_at: Optional[List[Optional[datetime.datetime]]] = None,
+) -> List[int]:
+    """
+    Creates many content items and their values in a single transaction.
+
+    Items are inserted with one multi-row INSERT ... RETURNING statement and all
+    values with another. The input is expected to be validated already. Returns the
+    new item IDs in input order.
+
+    `created_at` optionally gives each item's creation date, e.g. when importing
+    existing content; items without one are stamped with the current time.
+    """
+    if not items:
+        return []
+
+    now = datetime.datetime.utcnow()
+    created_at = created_at or [None] * len(items)
+    result = await db.execute(
+        insert(models.ContentItem).returning(models.ContentItem.id, sort_by_parameter_order=True),
+        [
+            {"title": item.title, "template_id": item.template_id, "created_at": created or now, "updated_at": now}
+            for item, created in zip(items, created_at)
+        ],
+    )
+    item_ids = result.scalars().all()
+
+    value_rows = [
+        {"item_id": item_id, "field_id": value_data.field_id, "value": value_data.value}
+        for item_id, item in zip(item_ids, items)
+        for value_data in item.values
+    ]
+    if value_rows:
+        await db.execute(insert(models.ContentValue), value_rows)
+    await search.index_items(db, item_ids)
+    await documents.refresh(db, item_ids)
+    await revisions.record_created(db, {
+        item_id: revisions.RevisionState(item.title, {value.field_id: value.value for value in item.values})
+        for item_id, item in zip(item_ids, items)
+    }, now)
+    await changes.record(db, changes.CONTENT_ITEM, changes.CREATED, item_ids)
 
     await db.commit()
-    await db.refresh(db_item)
-    return db_item
+    changes.notify()
+    for item_id, item in zip(item_ids, items):
+        render_cache.invalidate(item_id, item.template_id)
+    count_cache.invalidate(models.ContentItem.__tablename__)
+    return item_ids
+
+async def get_content_item_version(db: AsyncSession, item_id: int):
+    """
+    Retrieves the template ID, creation and last-modified timestamps and version of a
+    content item, and the last-modified timestamp of its template.
+
+    This is a single indexed lookup, cheap enough to run before deciding whether a
+    rendered copy of the item can be reused. Returns None if the item does not exist.
+    """
+    query = (
+        select(
+            models.ContentItem.template_id,
+            models.ContentItem.created_at,
+            models.ContentItem.updated_at,
+            models.PageTemplate.updated_at,
+            models.ContentItem.version,
+        )
+        .join(models.PageTemplate, models.ContentItem.template_id == models.PageTemplate.id)
+        .filter(models.ContentItem.id == item_id)
+    )
+    result = await db.execute(query)
+    return result.one_or_none()
 
 async def get_content_item_for_markdown(db: AsyncSession, item_id: int):
     """
@@ -105,3 +547,77 @@ async def get_content_item_for_markdown(db: AsyncSession, item_id: int):
     )
     result = await db.execute(query)
     return result.scalar_one_or_none()
+
+async def iter_content_row_batches(
+    db: AsyncSession,
+    batch_size: int = 500,
+    template_id: Optional[int] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+):
+    """
+    Yields batches of content items, ordered by ID, as plain rows instead of ORM objects.
+
+    Each batch is a list of (id, title, template_id, created_at, values) tuples, where
+    values lists the item's (field_id, value) pairs in insertion order. Skipping ORM
+    object construction makes a batch several times cheaper to load, which keeps the
+    event loop free when the rows only feed the renderer.
+
+    Pages through the table with keyset pagination on the primary key, so every
+    batch costs the same regardless of how deep into the table it is.
+    """
+    last_id = 0
+    while True:
+        query = (
+            select(
+                models.ContentItem.id,
+                models.ContentItem.title,
+                models.ContentItem.template_id,
+                models.ContentItem.created_at,
+            )
+            .filter(models.ContentItem.id > last_id)
+            .order_by(models.ContentItem.id)
+            .limit(batch_size)
+        )
+        query = _filter_content_items(query, template_id, created_after, created_before, None)
+        items = (await db.execute(query)).all()
+        if not items:
+            return
+
+        values = {item.id: [] for item in items}
+        value_rows = await db.execute(
+            select(models.ContentValue.item_id, models.ContentValue.field_id, models.ContentValue.value)
+            .filter(models.ContentValue.item_id.in_(list(values)))
+            .order_by(models.ContentValue.id)
+        )
+        for item_id, field_id, value in value_rows:
+            values[item_id].append((field_id, value))
+
+        yield [(item.id, item.title, item.template_id, item.created_at, values[item.id]) for item in items]
+
+        last_id = items[-1].id
+
+async def iter_content_document_batches(
+    db: AsyncSession,
+    batch_size: int = 500,
+    template_id: Optional[int] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+):
+    """
+    Yields the same batches of items as iter_content_row_batches, as lists of JSON
+    documents from the content documents read model.
+    """
+    last_id = 0
+    while True:
+        query = (
+            select(models.ContentItem.created_at, models.ContentItem.id)
+            .filter(models.ContentItem.id > last_id)
+            .order_by(models.ContentItem.id)
+            .limit(batch_size)
+        )
+        page = await documents.get_page(db, _filter_content_items(query, template_id, created_after, created_before, None))
+        if not page:
+            return
+        yield [document for _, _, document in page]
+        last_id = page[-1][1]
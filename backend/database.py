@@ -1,13 +1,71 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 
-DATABASE_URL = "sqlite+aiosqlite:///./blog.db"
+import config
 
-# The connect_args is specific to SQLite to allow multi-threaded access.
-engine = create_async_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+DATABASE_URL = config.DATABASE_URL
+
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    database = make_url(url).database
+    return _is_sqlite(url) and database in (None, "", ":memory:")
+
+
+def apply_sqlite_pragmas(dbapi_connection):
+    """
+    Configures a new SQLite connection for concurrent use: WAL journaling lets readers
+    proceed while a write is in progress, and busy_timeout makes a blocked writer wait
+    instead of failing immediately.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(config.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA mmap_size={int(config.SQLITE_MMAP_SIZE)}")
+    cursor.execute(f"PRAGMA cache_size={int(config.SQLITE_CACHE_SIZE)}")
+    cursor.close()
+
+
+def create_engine_for_url(url: str, pool_size: int, max_overflow: int):
+    """
+    Creates an async engine with the configured pool, applying SQLite pragmas where relevant.
+    """
+    kwargs = {"echo": config.DATABASE_ECHO}
+    if _is_sqlite_memory(url):
+        # An in-memory database lives in a single connection, so it cannot be pooled
+        kwargs["connect_args"] = {"check_same_thread": False}
+    else:
+        kwargs.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=config.DB_POOL_TIMEOUT)
+        if _is_sqlite(url):
+            # The connect_args is specific to SQLite to allow multi-threaded access.
+            kwargs["connect_args"] = {"check_same_thread": False}
+        else:
+            kwargs["pool_pre_ping"] = True
+
+    engine = create_async_engine(url, **kwargs)
+    if _is_sqlite(url):
+        event.listen(engine.sync_engine, "connect", lambda dbapi_connection, _: apply_sqlite_pragmas(dbapi_connection))
+    return engine
+
+
+# The writer engine. On SQLite it holds a single connection so that writes are serialized.
+engine = create_engine_for_url(DATABASE_URL, config.DB_WRITE_POOL_SIZE, config.DB_WRITE_MAX_OVERFLOW)
+
+# The reader engine, used by endpoints that only read.
+if config.DATABASE_READ_URL == DATABASE_URL and _is_sqlite_memory(DATABASE_URL):
+    read_engine = engine
+else:
+    read_engine = create_engine_for_url(config.DATABASE_READ_URL, config.DB_READ_POOL_SIZE, config.DB_READ_MAX_OVERFLOW)
 
 # The async_sessionmaker provides a factory for creating new async sessions.
 SessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 # Base class for our declarative models.
 Base = declarative_base()
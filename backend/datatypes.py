@@ -0,0 +1,219 @@
+"""
+Registry of content data types.
+
+Each data type knows how to validate a stored value and how to present it in front
+matter. Template fields are compiled once into CompiledField objects that hold the
+resolved functions, so validating or rendering content never dispatches on the
+data type name.
+"""
+import dataclasses
+import datetime
+import functools
+import math
+import re
+import urllib.parse
+from typing import Any, Callable, Dict, Optional
+
+
+class InvalidValue(ValueError):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class DataType:
+    """
+    A data type. `validate` returns the value to store, None for a blank value, or
+    raises InvalidValue;
+    `serialize` converts a stored value for front matter (None means unchanged).
+    A body type is rendered as the Markdown content instead of front matter.
+    """
+    name: str
+    validate: Callable[[Any], Any]
+    serialize: Optional[Callable[[Any], Any]] = None
+    is_body: bool = False
+
+
+_registry: Dict[str, DataType] = {}
+
+
+def register_data_type(data_type: DataType):
+    """
+    Adds a data type to the registry, replacing any existing type of the same name.
+    Fields compiled before the call keep the previous definition.
+    """
+    _registry[data_type.name] = data_type
+
+
+def get_data_type(name: str) -> DataType:
+    """
+    Returns the registered data type, or one that accepts any value for unknown names.
+    """
+    data_type = _registry.get(name)
+    if data_type is None:
+        data_type = DataType(name=name, validate=_any)
+    return data_type
+
+
+def registered_data_types():
+    return sorted(_registry)
+
+
+# --- Validators ---
+
+def _any(value):
+    return value
+
+
+def _string(value):
+    if not isinstance(value, str):
+        raise InvalidValue("must be a string")
+    return value
+
+
+def _number(value):
+    if isinstance(value, str):
+        # HTML forms submit numbers as strings
+        try:
+            value = int(value)
+        except ValueError:
+            try:
+                value = float(value)
+            except ValueError:
+                raise InvalidValue("must be a number")
+            if not math.isfinite(value):
+                raise InvalidValue("must be a number")
+        return value
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise InvalidValue("must be a number")
+    return value
+
+
+def _boolean(value):
+    if not isinstance(value, bool):
+        raise InvalidValue("must be a boolean")
+    return value
+
+
+def _date(value):
+    if not isinstance(value, str):
+        raise InvalidValue("must be an ISO 8601 date")
+    try:
+        datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidValue("must be an ISO 8601 date")
+    return value
+
+
+def _string_list(value):
+    if not isinstance(value, list) or not all(isinstance(entry, str) for entry in value):
+        raise InvalidValue("must be a list of strings")
+    return value
+
+
+def _url(value):
+    _string(value)
+    parsed = urllib.parse.urlparse(value)
+    if not parsed.scheme or not (parsed.netloc or parsed.scheme == "mailto"):
+        raise InvalidValue("must be an absolute URL")
+    return value
+
+
+_EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def _email(value):
+    if not isinstance(value, str) or not _EMAIL_PATTERN.match(value):
+        raise InvalidValue("must be an email address")
+    return value
+
+
+def _blank_as_null(validate, value):
+    """
+    Stores a blank string, which is what an empty form input sends, as null for types
+    that have no empty value of their own. A required field then counts as missing.
+    """
+    if isinstance(value, str) and not value.strip():
+        return None
+    return validate(value)
+
+
+def _or_null(validate):
+    # A partial of module-level functions, so compiled fields can be sent to render workers
+    return functools.partial(_blank_as_null, validate)
+
+
+# --- Serializers ---
+
+def _number_for_front_matter(value):
+    # Whole numbers entered as "3.0" are written as 3
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _iso_date(value):
+    """
+    Writes a date in its canonical ISO 8601 form, e.g. "2024-05-01 12:00" as
+    "2024-05-01T12:00:00", keeping dates without a time as dates. Values stored before
+    dates were validated are written as they are.
+    """
+    if not isinstance(value, str):
+        return value
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        pass
+    try:
+        return datetime.datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        return value
+
+
+# Dates stay ISO 8601 strings in front matter, like the item's own date. "Date/DateTime"
+# and "Image" are the names the template editor in the frontend uses.
+for _data_type in [
+    DataType("Text", _string),
+    DataType("Rich Text", _string, is_body=True),
+    DataType("Code Block", _string),
+    DataType("Select", _string),
+    DataType("Number", _or_null(_number), serialize=_number_for_front_matter),
+    DataType("Boolean", _boolean),
+    DataType("Date", _or_null(_date), serialize=_iso_date),
+    DataType("DateTime", _or_null(_date), serialize=_iso_date),
+    DataType("Date/DateTime", _or_null(_date), serialize=_iso_date),
+    DataType("Tags", _or_null(_string_list)),
+    DataType("Multi-select", _or_null(_string_list)),
+    DataType("URL", _or_null(_url)),
+    # An image is referenced by a URL or a path within the site
+    DataType("Image", _or_null(_string)),
+    DataType("Email", _or_null(_email)),
+    DataType("JSON", _any),
+]:
+    register_data_type(_data_type)
+
+
+@dataclasses.dataclass(frozen=True)
+class CompiledField:
+    """
+    A template field bound to its data type's functions.
+    """
+    id: int
+    name: str
+    data_type: str
+    required: bool
+    validate: Callable[[Any], Any]
+    serialize: Optional[Callable[[Any], Any]]
+    is_body: bool
+
+
+def compile_field(field_id: int, name: str, data_type: str, required: bool = True) -> CompiledField:
+    resolved = get_data_type(data_type)
+    return CompiledField(
+        id=field_id,
+        name=name,
+        data_type=data_type,
+        required=bool(required),
+        validate=resolved.validate,
+        serialize=resolved.serialize,
+        is_body=resolved.is_body,
+    )
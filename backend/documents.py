@@ -0,0 +1,221 @@
+"""
+A read model of content items: each item and its values as one JSON document.
+
+Reading an item from the content tables takes a row per value, decoded and assembled
+into the response on every request. With CONTENT_DOCUMENTS_ENABLED, every write also
+stores the item's finished JSON in content_documents, in the same transaction, and
+item reads, list pages and rendering are served from it with one primary key lookup.
+
+A document records the `version` of the item it was built from, and reads only use
+documents whose item has not changed since. The database bumps an item's version on
+every write to the item or its values (see models.CONTENT_VERSION_TRIGGERS), so items
+written while the read model was off, or changed by hand, are read from the content
+tables as before until `python cli.py rebuild-documents` catches up;
+`python cli.py check-documents` reports documents that differ from the content tables.
+"""
+import dataclasses
+import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+import config, models, render_pool, serialization
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def is_enabled() -> bool:
+    return config.CONTENT_DOCUMENTS_ENABLED
+
+
+async def build_documents(db: AsyncSession, item_ids: Iterable[int]) -> Dict[int, Tuple[int, str]]:
+    """
+    Builds the documents of the given items from the content tables, as
+    {item_id: (version, document)}. Items that do not exist are left out.
+    """
+    query = (
+        select(
+            models.ContentItem.title,
+            models.ContentItem.template_id,
+            models.ContentItem.id,
+            models.ContentItem.created_at,
+            models.ContentItem.version,
+        )
+        .filter(models.ContentItem.id.in_(list(item_ids)))
+    )
+    items, versions = {}, {}
+    for title, template_id, item_id, created_at, version in await db.execute(query):
+        items[item_id] = {"title": title, "template_id": template_id, "id": item_id, "created_at": created_at, "values": []}
+        versions[item_id] = version
+    if not items:
+        return {}
+
+    value_rows = await db.execute(
+        select(models.ContentValue.item_id, models.ContentValue.field_id, models.ContentValue.value, models.ContentValue.id)
+        .filter(models.ContentValue.item_id.in_(list(items)))
+        .order_by(models.ContentValue.id)
+    )
+    for item_id, field_id, value, value_id in value_rows:
+        items[item_id]["values"].append({"field_id": field_id, "value": value, "id": value_id})
+    return {item_id: (versions[item_id], serialization.dumps(item).decode()) for item_id, item in items.items()}
+
+
+async def refresh(db: AsyncSession, item_ids: Iterable[int]):
+    """
+    Rebuilds the documents of the given items within the caller's transaction, after
+    their rows have been written. Does nothing unless the read model is enabled.
+    """
+    item_ids = list(item_ids)
+    if not item_ids or not is_enabled():
+        return
+    await _replace(db, item_ids, await build_documents(db, item_ids))
+
+
+async def _replace(db: AsyncSession, item_ids: List[int], built: Dict[int, Tuple[int, str]]):
+    await db.execute(delete(models.ContentDocument).where(models.ContentDocument.item_id.in_(item_ids)))
+    if built:
+        await db.execute(insert(models.ContentDocument), [
+            {"item_id": item_id, "version": version, "document": document}
+            for item_id, (version, document) in built.items()
+        ])
+
+
+def _current():
+    """
+    Selects documents together with their items, skipping documents the item has outgrown.
+    """
+    return and_(
+        models.ContentDocument.item_id == models.ContentItem.id,
+        models.ContentDocument.version == models.ContentItem.version,
+    )
+
+
+async def get_document(db: AsyncSession, item_id: int) -> Optional[bytes]:
+    """
+    Returns the item's current document as JSON, or None if it has none.
+    """
+    query = (
+        select(models.ContentDocument.document)
+        .join(models.ContentItem, _current())
+        .filter(models.ContentDocument.item_id == item_id)
+    )
+    document = (await db.execute(query)).scalar()
+    return document.encode() if document is not None else None
+
+
+def to_snapshot(document: bytes) -> "render_pool.ItemSnapshot":
+    """
+    Turns a document into an item snapshot for services.generate_markdown_from_item.
+    """
+    item = serialization.loads(document)
+    return render_pool.ItemSnapshot(
+        id=item["id"],
+        title=item["title"],
+        template_id=item["template_id"],
+        created_at=datetime.datetime.fromisoformat(item["created_at"]),
+        values=tuple(render_pool.ValueSnapshot(value["field_id"], value["value"]) for value in item["values"]),
+    )
+
+
+async def get_page(db: AsyncSession, page_query) -> List[Tuple[datetime.datetime, int, bytes]]:
+    """
+    Returns the (created_at, id, document) of every item of a page of content items.
+
+    `page_query` selects the page's ContentItem.created_at and ContentItem.id, with
+    its filters, order and limit applied. Items without a current document are built
+    from the content tables.
+    """
+    rows = (await db.execute(
+        page_query.add_columns(models.ContentDocument.document).outerjoin(models.ContentDocument, _current())
+    )).all()
+    missing = [item_id for _, item_id, document in rows if document is None]
+    built = await build_documents(db, missing) if missing else {}
+    return [
+        (created_at, item_id, (document if document is not None else built[item_id][1]).encode())
+        for created_at, item_id, document in rows
+    ]
+
+
+@dataclasses.dataclass
+class CheckResult:
+    checked: int = 0
+    # Items without a document, or whose document is older than the item
+    missing: List[int] = dataclasses.field(default_factory=list)
+    # Documents that are current by version but differ from the content tables
+    mismatched: List[int] = dataclasses.field(default_factory=list)
+    # Documents of items that no longer exist
+    orphaned: List[int] = dataclasses.field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not (self.missing or self.mismatched or self.orphaned)
+
+
+async def check(db: AsyncSession, batch_size: int = REBUILD_BATCH_SIZE, repair: bool = False) -> CheckResult:
+    """
+    Compares every document with the content tables. With `repair`, rebuilds the
+    documents found wrong and deletes orphaned ones, committing once per batch.
+    """
+    result = CheckResult()
+    last_id = 0
+    while True:
+        query = (
+            select(models.ContentItem.id, models.ContentDocument.version, models.ContentDocument.document)
+            .outerjoin(models.ContentDocument, models.ContentDocument.item_id == models.ContentItem.id)
+            .filter(models.ContentItem.id > last_id)
+            .order_by(models.ContentItem.id)
+            .limit(batch_size)
+        )
+        rows = (await db.execute(query)).all()
+        if not rows:
+            break
+        built = await build_documents(db, [item_id for item_id, _, _ in rows])
+        wrong = []
+        for item_id, version, document in rows:
+            expected_version, expected = built[item_id]
+            if document is None or version != expected_version:
+                result.missing.append(item_id)
+                wrong.append(item_id)
+            elif document != expected:
+                result.mismatched.append(item_id)
+                wrong.append(item_id)
+        if repair and wrong:
+            await _replace(db, wrong, {item_id: built[item_id] for item_id in wrong})
+            await db.commit()
+        result.checked += len(rows)
+        last_id = rows[-1][0]
+
+    orphans = select(models.ContentDocument.item_id).filter(
+        ~models.ContentDocument.item_id.in_(select(models.ContentItem.id))
+    )
+    result.orphaned = list((await db.execute(orphans)).scalars().all())
+    if repair and result.orphaned:
+        await db.execute(delete(models.ContentDocument).where(models.ContentDocument.item_id.in_(result.orphaned)))
+        await db.commit()
+    return result
+
+
+async def rebuild(db: AsyncSession, batch_size: int = REBUILD_BATCH_SIZE) -> int:
+    """
+    Re-creates every document from the content tables, committing once per batch so
+    that writers are not held up. Returns the number of documents written.
+    """
+    await db.execute(delete(models.ContentDocument))
+    await db.commit()
+    written, last_id = 0, 0
+    while True:
+        query = (
+            select(models.ContentItem.id)
+            .filter(models.ContentItem.id > last_id)
+            .order_by(models.ContentItem.id)
+            .limit(batch_size)
+        )
+        item_ids = (await db.execute(query)).scalars().all()
+        if not item_ids:
+            return written
+        await _replace(db, item_ids, await build_documents(db, item_ids))
+        await db.commit()
+        written += len(item_ids)
+        last_id = item_ids[-1]
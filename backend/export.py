@@ -0,0 +1,130 @@
+import datetime
+import io
+import tarfile
+import time
+import zipfile
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud, frontmatter, render_pool, services
+from schema_cache import TemplateSchema
+
+ARCHIVE_FORMATS = {
+    "tar": "application/x-tar",
+    "zip": "application/zip",
+}
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    A write-only, non-seekable file object that buffers written bytes until drained.
+
+    Both tarfile (in stream mode) and zipfile (with data descriptors) can write to it,
+    which lets us hand out the archive piece by piece instead of building it in memory.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class _TarWriter:
+    def __init__(self, sink):
+        self._archive = tarfile.open(fileobj=sink, mode="w|")
+
+    def add(self, path: str, data: bytes, mtime: float):
+        info = tarfile.TarInfo(name=path)
+        info.size = len(data)
+        info.mtime = mtime
+        self._archive.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self._archive.close()
+
+
+class _ZipWriter:
+    def __init__(self, sink):
+        self._archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED)
+
+    def add(self, path: str, data: bytes, mtime: float):
+        info = zipfile.ZipInfo(path, date_time=time.gmtime(mtime)[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        self._archive.writestr(info, data)
+
+    def close(self):
+        self._archive.close()
+
+
+async def stream_site_archive(
+    db: AsyncSession,
+    archive_format: str = "tar",
+    template_id: Optional[int] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+    batch_size: int = 500,
+    front_matter_format: str = "yaml",
+    progress: Optional[Callable[[int], Awaitable[None]]] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Renders every matching content item to Markdown and yields a tar or zip archive in chunks.
+
+    Items are read as plain snapshots, and each batch is rendered by the render executor
+    while the next batch is fetched, then written to the archive in order. At most two
+    batches of items and their rendered output are held in memory at a time. `progress`
+    is awaited with the number of items written after every batch.
+    """
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unsupported archive format: {archive_format}")
+    if front_matter_format not in frontmatter.FORMATS:
+        raise ValueError(f"Unsupported front matter format: {front_matter_format}")
+
+    templates = await crud.get_all_templates(db)
+    template_names = {template.id: template.name for template in templates}
+    template_schemas = {template.id: TemplateSchema.from_template(template, 0) for template in templates}
+    sink = _ChunkSink()
+    writer = _TarWriter(sink) if archive_format == "tar" else _ZipWriter(sink)
+
+    batches = render_pool.iter_snapshot_batches(
+        db,
+        batch_size=batch_size,
+        template_id=template_id,
+        created_after=created_after,
+        created_before=created_before,
+    )
+
+    async def render(items):
+        return await render_pool.render_executor.render_many(items, template_schemas, front_matter_format)
+
+    done = 0
+    async for items, rendered in render_pool.pipeline(batches, render):
+        for item, markdown in zip(items, rendered):
+            path = services.markdown_path_for_item(item, template_names[item.template_id])
+            mtime = item.created_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+            writer.add(path, markdown.encode("utf-8"), mtime)
+
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+        done += len(items)
+        if progress is not None:
+            await progress(done)
+
+    writer.close()
+    yield sink.drain()
@@ -0,0 +1,256 @@
+"""
+Front matter serialization for the Markdown generator.
+
+dump_yaml produces exactly what
+    yaml.dump(data, default_flow_style=False, sort_keys=False, allow_unicode=True)
+would, but writes simple entries (scalars and lists of scalars that need no escaping)
+directly. Other entries go through libyaml's C emitter when it is available and its
+output is known to match, and through the pure-Python emitter otherwise.
+"""
+import math
+import re
+
+FORMATS = ("yaml", "toml")
+
+DELIMITERS = {"yaml": "---", "toml": "+++"}
+
+
+class FrontMatterError(ValueError):
+    """
+    Raised for values that cannot be written in the requested front matter format.
+    """
+
+_DUMP_OPTIONS = dict(default_flow_style=False, sort_keys=False, allow_unicode=True)
+
+# yaml.dump folds plain scalars that run past this column.
+_BEST_WIDTH = 80
+
+# yaml.dump writes a key as a complex ("? ") key once the key plus its "!!str" tag
+# reaches 128 characters. libyaml counts bytes instead and leaves out the tag, so keys
+# it is given must stay under this in UTF-8 bytes for both to agree.
+_MAX_SIMPLE_KEY_LENGTH = 128 - len("!!str")
+
+_STR_TAG = "tag:yaml.org,2002:str"
+
+# PyYAML is a noticeable share of the application's import time and is only needed
+# once something is rendered, so _load_yaml imports it on first use.
+_yaml = None
+_resolver = None
+_ScalarNode = None
+
+# Strings made of these never need quoting in block context once they start with a
+# letter or digit. ': ' and ' #' are indicators, so ':' must be followed by something
+# other than a space and '#' must not follow one. Runs of spaces are left to the emitter.
+_PLAIN_SAFE = re.compile(r"[^\W_](?:[\w.,/()'\"+@!?&*%$=~;<>|`^\\\[\]{}-]|:(?=[^ ])|(?<! )#| (?! ))*")
+
+# Characters the emitters cannot write verbatim on a single line: control characters,
+# line breaks and the BOM. Any of them forces a double-quoted style.
+_NOT_PRINTABLE = re.compile(r"[^\x20-\x7e\xa0-\ud7ff\ue000-\ufffd\U00010000-\U0010fffe]|[\u2028\u2029\ufeff]")
+
+# libyaml also escapes characters outside the Basic Multilingual Plane.
+_C_NOT_PRINTABLE = re.compile(r"[^\x20-\x7e\xa0-\ud7ff\ue000-\ufffd]|[\u2028\u2029\ufeff]")
+
+
+def _load_yaml():
+    global _yaml, _resolver, _ScalarNode
+    if _yaml is None:
+        import yaml
+        from yaml.nodes import ScalarNode
+        from yaml.resolver import Resolver
+
+        _resolver, _ScalarNode = Resolver(), ScalarNode
+        _yaml = yaml
+    return _yaml
+
+
+def _implicit_tag(value: str) -> str:
+    # The tag of the type a plain scalar would be read back as
+    if _resolver is None:
+        _load_yaml()
+    return _resolver.resolve(_ScalarNode, value, (True, False))
+
+
+def _is_plain_string(value: str) -> bool:
+    """
+    Checks whether yaml.dump would write the string as an unquoted, single-line plain scalar.
+    """
+    return (
+        _PLAIN_SAFE.fullmatch(value) is not None
+        and not value.endswith(" ")
+        and _implicit_tag(value) == _STR_TAG
+    )
+
+
+def _simple_scalar(value):
+    """
+    Returns how yaml.dump writes a scalar that needs no escaping, or None if it needs the emitter.
+    """
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if type(value) is int:
+        return str(value)
+    if type(value) is str:
+        if _is_plain_string(value):
+            return value
+        # A printable single-line string that would read back as another type
+        # (a date, number or boolean) is always single-quoted.
+        if _is_printable(value) and _implicit_tag(value) != _STR_TAG:
+            return "'" + value.replace("'", "''") + "'"
+    return None
+
+
+def _fast_entry(key, value):
+    """
+    Emits one top-level mapping entry directly, or returns None if it is not a simple case.
+    """
+    if type(key) is not str or len(key) >= _MAX_SIMPLE_KEY_LENGTH or not _is_plain_string(key):
+        return None
+
+    if type(value) is list:
+        if not value:
+            return f"{key}: []\n"
+        lines = [f"{key}:\n"]
+        for entry in value:
+            scalar = _simple_scalar(entry)
+            if scalar is None or len(scalar) + 2 > _BEST_WIDTH:
+                return None
+            lines.append(f"- {scalar}\n")
+        return "".join(lines)
+
+    scalar = _simple_scalar(value)
+    if scalar is None or len(key) + 2 + len(scalar) > _BEST_WIDTH:
+        return None
+    return f"{key}: {scalar}\n"
+
+
+def _is_printable(text: str) -> bool:
+    return _NOT_PRINTABLE.search(text) is None
+
+
+def _c_emitter_matches(value) -> bool:
+    """
+    Checks whether libyaml's output for the value is known to match the pure-Python emitter.
+    The two differ in how they fold long double-quoted strings, in whether they escape
+    characters outside the BMP and in which mapping keys they accept as simple keys.
+    """
+    if isinstance(value, str):
+        return _C_NOT_PRINTABLE.search(value) is None
+    if isinstance(value, (list, tuple)):
+        return all(_c_emitter_matches(entry) for entry in value)
+    if isinstance(value, dict):
+        return all(
+            _c_emitter_matches(key)
+            and (not isinstance(key, str) or 0 < len(key.encode("utf-8")) < _MAX_SIMPLE_KEY_LENGTH)
+            and _c_emitter_matches(entry)
+            for key, entry in value.items()
+        )
+    return True
+
+
+def _dump_with_emitter(data) -> str:
+    yaml = _load_yaml()
+    c_dumper = getattr(yaml, "CDumper", None)
+    if c_dumper is not None and _c_emitter_matches(data):
+        return yaml.dump(data, Dumper=c_dumper, **_DUMP_OPTIONS)
+    return yaml.dump(data, **_DUMP_OPTIONS)
+
+
+def _has_shared_containers(data: dict) -> bool:
+    # yaml.dump writes an anchor and alias for a list or dict that appears twice
+    seen = set()
+    stack = list(data.values())
+    while stack:
+        value = stack.pop()
+        if isinstance(value, (list, dict)):
+            if id(value) in seen:
+                return True
+            seen.add(id(value))
+            stack.extend(value.values() if isinstance(value, dict) else value)
+    return False
+
+
+def dump_yaml(data: dict) -> str:
+    """
+    Serializes a front matter mapping to YAML, byte-identical to yaml.dump.
+    """
+    if not data or _has_shared_containers(data):
+        return _dump_with_emitter(data)
+
+    # Top-level entries of a block mapping are emitted independently of each other,
+    # so each one can take the fast path or fall back on its own.
+    parts = []
+    for key, value in data.items():
+        entry = _fast_entry(key, value)
+        if entry is None:
+            entry = _dump_with_emitter({key: value})
+        parts.append(entry)
+    return "".join(parts)
+
+
+# --- TOML ---
+
+_TOML_BARE_KEY = re.compile(r"[A-Za-z0-9_-]+")
+
+_TOML_ESCAPES = {'"': '\\"', "\\": "\\\\", "\b": "\\b", "\t": "\\t", "\n": "\\n", "\f": "\\f", "\r": "\\r"}
+
+
+def _toml_string(value: str) -> str:
+    escaped = []
+    for char in value:
+        if char in _TOML_ESCAPES:
+            escaped.append(_TOML_ESCAPES[char])
+        elif char < "\x20" or char == "\x7f":
+            escaped.append(f"\\u{ord(char):04X}")
+        else:
+            escaped.append(char)
+    return '"' + "".join(escaped) + '"'
+
+
+def _toml_key(key) -> str:
+    key = str(key)
+    return key if _TOML_BARE_KEY.fullmatch(key) else _toml_string(key)
+
+
+def _toml_value(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "nan"
+        if math.isinf(value):
+            return "inf" if value > 0 else "-inf"
+        return repr(value)
+    if isinstance(value, str):
+        return _toml_string(value)
+    if isinstance(value, (list, tuple)):
+        # Leaving a null out of a list would shift the entries after it
+        if any(entry is None for entry in value):
+            raise FrontMatterError("TOML cannot hold a list with null entries")
+        return "[" + ", ".join(_toml_value(entry) for entry in value) + "]"
+    if isinstance(value, dict):
+        entries = [f"{_toml_key(key)} = {_toml_value(entry)}" for key, entry in value.items() if entry is not None]
+        return "{ " + ", ".join(entries) + " }" if entries else "{}"
+    return _toml_string(str(value))
+
+
+def dump_toml(data: dict) -> str:
+    """
+    Serializes a front matter mapping to TOML. TOML has no null, so keys whose value is
+    None are left out. Raises FrontMatterError for lists with None entries.
+    """
+    return "".join(f"{_toml_key(key)} = {_toml_value(value)}\n" for key, value in data.items() if value is not None)
+
+
+def dump(data: dict, front_matter_format: str = "yaml") -> str:
+    """
+    Serializes front matter in the given format, without delimiters.
+    """
+    if front_matter_format == "toml":
+        return dump_toml(data)
+    return dump_yaml(data)
@@ -0,0 +1,358 @@
+import asyncio
+import concurrent.futures
+import dataclasses
+import datetime
+import json
+import os
+import sys
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import config, crud, schemas
+from schema_cache import schema_cache
+
+MARKDOWN_EXTENSIONS = (".md", ".markdown")
+
+# Front matter keys that map to content item columns rather than template fields.
+RESERVED_KEYS = {"title", "date", "template", "template_id"}
+
+# The field that holds the Markdown body when a template has to be created.
+BODY_FIELD_NAME = "Body"
+
+IMPORT_BATCH_SIZE = 1000
+
+# Files parsed per task sent to a worker process.
+PARSE_CHUNK_SIZE = 64
+
+
+@dataclasses.dataclass
+class ImportResult:
+    imported: int = 0
+    skipped: int = 0
+    failed: int = 0
+    templates_created: int = 0
+    fields_created: int = 0
+    errors: List[dict] = dataclasses.field(default_factory=list)
+
+
+def _to_json_value(value):
+    """
+    Converts YAML scalars that JSON cannot hold, such as dates, into strings.
+    """
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, list):
+        return [_to_json_value(entry) for entry in value]
+    if isinstance(value, dict):
+        return {str(key): _to_json_value(entry) for key, entry in value.items()}
+    return value
+
+
+def infer_data_type(value) -> str:
+    if isinstance(value, bool):
+        return "Boolean"
+    if isinstance(value, (int, float)):
+        return "Number"
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return "Date"
+    if isinstance(value, list):
+        return "Tags"
+    if isinstance(value, dict):
+        return "JSON"
+    return "Text"
+
+
+def parse_markdown_file(root: str, relative_path: str) -> dict:
+    """
+    Splits a Markdown file into its YAML front matter and body.
+
+    Runs in worker processes, so it only returns plain data.
+    """
+    # Imported here rather than at the top, where it would slow down application startup
+    import yaml
+
+    with open(os.path.join(root, relative_path), "r", encoding="utf-8") as markdown_file:
+        text = markdown_file.read()
+
+    front_matter, body = {}, text
+    if text.startswith("---\n"):
+        end = text.find("\n---\n", 3)
+        if end == -1:
+            raise ValueError("Unterminated front matter")
+        front_matter = yaml.safe_load(text[4:end + 1]) or {}
+        if not isinstance(front_matter, dict):
+            raise ValueError("Front matter is not a mapping")
+        # The generator separates front matter from the body with a blank line
+        body = text[end + 5:]
+        if body.startswith("\n"):
+            body = body[1:]
+
+    parts = relative_path.replace(os.sep, "/").split("/")
+    stem = os.path.splitext(os.path.basename(relative_path))[0]
+    date = front_matter.get("date")
+    if isinstance(date, str):
+        try:
+            date = datetime.datetime.fromisoformat(date)
+        except ValueError:
+            date = None
+    elif isinstance(date, datetime.date) and not isinstance(date, datetime.datetime):
+        date = datetime.datetime.combine(date, datetime.time())
+    elif not isinstance(date, datetime.datetime):
+        date = None
+    if date is not None and date.tzinfo is not None:
+        # Creation times are stored as naive UTC
+        date = date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+    template = front_matter.get("template")
+    if template is not None and not isinstance(template, str):
+        raise ValueError(f"The template must be a string, not {type(template).__name__}")
+
+    return {
+        "path": relative_path,
+        "title": str(front_matter.get("title") or stem),
+        "template": template,
+        "directory": parts[0] if len(parts) > 1 else None,
+        "created_at": date,
+        "fields": {
+            str(key): value for key, value in front_matter.items() if key not in RESERVED_KEYS
+        },
+        "body": body,
+    }
+
+
+def _parse_safely(root: str, relative_path: str) -> dict:
+    import yaml
+
+    try:
+        return parse_markdown_file(root, relative_path)
+    except (OSError, UnicodeDecodeError, ValueError, yaml.YAMLError) as error:
+        return {"path": relative_path, "error": str(error)}
+
+
+def _parse_chunk(root: str, relative_paths: List[str]) -> List[dict]:
+    return [_parse_safely(root, relative_path) for relative_path in relative_paths]
+
+
+async def _parse_batch(executor: concurrent.futures.Executor, root: str, relative_paths: List[str]) -> List[dict]:
+    """
+    Parses files in the worker processes without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    chunks = await asyncio.gather(*(
+        loop.run_in_executor(executor, _parse_chunk, root, relative_paths[start:start + PARSE_CHUNK_SIZE])
+        for start in range(0, len(relative_paths), PARSE_CHUNK_SIZE)
+    ))
+    return [document for chunk in chunks for document in chunk]
+
+
+def find_markdown_files(root: str) -> List[str]:
+    """
+    Returns the paths of all Markdown files under root, relative to it and sorted.
+    """
+    paths = []
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories[:] = sorted(name for name in subdirectories if not name.startswith("."))
+        for filename in filenames:
+            if filename.lower().endswith(MARKDOWN_EXTENSIONS):
+                paths.append(os.path.relpath(os.path.join(directory, filename), root))
+    return sorted(paths)
+
+
+class Checkpoint:
+    """
+    Records which files have been imported, so an interrupted import can resume.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.completed = set()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as checkpoint_file:
+                self.completed = set(json.load(checkpoint_file)["completed"])
+
+    def save(self, paths):
+        self.completed.update(paths)
+        if not self.path:
+            return
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as checkpoint_file:
+            json.dump({"completed": sorted(self.completed)}, checkpoint_file)
+        os.replace(temp_path, self.path)
+
+
+class _TemplateResolver:
+    """
+    Maps template names and front matter keys to template and field IDs, creating
+    whatever is missing. New fields are optional so existing content stays valid.
+    """
+
+    def __init__(self, db: AsyncSession, result: ImportResult):
+        self.db = db
+        self.result = result
+        self.templates: Dict[str, dict] = {}
+
+    async def load(self):
+        for template in await crud.get_all_templates(self.db):
+            self.templates[template.name] = self._describe(template)
+
+    @staticmethod
+    def _describe(template):
+        body_field = next((field for field in template.fields if field.data_type == "Rich Text"), None)
+        return {
+            "id": template.id,
+            "body_field": body_field.id if body_field is not None else None,
+            "body_name": body_field.name if body_field is not None else BODY_FIELD_NAME,
+            "fields": {field.name: field.id for field in template.fields if field is not body_field},
+        }
+
+    def body_field_name(self, template_name: str) -> str:
+        """
+        Returns the name of the field that holds the body of a template's items.
+        """
+        template = self.templates.get(template_name)
+        return template["body_name"] if template is not None else BODY_FIELD_NAME
+
+    async def resolve(self, documents: List[dict]):
+        """
+        Ensures every template and field referenced by the documents exists.
+        """
+        wanted: Dict[str, Dict[str, str]] = {}
+        for document in documents:
+            fields = wanted.setdefault(document["template"], {})
+            for name, value in document["fields"].items():
+                fields.setdefault(name, infer_data_type(value))
+
+        for name, fields in wanted.items():
+            template = self.templates.get(name)
+            if template is None:
+                created = await crud.create_template(self.db, schemas.PageTemplateCreate(
+                    name=name,
+                    fields=[schemas.TemplateFieldCreate(name=BODY_FIELD_NAME, data_type="Rich Text", required=False)] + [
+                        schemas.TemplateFieldCreate(name=field_name, data_type=data_type, required=False)
+                        for field_name, data_type in fields.items()
+                    ],
+                ))
+                self.templates[name] = self._describe(created)
+                self.result.templates_created += 1
+                self.result.fields_created += len(created.fields)
+                continue
+
+            missing = [
+                schemas.TemplateFieldCreate(name=field_name, data_type=data_type, required=False)
+                for field_name, data_type in fields.items() if field_name not in template["fields"]
+            ]
+            if template["body_field"] is None:
+                missing.append(schemas.TemplateFieldCreate(name=BODY_FIELD_NAME, data_type="Rich Text", required=False))
+            if missing:
+                await crud.add_template_fields(self.db, template["id"], missing)
+                self.templates[name] = self._describe(await crud.get_template(self.db, template["id"]))
+                self.result.fields_created += len(missing)
+
+    def to_item(self, document: dict) -> schemas.ContentItemCreate:
+        template = self.templates[document["template"]]
+        values = [schemas.ContentValueCreate(field_id=template["body_field"], value=document["body"])]
+        values += [
+            schemas.ContentValueCreate(field_id=template["fields"][name], value=_to_json_value(value))
+            for name, value in document["fields"].items()
+        ]
+        return schemas.ContentItemCreate(title=document["title"], template_id=template["id"], values=values)
+
+
+async def import_directory(
+    db: AsyncSession,
+    root: str,
+    default_template: Optional[str] = None,
+    checkpoint_path: Optional[str] = None,
+    workers: Optional[int] = None,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+    max_errors: int = config.IMPORT_MAX_ERRORS,
+) -> ImportResult:
+    """
+    Imports every Markdown file under root as a content item.
+
+    Files are parsed in a process pool and inserted in batches, one transaction per
+    batch. Each file's template is taken from its `template` front matter key, then
+    `default_template`, then its top-level directory; missing templates and fields
+    are created. Each item is validated against its template like one created through
+    the API, and a file that fails is counted in `failed`; the first `max_errors` of
+    them are listed in `errors`. Completed files are recorded in the checkpoint file
+    after every batch, and files already listed there are skipped. `progress` is
+    awaited with the number of files done and the total after every batch.
+    """
+    root = os.path.abspath(root)
+    result = ImportResult()
+    checkpoint = Checkpoint(checkpoint_path)
+    paths = [path for path in find_markdown_files(root) if path not in checkpoint.completed]
+    result.skipped = len(checkpoint.completed)
+    total = len(paths)
+
+    resolver = _TemplateResolver(db, result)
+    await resolver.load()
+
+    def fail(document: dict):
+        result.failed += 1
+        if len(result.errors) < max_errors:
+            result.errors.append(document)
+
+    done = 0
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    try:
+        for start in range(0, total, batch_size):
+            batch_paths = paths[start:start + batch_size]
+            parsed = await _parse_batch(executor, root, batch_paths)
+
+            documents = []
+            for document in parsed:
+                if "error" not in document:
+                    document["template"] = document["template"] or default_template or document["directory"]
+                    if not document["template"]:
+                        document = {"path": document["path"], "error": "No template could be determined"}
+                    elif resolver.body_field_name(document["template"]) in document["fields"]:
+                        body_name = resolver.body_field_name(document["template"])
+                        document = {
+                            "path": document["path"],
+                            "error": f"Front matter key {body_name!r} clashes with the body field",
+                        }
+                if "error" in document:
+                    fail(document)
+                    continue
+                documents.append(document)
+
+            await resolver.resolve(documents)
+            items = [resolver.to_item(document) for document in documents]
+            templates = await schema_cache.get_many(db, {item.template_id for item in items})
+            valid = []
+            for document, item in zip(documents, items):
+                errors = templates[item.template_id].validate(item.values)
+                if errors:
+                    fail({"path": document["path"], "error": "; ".join(errors)})
+                else:
+                    valid.append((document, item))
+
+            await crud.create_content_items_bulk(
+                db,
+                [item for _, item in valid],
+                created_at=[document["created_at"] for document, _ in valid],
+            )
+            result.imported += len(valid)
+            checkpoint.save(document["path"] for document, _ in valid)
+
+            # A batch without importable files leaves the transaction the template
+            # lookups began open; ending it hands the connection back to the pool,
+            # where `progress` may need it on a single-connection writer pool
+            await db.commit()
+
+            done += len(batch_paths)
+            if progress is not None:
+                await progress(done, total)
+    finally:
+        # Does not wait for the worker processes, which would block the event loop
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return result
+
+
+async def print_progress(done: int, total: int):
+    print(f"\rImported {done}/{total} files", end="" if done < total else "\n", file=sys.stderr, flush=True)
@@ -0,0 +1,119 @@
+import collections
+import contextvars
+import time
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import config, metrics
+
+# Number of slowest statements kept per request, and of recent requests kept for the debug endpoint.
+SLOWEST_STATEMENTS = 5
+RECENT_REQUESTS = 100
+
+DEBUG_ENDPOINTS_ENABLED = config.DEBUG_ENDPOINTS
+
+
+class QueryStats:
+    """
+    Collects the number and duration of SQL statements executed while handling one request.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest = []
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.total_time += duration
+        if len(self.slowest) < SLOWEST_STATEMENTS or duration > self.slowest[-1][0]:
+            self.slowest.append((duration, statement))
+            self.slowest.sort(key=lambda entry: entry[0], reverse=True)
+            del self.slowest[SLOWEST_STATEMENTS:]
+
+    def as_dict(self):
+        return {
+            "query_count": self.count,
+            "db_time_ms": round(self.total_time * 1000, 3),
+            "slowest": [
+                {"duration_ms": round(duration * 1000, 3), "statement": statement}
+                for duration, statement in self.slowest
+            ],
+        }
+
+
+_current_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_stats", default=None)
+
+# Stats of the most recent requests, newest last.
+recent_requests = collections.deque(maxlen=RECENT_REQUESTS)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start_times"].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+def route_name(request: Request) -> str:
+    """
+    Returns the path template of the route that handled the request, e.g.
+    /api/v1/content/{item_id}, so that metrics are not labelled per item.
+    """
+    route_path = getattr(request.scope.get("route"), "path", None)
+    if route_path is None:
+        return "unmatched"
+    # Routes of included routers may know their path without the router's prefix;
+    # the prefix is the leading part of the request path that the route did not match.
+    path = request.url.path
+    depth = path.count("/") - route_path.count("/")
+    if depth <= 0:
+        return route_path
+    return "/".join(path.split("/")[:depth + 1]) + route_path
+
+
+async def query_stats_middleware(request: Request, call_next):
+    """
+    Counts the SQL statements of each request and reports them in response headers,
+    and records the request's latency and SQL time in the metrics.
+    """
+    start = time.perf_counter()
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        _current_stats.reset(token)
+
+    response.headers["X-DB-Query-Count"] = str(stats.count)
+    response.headers["X-DB-Time-Ms"] = f"{stats.total_time * 1000:.3f}"
+    recent_requests.append({"method": request.method, "path": request.url.path, **stats.as_dict()})
+    if metrics.is_enabled():
+        response.body_iterator = _record_after_body(response.body_iterator, request, response.status_code, stats, start)
+    return response
+
+
+async def _record_after_body(body, request: Request, status_code: int, stats: QueryStats, start: float):
+    # Streamed responses (NDJSON, exports) keep running queries until the last chunk
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        route = route_name(request)
+        metrics.request_seconds.observe(time.perf_counter() - start, request.method, route)
+        metrics.requests_total.inc(1, request.method, route, str(status_code))
+        metrics.request_db_seconds.observe(stats.total_time, request.method, route)
+        metrics.request_db_queries_total.inc(stats.count, request.method, route)
@@ -0,0 +1,660 @@
+"""
+Long-running operations run as persistent background jobs.
+
+Exports, imports and static-site builds take longer than a request should. submit()
+stores a job in the jobs table and returns at once; the job pool runs queued jobs on
+the event loop, JOB_WORKERS at a time, the highest priority first and the oldest first
+within a priority:
+
+- a job reports its progress after every batch, as `progress` out of `total`,
+- a queued job can be cancelled before it starts, and a running one between batches,
+- a job whose process stopped is started again. A pool claims a job under its
+  worker ID and refreshes the job's heartbeat while it runs; a running job whose
+  heartbeat is older than JOB_HEARTBEAT_TIMEOUT is queued again by any pool, and a
+  pool that is stopped queues its own jobs again. Imports resume from their
+  checkpoint; exports and builds start over, builds still skipping the items
+  unchanged since the last completed build. A job is given up on after
+  JOB_MAX_ATTEMPTS.
+
+Heavy operations on the content tables share HEAVY_OPERATION_SLOTS admission slots,
+so that no more than that many run at once next to interactive API traffic. This
+covers jobs, streamed exports and the batches of template changes. Jobs also pause
+after every batch in proportion to the time it took (see JOB_DUTY_CYCLE), and give
+up their slot while they pause. submit() refuses new jobs while JOB_MAX_QUEUED are
+waiting.
+"""
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import datetime
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Type
+
+import pydantic
+from sqlalchemy import func, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+import build, config, crud, export, frontmatter, importer, models, schemas
+from database import ReadSessionLocal, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobError(ValueError):
+    """
+    Raised for jobs that cannot be submitted or run; `status_code` is the HTTP status
+    the API answers with.
+    """
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class AdmissionControl:
+    """
+    Bounds the number of heavy operations running at once. Operations that wait for a
+    slot get one in the order they asked for it.
+    """
+
+    def __init__(self, slots: int = config.HEAVY_OPERATION_SLOTS):
+        self.slots = slots
+        self.in_use = 0
+        self._waiters = collections.deque()
+
+    def try_acquire(self) -> bool:
+        """
+        Takes a slot if one is free and nobody is waiting for one.
+        """
+        if self.in_use >= self.slots or self._waiters:
+            return False
+        self.in_use += 1
+        return True
+
+    async def acquire(self):
+        if self.try_acquire():
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before the cancellation; pass it on
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot over to the next waiter
+                waiter.set_result(None)
+                return
+        self.in_use -= 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+# The process-wide admission control of heavy operations.
+admission = AdmissionControl()
+
+
+# --- Job types ---
+
+@dataclasses.dataclass(frozen=True)
+class JobType:
+    name: str
+    params: Type[pydantic.BaseModel]
+    run: Callable[["JobContext", pydantic.BaseModel], Awaitable[dict]]
+    # Validates the parameters when the job is submitted, raising JobError
+    check: Optional[Callable[[pydantic.BaseModel], object]] = None
+    # Heavy jobs need an admission slot to run
+    heavy: bool = True
+
+
+JOB_TYPES: Dict[str, JobType] = {}
+
+
+def job_type(name: str, params: Type[pydantic.BaseModel], check=None, heavy: bool = True):
+    """
+    Registers the decorated coroutine as the job type `name`. It is called with a
+    JobContext and the job's parameters, and returns the job's result as a dict.
+    """
+    def register(run):
+        JOB_TYPES[name] = JobType(name, params, run, check, heavy)
+        return run
+    return register
+
+
+def _check_export(params: schemas.ExportJobParams):
+    if params.format not in export.ARCHIVE_FORMATS:
+        raise JobError(f"Unsupported archive format: {params.format}")
+    if params.front_matter not in frontmatter.FORMATS:
+        raise JobError(f"Unsupported front matter format: {params.front_matter}")
+
+
+def export_path(job: models.Job) -> Optional[str]:
+    """
+    Returns the path of a completed export job's archive.
+    """
+    if job.type != "export" or job.status != COMPLETED or not job.result:
+        return None
+    return os.path.join(config.JOB_OUTPUT_DIR, str(job.id), job.result["file"])
+
+
+@job_type("export", schemas.ExportJobParams, check=_check_export)
+async def _run_export(context: "JobContext", params: schemas.ExportJobParams) -> dict:
+    _check_export(params)
+    os.makedirs(context.output_dir, exist_ok=True)
+    path = os.path.join(context.output_dir, f"site.{params.format}")
+    temp_path = f"{path}.tmp"
+    async with context.read_session_factory() as db:
+        filters = {
+            "template_id": params.template_id,
+            "created_after": params.created_after,
+            "created_before": params.created_before,
+        }
+        total = await crud.count_content_items(db, **filters)
+        stream = export.stream_site_archive(
+            db,
+            archive_format=params.format,
+            front_matter_format=params.front_matter,
+            progress=lambda done: context.progress(done, total),
+            **filters,
+        )
+        try:
+            with open(temp_path, "wb") as output:
+                async for chunk in stream:
+                    output.write(chunk)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temp_path)
+            raise
+    os.replace(temp_path, path)
+    return {"file": os.path.basename(path), "size": os.path.getsize(path), "items": total}
+
+
+def _import_paths(params: schemas.ImportJobParams):
+    """
+    Resolves the source directory and checkpoint file of an import against IMPORT_ROOT.
+    """
+    if not config.IMPORT_ROOT:
+        raise JobError("Imports are disabled; set IMPORT_ROOT to enable them", status_code=403)
+    import_root = os.path.realpath(config.IMPORT_ROOT)
+    source = os.path.realpath(os.path.join(import_root, params.path))
+    checkpoint = os.path.realpath(os.path.join(import_root, params.checkpoint)) if params.checkpoint else None
+    for path in filter(None, [source, checkpoint]):
+        if os.path.commonpath([import_root, path]) != import_root:
+            raise JobError("Path must be inside IMPORT_ROOT")
+    if not os.path.isdir(source):
+        raise JobError("Import directory not found", status_code=404)
+    return source, checkpoint
+
+
+@job_type("import", schemas.ImportJobParams, check=_import_paths)
+async def _run_import(context: "JobContext", params: schemas.ImportJobParams) -> dict:
+    source, checkpoint = _import_paths(params)
+    if checkpoint is None:
+        # A restarted import skips the files imported before it was interrupted
+        os.makedirs(context.output_dir, exist_ok=True)
+        checkpoint = os.path.join(context.output_dir, "import-checkpoint.json")
+    async with context.session_factory() as db:
+        result = await importer.import_directory(
+            db, source, default_template=params.template, checkpoint_path=checkpoint,
+            workers=config.IMPORT_WORKERS, progress=context.progress,
+        )
+    return dataclasses.asdict(result)
+
+
+def _build_output(params: schemas.BuildJobParams) -> str:
+    """
+    Resolves the output directory of a build against BUILD_ROOT.
+    """
+    if not config.BUILD_ROOT:
+        raise JobError("Builds are disabled; set BUILD_ROOT to enable them", status_code=403)
+    if params.front_matter not in frontmatter.FORMATS:
+        raise JobError(f"Unsupported front matter format: {params.front_matter}")
+    build_root = os.path.realpath(config.BUILD_ROOT)
+    output = os.path.realpath(os.path.join(build_root, params.output))
+    if os.path.commonpath([build_root, output]) != build_root:
+        raise JobError("Path must be inside BUILD_ROOT")
+    return output
+
+
+@job_type("build", schemas.BuildJobParams, check=_build_output)
+async def _run_build(context: "JobContext", params: schemas.BuildJobParams) -> dict:
+    output = _build_output(params)
+    async with context.read_session_factory() as db:
+        total = await crud.count_content_items(db)
+        result = await build.build_site(
+            db, output, force=params.force, front_matter_format=params.front_matter,
+            progress=lambda done: context.progress(done, total),
+        )
+    return dataclasses.asdict(result)
+
+
+# --- Submitting and inspecting jobs ---
+
+async def submit(db: AsyncSession, job: schemas.JobCreate) -> models.Job:
+    """
+    Queues a job. Raises JobError if its type or parameters are invalid, or if too
+    many jobs are waiting already.
+    """
+    job_type = JOB_TYPES.get(job.type)
+    if job_type is None:
+        raise JobError(f"Unknown job type: {job.type}")
+    try:
+        params = job_type.params(**job.params)
+    except pydantic.ValidationError as error:
+        raise JobError(f"Invalid parameters: {error}")
+    if job_type.check is not None:
+        job_type.check(params)
+
+    queued = (await db.execute(select(func.count(models.Job.id)).filter(models.Job.status == PENDING))).scalar()
+    if queued >= config.JOB_MAX_QUEUED:
+        raise JobError("Too many jobs are waiting; try again later", status_code=429)
+
+    row = models.Job(
+        type=job.type,
+        params=params.model_dump(mode="json"),
+        priority=job.priority,
+        status=PENDING,
+        progress=0,
+        cancel_requested=False,
+        attempts=0,
+    )
+    db.add(row)
+    await db.commit()
+    await db.refresh(row)
+    pool.wake()
+    return row
+
+
+async def get_jobs(db: AsyncSession, status: Optional[str] = None, type: Optional[str] = None,
+                   limit: int = 100) -> List[models.Job]:
+    """
+    Lists jobs, newest first.
+    """
+    query = select(models.Job).order_by(models.Job.id.desc()).limit(limit)
+    if status is not None:
+        query = query.filter(models.Job.status == status)
+    if type is not None:
+        query = query.filter(models.Job.type == type)
+    return (await db.execute(query)).scalars().all()
+
+
+async def get_job(db: AsyncSession, job_id: int) -> Optional[models.Job]:
+    return await db.get(models.Job, job_id)
+
+
+async def cancel(db: AsyncSession, job_id: int) -> Optional[models.Job]:
+    """
+    Cancels a queued job at once, or asks a running one to stop after its current
+    batch. Raises JobError if the job has finished. Returns None if it does not exist.
+    """
+    job = await db.get(models.Job, job_id)
+    if job is None:
+        return None
+    now = datetime.datetime.utcnow()
+    cancelled = await db.execute(
+        update(models.Job)
+        .where(models.Job.id == job_id, models.Job.status == PENDING)
+        .values(status=CANCELLED, cancel_requested=True, finished_at=now)
+    )
+    if cancelled.rowcount == 0:
+        requested = await db.execute(
+            update(models.Job)
+            .where(models.Job.id == job_id, models.Job.status == RUNNING)
+            .values(cancel_requested=True)
+        )
+        if requested.rowcount == 0:
+            raise JobError(f"Job {job_id} has already finished", status_code=409)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+# --- Running jobs ---
+
+class JobContext:
+    """
+    What a running job uses to reach the database and report its progress.
+    """
+
+    def __init__(self, pool: "JobPool", job_id: int, holds_slot: bool = False):
+        self.job_id = job_id
+        self.worker_id = pool.worker_id
+        self.session_factory = pool.session_factory
+        # Exports and builds read through their own connection, which stays open
+        # while the writer one records their progress
+        self.read_session_factory = pool.read_session_factory
+        self.duty_cycle = pool.duty_cycle
+        self.admission = pool.admission
+        self.holds_slot = holds_slot
+        self.output_dir = os.path.join(config.JOB_OUTPUT_DIR, str(job_id))
+        self._batch_start = time.perf_counter()
+
+    async def progress(self, done: int, total: Optional[int] = None):
+        """
+        Records the job's progress after a batch. Raises JobCancelled if the job was
+        cancelled, or was queued again because its heartbeat went stale, otherwise
+        pauses in proportion to the time the batch took.
+        """
+        values = {"progress": done, "heartbeat_at": datetime.datetime.utcnow()}
+        if total is not None:
+            values["total"] = total
+        async with self.session_factory() as db:
+            await db.execute(
+                update(models.Job)
+                .where(models.Job.id == self.job_id, models.Job.worker_id == self.worker_id)
+                .values(**values)
+            )
+            job = (await db.execute(
+                select(models.Job.cancel_requested, models.Job.worker_id).filter(models.Job.id == self.job_id)
+            )).first()
+            await db.commit()
+        if job.worker_id != self.worker_id:
+            logger.warning("Job %s was queued again while it ran; stopping it", self.job_id)
+            raise JobCancelled()
+        if job.cancel_requested:
+            raise JobCancelled()
+        elapsed = time.perf_counter() - self._batch_start
+        await self._pause(elapsed * (1 - self.duty_cycle) / self.duty_cycle)
+        self._batch_start = time.perf_counter()
+
+    async def _pause(self, seconds: float):
+        """
+        Sleeps between batches. A heavy job gives up its admission slot meanwhile, so
+        that other heavy operations can run, and waits its turn for one afterwards.
+        """
+        if seconds <= 0:
+            return
+        if not self.holds_slot:
+            await asyncio.sleep(seconds)
+            return
+        self.release_slot()
+        await asyncio.sleep(seconds)
+        await self.admission.acquire()
+        self.holds_slot = True
+
+    def release_slot(self):
+        if self.holds_slot:
+            self.holds_slot = False
+            self.admission.release()
+
+
+@dataclasses.dataclass
+class ClaimedJob:
+    id: int
+    type: str
+    params: dict
+    attempts: int
+
+
+class JobPool:
+    """
+    Runs queued jobs, either continuously with start() or until none is left with
+    run_pending(). `worker_id` names the pool in the jobs it claims.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        read_session_factory=ReadSessionLocal,
+        workers: int = config.JOB_WORKERS,
+        duty_cycle: float = config.JOB_DUTY_CYCLE,
+        max_attempts: int = config.JOB_MAX_ATTEMPTS,
+        poll_interval: float = config.CHANGES_POLL_INTERVAL,
+        admission_control: AdmissionControl = admission,
+        heartbeat_timeout: float = config.JOB_HEARTBEAT_TIMEOUT,
+        worker_id: Optional[str] = None,
+    ):
+        self.session_factory = session_factory
+        self.read_session_factory = read_session_factory
+        self.workers = workers
+        self.duty_cycle = config.duty_cycle(duty_cycle)
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.admission = admission_control
+        self.heartbeat_timeout = heartbeat_timeout
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """
+        Stops the pool. Jobs it was running are queued again, to be started again by
+        the next pool.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            async with self.session_factory() as db:
+                await self._requeue(db, models.Job.worker_id == self.worker_id)
+                await db.commit()
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def run(self):
+        await self.recover()
+        await asyncio.gather(self._watch(), *(self._work() for _ in range(self.workers)))
+
+    async def _watch(self):
+        """
+        Requeues the jobs of other processes as their heartbeats go stale.
+        """
+        while True:
+            await asyncio.sleep(self.heartbeat_timeout)
+            try:
+                if await self.recover():
+                    self.wake()
+            except Exception:
+                logger.exception("Recovering jobs failed")
+
+    async def _work(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                job_id = await self.run_next()
+            except Exception:
+                logger.exception("Running jobs failed")
+                job_id = None
+            if job_id is None:
+                # Also poll, for jobs queued by other processes and for free slots
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def recover(self) -> int:
+        """
+        Requeues the running jobs whose heartbeat is older than the heartbeat timeout,
+        which the process running them stopped, or marks them cancelled if that was
+        asked for. Returns the number of jobs requeued.
+        """
+        stale = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.heartbeat_timeout)
+        async with self.session_factory() as db:
+            requeued = await self._requeue(
+                db, or_(models.Job.heartbeat_at.is_(None), models.Job.heartbeat_at < stale)
+            )
+            await db.commit()
+        return requeued
+
+    @staticmethod
+    async def _requeue(db: AsyncSession, condition) -> int:
+        """
+        Requeues the running jobs that match `condition`, or marks them cancelled if
+        that was asked for. Returns the number of jobs requeued.
+        """
+        await db.execute(
+            update(models.Job)
+            .where(models.Job.status == RUNNING, models.Job.cancel_requested.is_(True), condition)
+            .values(status=CANCELLED, finished_at=datetime.datetime.utcnow())
+        )
+        requeued = await db.execute(
+            update(models.Job)
+            .where(models.Job.status == RUNNING, condition)
+            .values(status=PENDING, worker_id=None, heartbeat_at=None)
+        )
+        return requeued.rowcount
+
+    async def run_pending(self) -> int:
+        """
+        Runs queued and interrupted jobs one at a time until none is left. Returns the
+        number of jobs run.
+        """
+        await self.recover()
+        count = 0
+        while await self.run_next() is not None:
+            count += 1
+        return count
+
+    async def run_next(self) -> Optional[int]:
+        """
+        Runs the next job this pool may start. Returns its ID, or None if there was none.
+        """
+        # Heavy jobs are only claimed with an admission slot in hand
+        reserved = self.admission.try_acquire()
+        context = None
+        try:
+            job = await self._claim(include_heavy=reserved)
+            if job is None:
+                return None
+            job_type = JOB_TYPES.get(job.type)
+            if reserved and job_type is not None and not job_type.heavy:
+                self.admission.release()
+                reserved = False
+            # The job's context holds the slot from here on
+            context = JobContext(self, job.id, holds_slot=reserved)
+            reserved = False
+            heartbeat = asyncio.create_task(self._heartbeat(job.id))
+            try:
+                await self._run(job, job_type, context)
+            finally:
+                heartbeat.cancel()
+            return job.id
+        finally:
+            if reserved:
+                self.admission.release()
+            if context is not None:
+                context.release_slot()
+
+    async def _claim(self, include_heavy: bool) -> Optional[ClaimedJob]:
+        async with self.session_factory() as db:
+            while True:
+                query = (
+                    select(models.Job.id, models.Job.type, models.Job.params, models.Job.attempts)
+                    .filter(models.Job.status == PENDING)
+                    .order_by(models.Job.priority.desc(), models.Job.id)
+                    .limit(1)
+                )
+                if not include_heavy:
+                    heavy = [job_type.name for job_type in JOB_TYPES.values() if job_type.heavy]
+                    query = query.filter(models.Job.type.notin_(heavy))
+                row = (await db.execute(query)).first()
+                if row is None:
+                    return None
+                now = datetime.datetime.utcnow()
+                claimed = await db.execute(
+                    update(models.Job)
+                    .where(models.Job.id == row.id, models.Job.status == PENDING)
+                    .values(
+                        status=RUNNING, attempts=models.Job.attempts + 1, started_at=now,
+                        worker_id=self.worker_id, heartbeat_at=now,
+                    )
+                )
+                await db.commit()
+                # Another worker may have claimed it first
+                if claimed.rowcount == 1:
+                    return ClaimedJob(row.id, row.type, row.params, row.attempts + 1)
+
+    async def _heartbeat(self, job_id: int):
+        """
+        Refreshes a running job's heartbeat, also while a batch takes longer than the
+        heartbeat timeout.
+        """
+        while True:
+            await asyncio.sleep(self.heartbeat_timeout / 3)
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        update(models.Job)
+                        .where(models.Job.id == job_id, models.Job.worker_id == self.worker_id)
+                        .values(heartbeat_at=datetime.datetime.utcnow())
+                    )
+                    await db.commit()
+            except Exception:
+                logger.exception("Refreshing the heartbeat of job %s failed", job_id)
+
+    async def _run(self, job: ClaimedJob, job_type: Optional[JobType], context: JobContext):
+        if job_type is None:
+            await self._finish(job.id, FAILED, error=f"Unknown job type: {job.type}")
+            return
+        if job.attempts > self.max_attempts:
+            await self._finish(job.id, FAILED, error=f"Interrupted {job.attempts - 1} times")
+            return
+
+        try:
+            params = job_type.params(**job.params)
+        except pydantic.ValidationError as error:
+            await self._finish(job.id, FAILED, error=f"Invalid parameters: {error}")
+            return
+
+        # A job is only cancelled between batches, by JobContext.progress. If the pool
+        # is stopped instead, the job stays running and is resumed by the next pool.
+        try:
+            result = await job_type.run(context, params)
+        except JobCancelled:
+            await self._finish(job.id, CANCELLED)
+        except Exception as error:
+            logger.exception("Job %s failed", job.id)
+            await self._finish(job.id, FAILED, error=f"{type(error).__name__}: {error}")
+        else:
+            await self._finish(job.id, COMPLETED, result=result)
+
+    async def _finish(self, job_id: int, status: str, **values):
+        async with self.session_factory() as db:
+            # A job queued again while it ran is left to the pool running it now
+            await db.execute(
+                update(models.Job)
+                .where(models.Job.id == job_id, models.Job.worker_id == self.worker_id)
+                .values(status=status, finished_at=datetime.datetime.utcnow(), **values)
+            )
+            await db.commit()
+
+
+pool = JobPool()
@@ -1,22 +1,47 @@
 from fastapi import FastAPI
-from database import engine, Base
-import models
-from routers import templates, content
+from database import engine
+import config, instrumentation, jobs, migrations, profiling, render_pool, template_changes, webhooks
+from routers import templates, content, export, imports, jobs as jobs_router, changes, debug, metrics
 
 app = FastAPI(title="Markdown-Based Blog Management System")
 
+# Report the number and duration of SQL statements of every request
+app.middleware("http")(instrumentation.query_stats_middleware)
+# Profile requests sent with an X-Profile header, when debugging is enabled
+app.middleware("http")(profiling.profiling_middleware)
+
 # Include the API routers
 app.include_router(templates.router, prefix="/api/v1", tags=["Templates"])
 app.include_router(content.router, prefix="/api/v1", tags=["Content"])
+app.include_router(export.router, prefix="/api/v1", tags=["Export"])
+app.include_router(imports.router, prefix="/api/v1", tags=["Import"])
+app.include_router(jobs_router.router, prefix="/api/v1", tags=["Jobs"])
+app.include_router(changes.router, prefix="/api/v1", tags=["Changes"])
+app.include_router(debug.router, prefix="/api/v1", tags=["Debug"])
+app.include_router(metrics.router, tags=["Metrics"])
 
 
 @app.on_event("startup")
 async def startup():
     """
-    This function runs on application startup and creates the database tables.
+    This function runs on application startup. It checks that the database schema is
+    up to date, which `python cli.py migrate` takes care of, starts delivering change
+    events to webhooks and resumes any unfinished template changes and jobs.
     """
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await migrations.check(engine)
+    if config.WEBHOOKS_ENABLED:
+        webhooks.dispatcher.start()
+    if config.TEMPLATE_CHANGES_ENABLED:
+        template_changes.runner.start()
+    if config.JOBS_ENABLED:
+        jobs.pool.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await webhooks.dispatcher.stop()
+    await template_changes.runner.stop()
+    await jobs.pool.stop()
+    render_pool.render_executor.shutdown()
 
 @app.get("/", tags=["Root"])
 def read_root():
@@ -0,0 +1,177 @@
+"""
+Process-wide metrics, exposed by GET /metrics in the Prometheus text format.
+
+Histograms and counters are updated where the work happens: request latency and
+SQL time per route in instrumentation.query_stats_middleware, Markdown render time
+in services.generate_markdown_from_item. Cache hit and miss counts are read from the
+caches themselves when metrics are collected; their hit rate is
+`rate(..._hits_total) / (rate(..._hits_total) + rate(..._misses_total))`.
+
+Metrics are kept per process. Markdown rendered by the render worker processes of
+exports and builds is not included, and with several server processes each one
+reports its own requests.
+"""
+import bisect
+import threading
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+import config
+
+# Latency buckets in seconds, from 1 ms to 10 s.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    A count that only goes up, per combination of label values.
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels: str):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """
+    Counts observations into cumulative buckets, per combination of label values.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(float(bound) for bound in buckets))
+        # Per label values: [count per bucket (the last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series is not None else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        names = self.labelnames + ("le",)
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class CounterFunction:
+    """
+    A counter whose value is read from a function when metrics are collected, for
+    counts that are already kept elsewhere, such as cache hits.
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+
+    def samples(self) -> Iterator[str]:
+        yield f"{self.name} {_format_value(self.function())}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+# The process-wide registry served by GET /metrics.
+registry = Registry()
+
+
+def is_enabled() -> bool:
+    return config.METRICS_ENABLED
+
+
+request_seconds = registry.register(Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response.",
+    ("method", "route"),
+))
+requests_total = registry.register(Counter(
+    "http_requests_total", "Requests handled, by response status.", ("method", "route", "status"),
+))
+request_db_seconds = registry.register(Histogram(
+    "http_request_db_seconds", "Time spent executing SQL statements per request.", ("method", "route"),
+))
+request_db_queries_total = registry.register(Counter(
+    "http_request_db_queries_total", "SQL statements executed by requests.", ("method", "route"),
+))
+render_seconds = registry.register(Histogram(
+    "markdown_render_seconds", "Time to render one content item as Markdown in the server process.",
+))
@@ -0,0 +1,345 @@
+"""
+Versioned schema migrations.
+
+MIGRATIONS lists every change to the database schema in order. The versions applied
+to a database are recorded in the schema_migrations table, and `python cli.py migrate`
+applies the missing ones, recording each as soon as it has run. The application never
+changes the schema itself: on startup it only checks the version (see check()), so new
+code deployed against an old database fails fast instead of on its first query.
+
+Every migration only creates what is missing. A database created with
+Base.metadata.create_all before migrations existed is therefore brought up to date by
+running all of them, and a migration that was interrupted can simply be run again.
+Migrations describe tables as they were at their version, not as they are in
+models.py today, so that later model changes do not alter what an old migration does.
+"""
+import dataclasses
+import datetime
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import (
+    JSON, Boolean, Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text, func, inspect, text,
+)
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+import models, search
+
+VERSION_TABLE = "schema_migrations"
+
+_version_table = Table(
+    VERSION_TABLE,
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+@dataclasses.dataclass
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[AsyncSession], Awaitable[None]]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, name: str):
+    """
+    Registers the decorated coroutine function as the migration to `version`.
+    """
+    def register(upgrade):
+        assert version == len(MIGRATIONS) + 1, "migrations must be numbered consecutively"
+        MIGRATIONS.append(Migration(version, name, upgrade))
+        return upgrade
+    return register
+
+
+# --- Helpers for idempotent schema changes ---
+
+async def _create_tables(db: AsyncSession, metadata: MetaData):
+    await db.run_sync(lambda session: metadata.create_all(session.connection(), checkfirst=True))
+
+
+async def _create_indexes(db: AsyncSession, *indexes: Index):
+    def create(session):
+        for index in indexes:
+            index.create(session.connection(), checkfirst=True)
+    await db.run_sync(create)
+
+
+async def _add_columns(db: AsyncSession, table_name: str, *columns: Column):
+    def add(session):
+        connection = session.connection()
+        existing = {column["name"] for column in inspect(connection).get_columns(table_name)}
+        for column in columns:
+            if column.name not in existing:
+                definition = f"{column.name} {column.type.compile(dialect=connection.dialect)}"
+                if column.server_default is not None:
+                    definition += f" DEFAULT {column.server_default.arg}"
+                if not column.nullable:
+                    definition += " NOT NULL"
+                connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {definition}"))
+    await db.run_sync(add)
+
+
+# --- Migrations ---
+
+@migration(1, "Initial schema")
+async def _initial_schema(db: AsyncSession):
+    metadata = MetaData()
+    Table(
+        "page_templates", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("name", String, unique=True, index=True, nullable=False),
+        Column("description", String),
+    )
+    Table(
+        "template_fields", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("name", String, index=True, nullable=False),
+        Column("data_type", String, nullable=False),
+        Column("required", Boolean),
+        Column("template_id", Integer, ForeignKey("page_templates.id"), nullable=False),
+    )
+    Table(
+        "content_items", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("title", String, index=True, nullable=False),
+        Column("created_at", DateTime),
+        Column("template_id", Integer, ForeignKey("page_templates.id"), nullable=False),
+    )
+    Table(
+        "content_values", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("item_id", Integer, ForeignKey("content_items.id"), nullable=False),
+        Column("field_id", Integer, ForeignKey("template_fields.id"), nullable=False),
+        Column("value", JSON),
+    )
+    await _create_tables(db, metadata)
+
+
+@migration(2, "Last-modified timestamps of templates and content items")
+async def _updated_at(db: AsyncSession):
+    await _add_columns(db, "page_templates", Column("updated_at", DateTime))
+    await _add_columns(db, "content_items", Column("updated_at", DateTime))
+    await db.execute(
+        text("UPDATE page_templates SET updated_at = :now WHERE updated_at IS NULL"),
+        {"now": datetime.datetime.utcnow()},
+    )
+    await db.execute(text("UPDATE content_items SET updated_at = created_at WHERE updated_at IS NULL"))
+
+
+@migration(3, "Indexes for keyset pagination and loading fields and values")
+async def _list_indexes(db: AsyncSession):
+    metadata = MetaData()
+    content_items = Table(
+        "content_items", metadata,
+        Column("id", Integer), Column("created_at", DateTime), Column("template_id", Integer),
+    )
+    template_fields = Table("template_fields", metadata, Column("template_id", Integer))
+    content_values = Table("content_values", metadata, Column("item_id", Integer))
+    await _create_indexes(
+        db,
+        Index("ix_content_items_created_at_id", content_items.c.created_at, content_items.c.id),
+        Index(
+            "ix_content_items_template_id_created_at_id",
+            content_items.c.template_id, content_items.c.created_at, content_items.c.id,
+        ),
+        Index("ix_template_fields_template_id", template_fields.c.template_id),
+        Index("ix_content_values_item_id", content_values.c.item_id),
+    )
+
+
+@migration(4, "Full-text search index")
+async def _search_index(db: AsyncSession):
+    if not search.is_supported(db):
+        return
+    exists = (await db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": models.CONTENT_SEARCH_TABLE}
+    )).first()
+    if exists:
+        return
+    await db.execute(text(
+        f"CREATE VIRTUAL TABLE {models.CONTENT_SEARCH_TABLE} "
+        "USING fts5(title, body, fields, template_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')"
+    ))
+    await search.rebuild_index(db, commit=False)
+
+
+@migration(5, "Content revisions")
+async def _content_revisions(db: AsyncSession):
+    metadata = MetaData()
+    Table(
+        "content_items", metadata, Column("id", Integer, primary_key=True),
+    )
+    Table(
+        "content_revisions", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("item_id", Integer, ForeignKey("content_items.id"), nullable=False),
+        Column("number", Integer, nullable=False),
+        Column("keyframe", Boolean, nullable=False),
+        Column("data", JSON, nullable=False),
+        Column("created_at", DateTime),
+        Index("ix_content_revisions_item_id_number", "item_id", "number", unique=True),
+    )
+    await _create_tables(db, metadata)
+
+
+@migration(6, "Change feed and webhooks")
+async def _change_feed(db: AsyncSession):
+    metadata = MetaData()
+    Table(
+        "change_events", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("entity", String, nullable=False),
+        Column("entity_id", Integer, nullable=False),
+        Column("action", String, nullable=False),
+        Column("created_at", DateTime),
+    )
+    Table(
+        "webhooks", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("url", String, nullable=False),
+        Column("secret", String),
+        Column("active", Boolean, nullable=False),
+        Column("last_event_id", Integer, nullable=False),
+        Column("failures", Integer, nullable=False),
+        Column("next_attempt_at", DateTime),
+        Column("last_error", String),
+        Column("created_at", DateTime),
+    )
+    await _create_tables(db, metadata)
+
+
+@migration(7, "Template changes")
+async def _template_changes(db: AsyncSession):
+    await _add_columns(db, "template_fields", Column("removed_at", DateTime))
+    metadata = MetaData()
+    Table(
+        "page_templates", metadata, Column("id", Integer, primary_key=True),
+    )
+    Table(
+        "template_changes", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("template_id", Integer, ForeignKey("page_templates.id"), nullable=False, index=True),
+        Column("operations", JSON, nullable=False),
+        Column("status", String, nullable=False),
+        Column("last_item_id", Integer, nullable=False),
+        Column("processed", Integer, nullable=False),
+        Column("total", Integer, nullable=False),
+        Column("invalid", Integer, nullable=False),
+        Column("validation_errors", JSON, nullable=False),
+        Column("error", String),
+        Column("created_at", DateTime),
+        Column("updated_at", DateTime),
+        Column("finished_at", DateTime),
+    )
+    await _create_tables(db, metadata)
+
+
+@migration(8, "Content documents")
+async def _content_documents(db: AsyncSession):
+    # Items are versioned by triggers, and a document is current while its version
+    # matches its item's
+    await _add_columns(db, "content_items", Column("version", Integer, nullable=False, server_default="1"))
+    for statement in models.CONTENT_VERSION_TRIGGERS.get(db.get_bind().dialect.name, []):
+        await db.execute(text(statement))
+
+    # Filled by `python cli.py rebuild-documents` when CONTENT_DOCUMENTS_ENABLED is turned on
+    metadata = MetaData()
+    Table(
+        "content_items", metadata, Column("id", Integer, primary_key=True),
+    )
+    Table(
+        "content_documents", metadata,
+        Column("item_id", Integer, ForeignKey("content_items.id"), primary_key=True),
+        Column("version", Integer),
+        Column("document", Text, nullable=False),
+    )
+    await _create_tables(db, metadata)
+
+
+@migration(9, "Jobs")
+async def _jobs(db: AsyncSession):
+    metadata = MetaData()
+    Table(
+        "jobs", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("type", String, nullable=False),
+        Column("params", JSON, nullable=False),
+        Column("priority", Integer, nullable=False),
+        Column("status", String, nullable=False),
+        Column("progress", Integer, nullable=False),
+        Column("total", Integer),
+        Column("result", JSON),
+        Column("error", String),
+        Column("cancel_requested", Boolean, nullable=False),
+        Column("attempts", Integer, nullable=False),
+        Column("created_at", DateTime),
+        Column("started_at", DateTime),
+        Column("updated_at", DateTime),
+        Column("finished_at", DateTime),
+        Column("worker_id", String),
+        Column("heartbeat_at", DateTime),
+        Index("ix_jobs_status_priority_id", "status", "priority", "id"),
+    )
+    await _create_tables(db, metadata)
+
+
+HEAD = MIGRATIONS[-1].version
+
+
+# --- Running migrations ---
+
+async def current_version(db: AsyncSession) -> int:
+    """
+    Returns the last migration applied to the database, 0 if none.
+    """
+    has_table = await db.run_sync(lambda session: inspect(session.connection()).has_table(VERSION_TABLE))
+    if not has_table:
+        return 0
+    return (await db.execute(func.max(_version_table.c.version).select())).scalar() or 0
+
+
+async def migrate(engine: AsyncEngine, target: Optional[int] = None, progress=None) -> List[Migration]:
+    """
+    Applies the migrations after the database's current version, up to `target` (the
+    latest by default), each in its own transaction. Calls `progress` with every
+    migration before applying it. Returns the migrations applied.
+    """
+    target = HEAD if target is None else target
+    applied = []
+    async with AsyncSession(engine) as db:
+        await _create_tables(db, _version_table.metadata)
+        await db.commit()
+        version = await current_version(db)
+        for step in MIGRATIONS[version:target]:
+            if progress is not None:
+                progress(step)
+            await step.upgrade(db)
+            await db.execute(_version_table.insert().values(
+                version=step.version, name=step.name, applied_at=datetime.datetime.utcnow(),
+            ))
+            await db.commit()
+            applied.append(step)
+    return applied
+
+
+async def check(engine: AsyncEngine):
+    """
+    Raises SchemaVersionError unless all migrations have been applied. A database ahead
+    of this code is accepted, so that old code keeps running during a rolling deploy.
+    """
+    async with AsyncSession(engine) as db:
+        version = await current_version(db)
+    if version < HEAD:
+        raise SchemaVersionError(
+            f"The database schema is at version {version}, but this code needs version {HEAD}. "
+            "Run `python cli.py migrate` to upgrade it."
+        )
@@ -1,5 +1,5 @@
 import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON, DDL, Index, event
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -9,8 +9,17 @@ class PageTemplate(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True, nullable=False)
     description = Column(String)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
-    fields = relationship("TemplateField", back_populates="template", cascade="all, delete-orphan")
+    # Fields being removed by a template change (see template_changes.py) are left out
+    fields = relationship(
+        "TemplateField",
+        primaryjoin="and_(PageTemplate.id == TemplateField.template_id, TemplateField.removed_at.is_(None))",
+        back_populates="template",
+        cascade="all, delete-orphan",
+    )
+    # Every field, including those being removed
+    all_fields = relationship("TemplateField", viewonly=True)
 
 class TemplateField(Base):
     __tablename__ = "template_fields"
@@ -19,17 +28,29 @@ class TemplateField(Base):
     name = Column(String, index=True, nullable=False)
     data_type = Column(String, nullable=False)
     required = Column(Boolean, default=True)
-    template_id = Column(Integer, ForeignKey("page_templates.id"), nullable=False)
+    template_id = Column(Integer, ForeignKey("page_templates.id"), nullable=False, index=True)
+    # Set when a template change removes the field; the row is deleted once the
+    # change has removed the field's values from every item
+    removed_at = Column(DateTime)
 
     template = relationship("PageTemplate", back_populates="fields")
 
 class ContentItem(Base):
     __tablename__ = "content_items"
+    __table_args__ = (
+        # Keyset pagination indexes for listing by creation order, optionally per template
+        Index("ix_content_items_created_at_id", "created_at", "id"),
+        Index("ix_content_items_template_id_created_at_id", "template_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True, nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     template_id = Column(Integer, ForeignKey("page_templates.id"), nullable=False)
+    # Bumped by the database on every change to the item or its values, however it is
+    # written (see CONTENT_VERSION_TRIGGERS)
+    version = Column(Integer, nullable=False, server_default="1")
 
     template = relationship("PageTemplate")
     values = relationship("ContentValue", back_populates="item", cascade="all, delete-orphan")
@@ -38,10 +59,212 @@ class ContentValue(Base):
     __tablename__ = "content_values"
 
     id = Column(Integer, primary_key=True, index=True)
-    item_id = Column(Integer, ForeignKey("content_items.id"), nullable=False)
+    item_id = Column(Integer, ForeignKey("content_items.id"), nullable=False, index=True)
     field_id = Column(Integer, ForeignKey("template_fields.id"), nullable=False)
 
     value = Column(JSON)
 
     item = relationship("ContentItem", back_populates="values")
     field = relationship("TemplateField")
+
+class ContentDocument(Base):
+    """
+    The read model of a content item, maintained by documents.py: the item and its
+    values as one JSON document shaped like schemas.ContentItem. `version` is that of
+    the item the document was built from, so a document the item has outgrown is ignored.
+    """
+    __tablename__ = "content_documents"
+
+    item_id = Column(Integer, ForeignKey("content_items.id"), primary_key=True)
+    version = Column(Integer)
+    document = Column(Text, nullable=False)
+
+class ContentRevision(Base):
+    """
+    One revision of a content item, maintained by revisions.py. `data` holds the full
+    title and values for keyframes, and only the changes since the previous revision otherwise.
+    """
+    __tablename__ = "content_revisions"
+    __table_args__ = (
+        Index("ix_content_revisions_item_id_number", "item_id", "number", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, ForeignKey("content_items.id"), nullable=False)
+    number = Column(Integer, nullable=False)
+    keyframe = Column(Boolean, nullable=False)
+    data = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class ChangeEvent(Base):
+    """
+    One entry of the change feed, written by changes.py in the same transaction as the
+    change itself. IDs increase monotonically and serve as the feed's cursor.
+    """
+    __tablename__ = "change_events"
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class Webhook(Base):
+    """
+    A URL that change events are delivered to by webhooks.py. `last_event_id` is the
+    last event delivered successfully; the failure columns drive retries with backoff.
+    """
+    __tablename__ = "webhooks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    url = Column(String, nullable=False)
+    secret = Column(String)
+    active = Column(Boolean, nullable=False, default=True)
+    last_event_id = Column(Integer, nullable=False, default=0)
+    failures = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime)
+    last_error = Column(String)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class TemplateChange(Base):
+    """
+    A change to a template's fields and the background job that carries it over to the
+    template's content items, run by template_changes.py. `operations` records what
+    was changed; `last_item_id` is the job's cursor, so it resumes where it stopped.
+    """
+    __tablename__ = "template_changes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    template_id = Column(Integer, ForeignKey("page_templates.id"), nullable=False, index=True)
+    operations = Column(JSON, nullable=False)
+    status = Column(String, nullable=False, default="pending")
+    last_item_id = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+    invalid = Column(Integer, nullable=False, default=0)
+    validation_errors = Column(JSON, nullable=False, default=list)
+    error = Column(String)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    finished_at = Column(DateTime)
+
+
+class Job(Base):
+    """
+    A long-running operation, such as an export or an import, queued to be run in the
+    background by jobs.py. `params` holds the operation's arguments and `result` what
+    it returned; `attempts` counts how often it was started, including restarts after
+    the process running it stopped. A running job belongs to the pool named in
+    `worker_id`, which refreshes `heartbeat_at` while it runs.
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_priority_id", "status", "priority", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    type = Column(String, nullable=False)
+    params = Column(JSON, nullable=False)
+    priority = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False, default="pending")
+    progress = Column(Integer, nullable=False, default=0)
+    total = Column(Integer)
+    result = Column(JSON)
+    error = Column(String)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    finished_at = Column(DateTime)
+    worker_id = Column(String)
+    heartbeat_at = Column(DateTime)
+
+
+# Full-text search index over content items, maintained by search.py. The rowid of each
+# entry is the content item ID. FTS5 is SQLite-specific, so the table only exists there.
+CONTENT_SEARCH_TABLE = "content_search"
+
+event.listen(
+    Base.metadata,
+    "after_create",
+    DDL(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {CONTENT_SEARCH_TABLE} "
+        "USING fts5(title, body, fields, template_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')"
+    ).execute_if(dialect="sqlite"),
+)
+event.listen(
+    Base.metadata,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {CONTENT_SEARCH_TABLE}").execute_if(dialect="sqlite"),
+)
+
+
+# Triggers that bump ContentItem.version whenever the item or one of its values is
+# written, including by statements that bypass the application, per dialect.
+CONTENT_VERSION_TRIGGERS = {
+    "sqlite": [
+        """
+        CREATE TRIGGER IF NOT EXISTS content_values_insert_version AFTER INSERT ON content_values
+        BEGIN
+            UPDATE content_items SET version = version + 1 WHERE id = NEW.item_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS content_values_update_version AFTER UPDATE ON content_values
+        BEGIN
+            UPDATE content_items SET version = version + 1 WHERE id IN (OLD.item_id, NEW.item_id);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS content_values_delete_version AFTER DELETE ON content_values
+        BEGIN
+            UPDATE content_items SET version = version + 1 WHERE id = OLD.item_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS content_items_update_version
+        AFTER UPDATE OF title, template_id, created_at ON content_items
+        BEGIN
+            UPDATE content_items SET version = version + 1 WHERE id = NEW.id;
+        END
+        """,
+    ],
+    "postgresql": [
+        """
+        CREATE OR REPLACE FUNCTION content_values_bump_version() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE content_items SET version = version + 1 WHERE id = OLD.item_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE content_items SET version = version + 1 WHERE id = NEW.item_id;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE OR REPLACE FUNCTION content_items_bump_version() RETURNS trigger AS $$
+        BEGIN
+            NEW.version := OLD.version + 1;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS content_values_version ON content_values",
+        """
+        CREATE TRIGGER content_values_version AFTER INSERT OR UPDATE OR DELETE ON content_values
+        FOR EACH ROW EXECUTE FUNCTION content_values_bump_version()
+        """,
+        "DROP TRIGGER IF EXISTS content_items_version ON content_items",
+        """
+        CREATE TRIGGER content_items_version BEFORE UPDATE OF title, template_id, created_at ON content_items
+        FOR EACH ROW EXECUTE FUNCTION content_items_bump_version()
+        """,
+    ],
+}
+
+for dialect, statements in CONTENT_VERSION_TRIGGERS.items():
+    for statement in statements:
+        event.listen(Base.metadata, "after_create", DDL(statement).execute_if(dialect=dialect))
@@ -0,0 +1,80 @@
+import base64
+import json
+import time
+from typing import Any, Awaitable, Callable, Hashable, List
+
+import metrics
+
+# How long a cached total count may be served before it is recomputed. Writes in this
+# process invalidate counts immediately; the TTL bounds staleness across workers.
+COUNT_CACHE_TTL_SECONDS = 30.0
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """
+    Encodes the sort key of the last row on a page as an opaque, URL-safe token.
+    """
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, length: int) -> List[Any]:
+    """
+    Decodes a token produced by encode_cursor, checking it holds `length` values.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursor("Malformed cursor")
+    return values
+
+
+class CountCache:
+    """
+    Caches COUNT(*) results per table and filter combination.
+
+    Callers invalidate a table after writing to it, so list pages with totals do not
+    need to count the table on every request.
+    """
+
+    def __init__(self, ttl: float = COUNT_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._counts = {}
+
+    async def get_or_load(self, table: str, key: Hashable, loader: Callable[[], Awaitable[int]]) -> int:
+        entry = self._counts.get((table, key))
+        now = time.monotonic()
+        if entry is not None and now - entry[1] < self.ttl:
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        count = await loader()
+        self._counts[(table, key)] = (count, now)
+        return count
+
+    def invalidate(self, table: str):
+        for cache_key in [cache_key for cache_key in self._counts if cache_key[0] == table]:
+            del self._counts[cache_key]
+
+    def clear(self):
+        self._counts.clear()
+
+
+# The process-wide count cache used by the list endpoints.
+count_cache = CountCache()
+
+metrics.registry.register(metrics.CounterFunction(
+    "count_cache_hits_total", "List totals served from the count cache.", lambda: count_cache.hits,
+))
+metrics.registry.register(metrics.CounterFunction(
+    "count_cache_misses_total", "List totals counted in the database.", lambda: count_cache.misses,
+))
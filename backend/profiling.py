@@ -0,0 +1,109 @@
+"""
+A sampling profiler for single requests.
+
+With DEBUG_ENDPOINTS set, a request sent with an `X-Profile: 1` header is handled as
+usual, but its response is replaced by a profile of it: the stacks of the event loop
+thread, sampled every PROFILE_SAMPLE_INTERVAL seconds until the last byte of the
+response, in the collapsed format ("outer;inner;leaf count" per line) that
+flamegraph.pl, speedscope and similar tools read:
+
+    curl -H 'X-Profile: 1' localhost:8000/api/v1/content/1/markdown > profile.txt
+    flamegraph.pl profile.txt > profile.svg
+
+The original status is in the X-Profile-Status header. The event loop also runs
+other requests meanwhile, so profile on an otherwise idle server. Time spent waiting
+for the database shows up as the event loop waiting in its selector; the SQL time
+itself is in the X-DB-Time-Ms header.
+"""
+import collections
+import os
+import sys
+import threading
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import PlainTextResponse
+
+import config, instrumentation
+
+PROFILE_HEADER = "x-profile"
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread from a background thread until stopped.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self._stacks: Dict[Tuple[str, ...], int] = collections.Counter()
+        self._labels = {}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self._stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = os.sep.join(code.co_filename.split(os.sep)[-2:])
+            # Semicolons separate frames in the collapsed format
+            label = f"{code.co_qualname} ({filename}:{code.co_firstlineno})".replace(";", ":")
+            self._labels[code] = label
+        return label
+
+    def collapsed(self) -> str:
+        """
+        Returns the samples in the collapsed stack format, one stack per line.
+        """
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(self._stacks.items()))
+
+
+async def profiling_middleware(request: Request, call_next):
+    """
+    Replaces the response of a request sent with an X-Profile header by its profile.
+    """
+    if PROFILE_HEADER not in request.headers or not instrumentation.DEBUG_ENDPOINTS_ENABLED:
+        return await call_next(request)
+
+    profiler = SamplingProfiler(threading.get_ident(), config.PROFILE_SAMPLE_INTERVAL)
+    profiler.start()
+    try:
+        response = await call_next(request)
+        # Streamed responses are profiled until their last chunk
+        async for _ in response.body_iterator:
+            pass
+    finally:
+        profiler.stop()
+
+    headers = {
+        "X-Profile-Status": str(response.status_code),
+        "X-Profile-Samples": str(profiler.samples),
+    }
+    for name in ("X-DB-Query-Count", "X-DB-Time-Ms"):
+        if name in response.headers:
+            headers[name] = response.headers[name]
+    return PlainTextResponse(profiler.collapsed(), headers=headers)
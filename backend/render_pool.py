@@ -0,0 +1,180 @@
+"""
+Renders Markdown off the event loop.
+
+Rendering is CPU-bound, so long exports and builds hand it to a pool of worker
+processes. Workers receive plain-data snapshots of items and the compiled template
+schemas rather than ORM objects, which cannot cross a process boundary and would
+otherwise lazy-load from a session the worker does not have.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import dataclasses
+import datetime
+import logging
+import math
+import pickle
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import config, crud, documents, models, services
+from schema_cache import TemplateSchema
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class ValueSnapshot:
+    field_id: int
+    value: Any
+
+
+@dataclasses.dataclass(frozen=True)
+class ItemSnapshot:
+    """
+    The data of a content item that rendering needs, detached from the database session.
+    It can stand in for a ContentItem in services.generate_markdown_from_item and
+    services.markdown_path_for_item.
+    """
+    id: int
+    title: str
+    template_id: int
+    created_at: datetime.datetime
+    values: Tuple[ValueSnapshot, ...]
+
+    @classmethod
+    def from_item(cls, item: models.ContentItem) -> "ItemSnapshot":
+        return cls(
+            id=item.id,
+            title=item.title,
+            template_id=item.template_id,
+            created_at=item.created_at,
+            values=tuple(ValueSnapshot(value.field_id, value.value) for value in item.values),
+        )
+
+
+async def iter_snapshot_batches(db: AsyncSession, batch_size: int = 500, **filters) -> AsyncIterator[List[ItemSnapshot]]:
+    """
+    Yields batches of item snapshots, read as plain rows or, with the read model
+    enabled, from content documents. Takes the filters of crud.iter_content_row_batches.
+    """
+    if documents.is_enabled():
+        async for batch in crud.iter_content_document_batches(db, batch_size=batch_size, **filters):
+            yield [documents.to_snapshot(document) for document in batch]
+        return
+    async for rows in crud.iter_content_row_batches(db, batch_size=batch_size, **filters):
+        yield [
+            ItemSnapshot(item_id, title, template_id, created_at,
+                         tuple(ValueSnapshot(field_id, value) for field_id, value in values))
+            for item_id, title, template_id, created_at, values in rows
+        ]
+
+
+def _picklable(templates: Dict[int, TemplateSchema]) -> bool:
+    try:
+        pickle.dumps(templates)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
+def _render_chunk(items: Sequence[ItemSnapshot], templates: Dict[int, TemplateSchema],
+                  front_matter_format: str) -> List[str]:
+    return [
+        services.generate_markdown_from_item(item, templates[item.template_id], front_matter_format)
+        for item in items
+    ]
+
+
+class RenderExecutor:
+    """
+    Renders item snapshots in a process pool, or inline when configured with no workers.
+
+    The pool is started on first use, and started again if a worker process dies.
+    Schemas whose data types cannot be pickled (such as a serializer defined as a
+    lambda) are rendered inline instead.
+    """
+
+    def __init__(self, workers: int = config.RENDER_WORKERS):
+        self.workers = workers
+        # concurrent.futures loads the process pool machinery on first use, so the
+        # annotations are strings to keep it out of the application's startup
+        self._pool: Optional["concurrent.futures.ProcessPoolExecutor"] = None
+
+    def _get_pool(self) -> "concurrent.futures.ProcessPoolExecutor":
+        if self._pool is None:
+            self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def render_many(self, items: Sequence[ItemSnapshot], templates: Dict[int, TemplateSchema],
+                          front_matter_format: str = "yaml") -> List[str]:
+        """
+        Renders the items, split evenly across the workers, and returns the Markdown in item order.
+        """
+        if not items:
+            return []
+        if self.workers <= 0:
+            return _render_chunk(items, templates, front_matter_format)
+
+        used_templates = {item.template_id: templates[item.template_id] for item in items}
+        if not _picklable(used_templates):
+            return _render_chunk(items, templates, front_matter_format)
+
+        chunk_size = math.ceil(len(items) / self.workers)
+        chunks = [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        futures = []
+        for chunk in chunks:
+            # Only send the schemas the chunk uses
+            chunk_templates = {item.template_id: templates[item.template_id] for item in chunk}
+            futures.append(loop.run_in_executor(pool, _render_chunk, chunk, chunk_templates, front_matter_format))
+        try:
+            results = await asyncio.gather(*futures)
+        except BaseException as error:
+            for future in futures:
+                future.cancel()
+            if isinstance(error, concurrent.futures.process.BrokenProcessPool):
+                self._discard_pool(pool)
+            raise
+        return [markdown for chunk_result in results for markdown in chunk_result]
+
+    def _discard_pool(self, pool: "concurrent.futures.ProcessPoolExecutor"):
+        # A worker died and the pool refuses further work; the next render starts a new one
+        logger.warning("A render worker process died; starting a new pool")
+        if self._pool is pool:
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+render_executor = RenderExecutor()
+
+
+async def pipeline(batches: AsyncIterator[Any], render: Callable[[Any], Awaitable[Any]],
+                   depth: int = 1) -> AsyncIterator[Tuple[Any, Any]]:
+    """
+    Yields (batch, render(batch)) for every batch, in order.
+
+    Up to `depth` batches are rendered ahead of the consumer, so the next batch is
+    fetched from the database, and the previous one written, while the workers render.
+    """
+    pending = collections.deque()
+    try:
+        async for batch in batches:
+            pending.append((batch, asyncio.ensure_future(render(batch))))
+            if len(pending) > depth:
+                batch, future = pending.popleft()
+                yield batch, await future
+        while pending:
+            batch, future = pending.popleft()
+            yield batch, await future
+    finally:
+        # The consumer stopped early, e.g. a client disconnected from a streamed export
+        for _, future in pending:
+            future.cancel()
@@ -0,0 +1,223 @@
+"""
+Revision history of content items, stored as deltas.
+
+Every change to an item appends a revision. Most revisions only record what changed
+since the previous one: the new title if it changed, the new values of changed or
+added fields, and the IDs of removed fields. Revision 1, and every revision
+KEYFRAME_INTERVAL after the item's latest keyframe, records the full item instead, so
+reconstructing any revision reads at most KEYFRAME_INTERVAL rows. Revisions are read
+back from the stored `keyframe` flags, so changing the interval leaves existing
+history readable.
+"""
+import dataclasses
+import datetime
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+import config, models
+
+KEYFRAME_INTERVAL = max(1, config.REVISION_KEYFRAME_INTERVAL)
+
+
+@dataclasses.dataclass
+class RevisionState:
+    """
+    The title and values (by field ID, in field order) of an item at one revision.
+    """
+    title: str
+    values: Dict[int, Any]
+
+    @classmethod
+    def from_item(cls, item: models.ContentItem) -> "RevisionState":
+        return cls(title=item.title, values={value.field_id: value.value for value in item.values})
+
+
+def same_value(old, new) -> bool:
+    if old is new:
+        return True
+    # Compare as JSON, so that e.g. True and 1 count as different values
+    return old == new and json.dumps(old, sort_keys=True) == json.dumps(new, sort_keys=True)
+
+
+def _keyframe_data(state: RevisionState) -> dict:
+    return {"title": state.title, "values": {str(field_id): value for field_id, value in state.values.items()}}
+
+
+def _delta_data(old: RevisionState, new: RevisionState) -> Optional[dict]:
+    """
+    Returns the changes from old to new, or None if there are none.
+    """
+    data = {}
+    if old.title != new.title:
+        data["title"] = new.title
+    changed = {
+        str(field_id): value for field_id, value in new.values.items()
+        if field_id not in old.values or not same_value(old.values[field_id], value)
+    }
+    if changed:
+        data["values"] = changed
+    removed = [field_id for field_id in old.values if field_id not in new.values]
+    if removed:
+        data["removed"] = removed
+    return data or None
+
+
+def _apply(state: Optional[RevisionState], keyframe: bool, data: dict) -> RevisionState:
+    if keyframe:
+        return RevisionState(data["title"], {int(field_id): value for field_id, value in data["values"].items()})
+    values = dict(state.values)
+    for field_id in data.get("removed", []):
+        values.pop(field_id, None)
+    for field_id, value in data.get("values", {}).items():
+        values[int(field_id)] = value
+    return RevisionState(data.get("title", state.title), values)
+
+
+async def record_created(db: AsyncSession, states: Dict[int, RevisionState],
+                         created_at: Optional[datetime.datetime] = None):
+    """
+    Records revision 1 of newly created items within the caller's transaction.
+    """
+    if not states:
+        return
+    created_at = created_at or datetime.datetime.utcnow()
+    await db.execute(insert(models.ContentRevision), [
+        {"item_id": item_id, "number": 1, "keyframe": True, "data": _keyframe_data(state), "created_at": created_at}
+        for item_id, state in states.items()
+    ])
+
+
+async def record_change(db: AsyncSession, item_id: int, old: RevisionState, new: RevisionState) -> bool:
+    """
+    Records the change from old to new as the item's next revision, within the caller's
+    transaction. Returns False, recording nothing, if the two states are the same.
+
+    Items without any history, such as those created before revisions were recorded,
+    first get their old state recorded as revision 1.
+    """
+    return bool(await record_changes(db, {item_id: (old, new)}))
+
+
+async def record_changes(db: AsyncSession, states: Dict[int, Tuple[RevisionState, RevisionState]]) -> List[int]:
+    """
+    Records the changes of many items, given as {item_id: (old, new)}, like
+    record_change, with one query for the latest revision numbers and one insert.
+    Returns the IDs of the items that changed.
+    """
+    deltas = {item_id: _delta_data(old, new) for item_id, (old, new) in states.items()}
+    deltas = {item_id: delta for item_id, delta in deltas.items() if delta is not None}
+    if not deltas:
+        return []
+
+    query = (
+        select(
+            models.ContentRevision.item_id,
+            func.max(models.ContentRevision.number),
+            func.max(case((models.ContentRevision.keyframe, models.ContentRevision.number))),
+        )
+        .filter(models.ContentRevision.item_id.in_(list(deltas)))
+        .group_by(models.ContentRevision.item_id)
+    )
+    latest = {item_id: (number, keyframe_number) for item_id, number, keyframe_number in await db.execute(query)}
+
+    now = datetime.datetime.utcnow()
+    rows = []
+    for item_id, delta in deltas.items():
+        old, new = states[item_id]
+        number, keyframe_number = latest.get(item_id, (0, None))
+        if number == 0:
+            rows.append({"item_id": item_id, "number": 1, "keyframe": True, "data": _keyframe_data(old), "created_at": now})
+            number = keyframe_number = 1
+        number += 1
+        keyframe = keyframe_number is None or number - keyframe_number >= KEYFRAME_INTERVAL
+        rows.append({
+            "item_id": item_id,
+            "number": number,
+            "keyframe": keyframe,
+            "data": _keyframe_data(new) if keyframe else delta,
+            "created_at": now,
+        })
+    await db.execute(insert(models.ContentRevision), rows)
+    return list(deltas)
+
+
+async def get_revision(db: AsyncSession, item_id: int, number: int) -> Optional[RevisionState]:
+    """
+    Reconstructs an item at the given revision from the nearest keyframe at or before
+    it and the deltas since. Returns None if the revision does not exist.
+    """
+    if number < 1:
+        return None
+    keyframe_number = (
+        select(func.max(models.ContentRevision.number))
+        .filter(
+            models.ContentRevision.item_id == item_id,
+            models.ContentRevision.keyframe.is_(True),
+            models.ContentRevision.number <= number,
+        )
+        .scalar_subquery()
+    )
+    query = (
+        select(models.ContentRevision.number, models.ContentRevision.keyframe, models.ContentRevision.data)
+        .filter(
+            models.ContentRevision.item_id == item_id,
+            models.ContentRevision.number.between(keyframe_number, number),
+        )
+        .order_by(models.ContentRevision.number)
+    )
+    rows = (await db.execute(query)).all()
+    if not rows or rows[-1].number != number:
+        return None
+
+    state = None
+    for row in rows:
+        state = _apply(state, row.keyframe, row.data)
+    return state
+
+
+async def list_revisions(db: AsyncSession, item_id: int) -> List[dict]:
+    """
+    Lists an item's revisions, oldest first, with what each one changed.
+    """
+    query = (
+        select(models.ContentRevision)
+        .filter(models.ContentRevision.item_id == item_id)
+        .order_by(models.ContentRevision.number)
+    )
+    revisions = []
+    state = None
+    for revision in (await db.execute(query)).scalars():
+        previous, state = state, _apply(state, revision.keyframe, revision.data)
+        changes = diff(previous or RevisionState("", {}), state)
+        revisions.append({
+            "number": revision.number,
+            "created_at": revision.created_at,
+            "keyframe": revision.keyframe,
+            "title_changed": previous is None or previous.title != state.title,
+            "changed_field_ids": [change["field_id"] for change in changes["changes"] if change["change"] != "removed"],
+            "removed_field_ids": [change["field_id"] for change in changes["changes"] if change["change"] == "removed"],
+        })
+    return revisions
+
+
+def diff(old: RevisionState, new: RevisionState) -> dict:
+    """
+    Compares two states field by field. Returns the title change, if any, and a list of
+    added, changed and removed fields in field order.
+    """
+    changes = []
+    for field_id, value in new.values.items():
+        if field_id not in old.values:
+            changes.append({"field_id": field_id, "change": "added", "old": None, "new": value})
+        elif not same_value(old.values[field_id], value):
+            changes.append({"field_id": field_id, "change": "changed", "old": old.values[field_id], "new": value})
+    for field_id, value in old.values.items():
+        if field_id not in new.values:
+            changes.append({"field_id": field_id, "change": "removed", "old": value, "new": None})
+
+    title = {"old": old.title, "new": new.title} if old.title != new.title else None
+    return {"title": title, "changes": changes}
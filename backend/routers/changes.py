@@ -0,0 +1,73 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+import changes, config, models, schemas
+from database import ReadSessionLocal, SessionLocal
+
+router = APIRouter()
+
+# Dependency to get a DB session
+async def get_db():
+    async with SessionLocal() as session:
+        yield session
+
+# Dependency to get a DB session from the read-only connection pool
+async def get_read_db():
+    async with ReadSessionLocal() as session:
+        yield session
+
+@router.get("/changes", response_model=schemas.ChangeFeed)
+async def read_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    timeout: float = Query(0, ge=0),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Retrieve changes to content items and templates after the event ID `since`, oldest first.
+
+    With a `timeout` (in seconds, capped by the CHANGES_MAX_WAIT setting) the request
+    waits for a change if there is none yet, so consumers can long-poll the feed by
+    passing the returned `last_event_id` as the next `since`.
+    """
+    events = await changes.wait_for_changes(db, since, limit, min(timeout, config.CHANGES_MAX_WAIT))
+    return schemas.ChangeFeed(events=events, last_event_id=events[-1].id if events else since)
+
+@router.post("/webhooks/", response_model=schemas.Webhook)
+async def create_webhook(webhook: schemas.WebhookCreate, db: AsyncSession = Depends(get_db)):
+    """
+    Register a URL to receive change events.
+
+    Events are delivered from `since`, or from the next recorded change if it is not
+    given. Requests are signed with `secret`, if given.
+    """
+    since = webhook.since if webhook.since is not None else await changes.latest_event_id(db)
+    db_webhook = models.Webhook(url=str(webhook.url), secret=webhook.secret, last_event_id=since)
+    db.add(db_webhook)
+    await db.commit()
+    await db.refresh(db_webhook)
+    # Deliver any backlog from `since` right away
+    changes.notify()
+    return db_webhook
+
+@router.get("/webhooks/", response_model=List[schemas.Webhook])
+async def read_webhooks(db: AsyncSession = Depends(get_db)):
+    """
+    List registered webhooks and their delivery state.
+    """
+    result = await db.execute(select(models.Webhook).order_by(models.Webhook.id))
+    return result.scalars().all()
+
+@router.delete("/webhooks/{webhook_id}", status_code=204)
+async def delete_webhook(webhook_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Stop delivering change events to a webhook and remove it.
+    """
+    db_webhook = await db.get(models.Webhook, webhook_id)
+    if db_webhook is None:
+        raise HTTPException(status_code=404, detail="Webhook not found")
+    await db.delete(db_webhook)
+    await db.commit()
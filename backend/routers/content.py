@@ -1,10 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+import datetime
+import email.utils
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 
-import crud, schemas, services
-from database import SessionLocal
+import config, crud, documents, frontmatter, revisions, schemas, search, serialization, services
+from cache import make_version_stamp, render_cache
+from pagination import InvalidCursor, decode_cursor, encode_cursor
+from render_pool import ItemSnapshot, ValueSnapshot
+from schema_cache import schema_cache
+from database import ReadSessionLocal, SessionLocal
 
 router = APIRouter()
 
@@ -13,53 +20,319 @@ async def get_db():
     async with SessionLocal() as session:
         yield session
 
+# Dependency to get a DB session from the read-only connection pool
+async def get_read_db():
+    async with ReadSessionLocal() as session:
+        yield session
+
 @router.post("/content/", response_model=schemas.ContentItem)
 async def create_content_item(item: schemas.ContentItemCreate, db: AsyncSession = Depends(get_db)):
     """
     Create a new content item based on a template.
+
+    The values are validated in memory against the cached template schema: every
+    value must belong to a template field and match its data type, and every
+    required field must be present.
     """
     # Check if the template exists
-    template = await crud.get_template(db, item.template_id)
+    template = await schema_cache.get(db, item.template_id)
     if not template:
         raise HTTPException(status_code=404, detail=f"Template with id {item.template_id} not found")
 
-    # Basic validation: Check if the number of values matches the number of fields
-    if len(item.values) != len(template.fields):
-        raise HTTPException(status_code=400, detail="Number of values does not match number of template fields")
-
-    # More advanced validation (optional for now, but good to have):
-    # - Check if all required fields are present
-    # - Check if field_ids in values are valid for this template
+    item.values = template.without_removed(item.values)
+    errors = template.validate(item.values)
+    if errors:
+        raise HTTPException(status_code=400, detail="; ".join(errors))
 
     return await crud.create_content_item(db=db, item=item)
 
+@router.post("/content/batch", response_model=schemas.BatchResult)
+async def create_content_items_batch(items: List[schemas.ContentItemCreate], db: AsyncSession = Depends(get_db)):
+    """
+    Create many content items in a single transaction.
+
+    Every item is validated up front; invalid items are reported in `errors` by their
+    index in the request and the remaining items are still created.
+    """
+    templates = await schema_cache.get_many(db, {item.template_id for item in items})
+
+    valid_indexes, errors = [], []
+    for index, item in enumerate(items):
+        detail = _validate_batch_item(item, templates.get(item.template_id))
+        if detail is None:
+            valid_indexes.append(index)
+        else:
+            errors.append(schemas.BatchItemError(index=index, detail=detail))
+
+    item_ids = await crud.create_content_items_bulk(db, [items[index] for index in valid_indexes])
+    created = [schemas.BatchItemCreated(index=index, id=item_id) for index, item_id in zip(valid_indexes, item_ids)]
+    return schemas.BatchResult(created=created, errors=errors)
+
+def _validate_batch_item(item: schemas.ContentItemCreate, template):
+    """
+    Applies the single-item create checks to one batch entry. Returns an error message or None.
+    """
+    if template is None:
+        return f"Template with id {item.template_id} not found"
+    item.values = template.without_removed(item.values)
+    errors = template.validate(item.values)
+    return "; ".join(errors) if errors else None
+
+@router.get("/content/search", response_model=List[schemas.SearchResult])
+async def search_content_items(
+    q: str = Query(..., min_length=1),
+    template_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Full-text search over content titles, bodies and text fields, best matches first.
+    """
+    return await search.search_content(db, q, template_id=template_id, limit=limit, offset=offset)
+
 @router.get("/content/", response_model=List[schemas.ContentItem])
-async def read_content_items(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+async def read_content_items(
+    request: Request,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=config.NDJSON_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    template_id: Optional[int] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+    title_prefix: Optional[str] = None,
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+):
     """
-    Retrieve all content items.
+    Retrieve content items, oldest first.
+
+    When a full page is returned, the `X-Next-Cursor` header holds an opaque token to
+    pass as `cursor` for the next page. Set `include_total` to get the number of
+    matching items in `X-Total-Count`.
+
+    Pages are limited to LIST_MAX_LIMIT items, unless the client accepts
+    `application/x-ndjson`: then up to NDJSON_MAX_LIMIT items are streamed, one per line.
     """
-    items = await crud.get_content_items(db, skip=skip, limit=limit)
-    return items
+    ndjson = serialization.wants_ndjson(request)
+    if limit > config.LIST_MAX_LIMIT and not ndjson:
+        raise HTTPException(
+            status_code=400,
+            detail=f"limit above {config.LIST_MAX_LIMIT} requires Accept: {serialization.NDJSON_MEDIA_TYPE}",
+        )
+
+    after = None
+    if cursor is not None:
+        try:
+            created_at, item_id = decode_cursor(cursor, 2)
+            after = (datetime.datetime.fromisoformat(created_at), int(item_id))
+        except (InvalidCursor, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    filters = dict(
+        template_id=template_id,
+        created_after=created_after,
+        created_before=created_before,
+        title_prefix=title_prefix,
+    )
+    headers = {}
+    if include_total:
+        headers["X-Total-Count"] = str(await crud.count_content_items(db, **filters))
+
+    if ndjson:
+        # The headers go out before the page is read, so find its end up front
+        end = await crud.get_content_page_end(db, skip=skip, limit=limit, after=after, **filters)
+        if end is not None:
+            headers["X-Next-Cursor"] = encode_cursor([end[0].isoformat(), end[1]])
+        chunks = crud.iter_content_item_rows(
+            db, limit, skip=skip, after=after, chunk_size=config.NDJSON_CHUNK_SIZE, **filters,
+        )
+        return serialization.ndjson_response(chunks, headers)
+
+    if documents.is_enabled():
+        page = await crud.get_content_item_documents(db, skip=skip, limit=limit, after=after, **filters)
+        if len(page) == limit:
+            headers["X-Next-Cursor"] = encode_cursor([page[-1][0].isoformat(), page[-1][1]])
+        body = b"[" + b",".join(document for _, _, document in page) + b"]"
+        return Response(body, media_type="application/json", headers=headers)
+
+    items = await crud.get_content_item_rows(db, skip=skip, limit=limit, after=after, **filters)
+    if len(items) == limit:
+        headers["X-Next-Cursor"] = encode_cursor([items[-1]["created_at"].isoformat(), items[-1]["id"]])
+    return serialization.FastJSONResponse(items, headers=headers)
 
 @router.get("/content/{item_id}", response_model=schemas.ContentItem)
-async def read_content_item(item_id: int, db: AsyncSession = Depends(get_db)):
+async def read_content_item(item_id: int, db: AsyncSession = Depends(get_read_db)):
     """
     Retrieve a single content item by its ID.
+
+    With the content documents read model enabled, the item's stored JSON is returned as is.
     """
+    if documents.is_enabled():
+        document = await documents.get_document(db, item_id)
+        if document is not None:
+            return Response(document, media_type="application/json")
     db_item = await crud.get_content_item(db, item_id=item_id)
     if db_item is None:
         raise HTTPException(status_code=404, detail="Content item not found")
     return db_item
 
+@router.put("/content/{item_id}", response_model=schemas.ContentItem)
+async def update_content_item(item_id: int, item: schemas.ContentItemUpdate, db: AsyncSession = Depends(get_db)):
+    """
+    Replace a content item's title and values, recording the change as a new revision.
+
+    The values are validated like those of a new item. Fields left out are removed.
+    """
+    version = await crud.get_content_item_version(db, item_id=item_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Content item not found")
+
+    template = await schema_cache.get(db, version.template_id)
+    # Items read before a template change removed a field may still carry its value
+    item.values = template.without_removed(item.values)
+    errors = template.validate(item.values)
+    if errors:
+        raise HTTPException(status_code=400, detail="; ".join(errors))
+
+    return await crud.update_content_item(db, item_id=item_id, item=item)
+
+@router.get("/content/{item_id}/revisions", response_model=List[schemas.ContentRevision])
+async def list_content_revisions(item_id: int, db: AsyncSession = Depends(get_read_db)):
+    """
+    List the revisions of a content item, oldest first, with the fields each one changed.
+    """
+    if await crud.get_content_item_version(db, item_id=item_id) is None:
+        raise HTTPException(status_code=404, detail="Content item not found")
+    return await revisions.list_revisions(db, item_id)
+
+@router.get("/content/{item_id}/revisions/diff", response_model=schemas.RevisionDiff)
+async def diff_content_revisions(
+    item_id: int,
+    from_revision: int = Query(..., alias="from"),
+    to_revision: int = Query(..., alias="to"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Compare two revisions of a content item field by field.
+    """
+    version = await crud.get_content_item_version(db, item_id=item_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Content item not found")
+    old = await revisions.get_revision(db, item_id, from_revision)
+    new = await revisions.get_revision(db, item_id, to_revision)
+    if old is None or new is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+
+    template = await schema_cache.get(db, version.template_id)
+    result = revisions.diff(old, new)
+    for change in result["changes"]:
+        field = template.fields.get(change["field_id"])
+        change["field_name"] = field.name if field is not None else None
+    return schemas.RevisionDiff(from_revision=from_revision, to_revision=to_revision, **result)
+
+@router.get("/content/{item_id}/revisions/{number}/markdown", response_class=PlainTextResponse)
+async def get_content_revision_as_markdown(
+    item_id: int,
+    number: int,
+    front_matter: str = "yaml",
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Retrieve a past revision of a content item formatted as a Markdown file.
+    """
+    if front_matter not in frontmatter.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported front matter format: {front_matter}")
+    version = await crud.get_content_item_version(db, item_id=item_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Content item not found")
+    state = await revisions.get_revision(db, item_id, number)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+
+    template = await schema_cache.get(db, version.template_id)
+    snapshot = ItemSnapshot(
+        id=item_id,
+        title=state.title,
+        template_id=version.template_id,
+        created_at=version.created_at,
+        # Values of fields that have since been removed from the template cannot be rendered
+        values=tuple(ValueSnapshot(field_id, value) for field_id, value in state.values.items()
+                     if field_id in template.fields),
+    )
+    try:
+        return PlainTextResponse(services.generate_markdown_from_item(snapshot, template, front_matter))
+    except frontmatter.FrontMatterError as error:
+        raise HTTPException(status_code=422, detail=str(error))
+
 @router.get("/content/{item_id}/markdown", response_class=PlainTextResponse)
-async def get_content_item_as_markdown(item_id: int, db: AsyncSession = Depends(get_db)):
+async def get_content_item_as_markdown(
+    item_id: int,
+    request: Request,
+    front_matter: str = "yaml",
+    db: AsyncSession = Depends(get_read_db),
+):
     """
-    Retrieve a single content item formatted as a Markdown file.
+    Retrieve a single content item formatted as a Markdown file, with YAML or TOML front matter.
+
+    Rendered YAML output is cached per item version. The response carries ETag and
+    Last-Modified headers, and conditional requests are answered with 304 before
+    anything is loaded or rendered.
     """
-    # Use the specialized crud function to ensure all data is loaded efficiently
-    db_item = await crud.get_content_item_for_markdown(db, item_id=item_id)
-    if db_item is None:
+    if front_matter not in frontmatter.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported front matter format: {front_matter}")
+
+    version = await crud.get_content_item_version(db, item_id=item_id)
+    if version is None:
         raise HTTPException(status_code=404, detail="Content item not found")
 
-    markdown_content = services.generate_markdown_from_item(db_item)
-    return markdown_content
+    template_id, created_at, item_updated_at, template_updated_at, item_version = version
+    item_updated_at = item_updated_at or created_at
+    stamp = make_version_stamp(item_id, item_version, template_updated_at, front_matter)
+    last_modified = max(item_updated_at, template_updated_at or item_updated_at)
+    headers = {
+        "ETag": f'"{stamp}"',
+        "Last-Modified": email.utils.format_datetime(last_modified.replace(tzinfo=datetime.timezone.utc), usegmt=True),
+    }
+    if _not_modified(request, headers["ETag"], last_modified):
+        return Response(status_code=304, headers=headers)
+
+    # The cache holds one rendering per item, so only the default format is cached
+    cached = front_matter == "yaml"
+    markdown_content = render_cache.get(item_id, stamp, template_id) if cached else None
+    if markdown_content is None:
+        document = await documents.get_document(db, item_id) if documents.is_enabled() else None
+        try:
+            if document is not None:
+                template = await schema_cache.get(db, template_id)
+                markdown_content = services.generate_markdown_from_item(documents.to_snapshot(document), template, front_matter)
+            else:
+                # Use the specialized crud function to ensure all data is loaded efficiently
+                db_item = await crud.get_content_item_for_markdown(db, item_id=item_id)
+                markdown_content = services.generate_markdown_from_item(db_item, front_matter_format=front_matter)
+        except frontmatter.FrontMatterError as error:
+            raise HTTPException(status_code=422, detail=str(error))
+        if cached:
+            render_cache.set(item_id, stamp, template_id, markdown_content)
+
+    return PlainTextResponse(markdown_content, headers=headers)
+
+def _not_modified(request: Request, etag: str, last_modified: datetime.datetime) -> bool:
+    """
+    Evaluates If-None-Match, falling back to If-Modified-Since, against the current version.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return any(tag.strip() in (etag, f"W/{etag}", "*") for tag in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is not None:
+            since = since.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        # HTTP dates have one-second resolution
+        return last_modified.replace(microsecond=0) <= since
+    return False
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, HTTPException
+
+import instrumentation
+
+router = APIRouter()
+
+@router.get("/debug/queries")
+async def read_recent_query_stats():
+    """
+    Retrieve SQL statistics of the most recent requests, newest first.
+
+    Only available when the DEBUG_ENDPOINTS environment variable is set.
+    """
+    if not instrumentation.DEBUG_ENDPOINTS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return list(reversed(instrumentation.recent_requests))
@@ -0,0 +1,78 @@
+import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.types import Receive, Scope, Send
+
+import export, frontmatter, jobs
+from database import ReadSessionLocal
+
+router = APIRouter()
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    A streamed response that holds an admission slot until it has been sent. The slot
+    is released however sending ends: completed, failed, or abandoned by the client
+    before or while the body is read.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            jobs.admission.release()
+            # Stops reading and rendering content for a client that went away
+            await self.body_iterator.aclose()
+
+
+# Dependency to get a DB session from the read-only connection pool
+async def get_db():
+    async with ReadSessionLocal() as session:
+        yield session
+
+@router.get("/export")
+async def export_site(
+    format: str = "tar",
+    template_id: Optional[int] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+    front_matter: str = "yaml",
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Export all content items as Markdown files, streamed as a tar or zip archive.
+    `front_matter` selects YAML or TOML front matter. Large sites are better exported
+    with an export job (POST /jobs/), which does not depend on the connection.
+    """
+    if format not in export.ARCHIVE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported archive format: {format}")
+    if front_matter not in frontmatter.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported front matter format: {front_matter}")
+
+    # Heavy operations share a few slots, so that they do not starve other requests
+    if not jobs.admission.try_acquire():
+        raise HTTPException(
+            status_code=503,
+            detail="Too many heavy operations are running; try again later, or submit an export job",
+            headers={"Retry-After": "30"},
+        )
+    try:
+        stream = export.stream_site_archive(
+            db,
+            archive_format=format,
+            template_id=template_id,
+            created_after=created_after,
+            created_before=created_before,
+            front_matter_format=front_matter,
+        )
+        return AdmittedStreamingResponse(
+            stream,
+            media_type=export.ARCHIVE_FORMATS[format],
+            headers={"Content-Disposition": f'attachment; filename="site.{format}"'},
+        )
+    except BaseException:
+        jobs.admission.release()
+        raise
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import jobs, schemas
+from database import SessionLocal
+
+router = APIRouter()
+
+# Dependency to get a DB session
+async def get_db():
+    async with SessionLocal() as session:
+        yield session
+
+@router.post("/import", response_model=schemas.Job, status_code=202)
+async def import_markdown(request: schemas.ImportJobParams, db: AsyncSession = Depends(get_db)):
+    """
+    Import a directory of Markdown files from the server's filesystem, as a job.
+
+    Paths are resolved against the IMPORT_ROOT setting; the endpoint is disabled
+    when it is not set. Returns the queued import job, whose result lists the files
+    imported, skipped and failed once it completes.
+    """
+    try:
+        return await jobs.submit(db, schemas.JobCreate(type="import", params=request.model_dump()))
+    except jobs.JobError as error:
+        raise HTTPException(status_code=error.status_code, detail=str(error))
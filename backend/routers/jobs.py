@@ -0,0 +1,79 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import export, jobs, schemas
+from database import ReadSessionLocal, SessionLocal
+
+router = APIRouter()
+
+# Dependency to get a DB session
+async def get_db():
+    async with SessionLocal() as session:
+        yield session
+
+# Dependency to get a DB session from the read-only connection pool
+async def get_read_db():
+    async with ReadSessionLocal() as session:
+        yield session
+
+@router.post("/jobs/", response_model=schemas.Job, status_code=202)
+async def submit_job(job: schemas.JobCreate, db: AsyncSession = Depends(get_db)):
+    """
+    Queue a long-running operation: an `export` archive, an `import` of a directory of
+    Markdown files, or a static-site `build`. Returns the job, to be polled for its
+    progress and result.
+    """
+    try:
+        return await jobs.submit(db, job)
+    except jobs.JobError as error:
+        raise HTTPException(status_code=error.status_code, detail=str(error))
+
+@router.get("/jobs/", response_model=List[schemas.Job])
+async def read_jobs(
+    status: Optional[str] = None, type: Optional[str] = None, limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Retrieve jobs, newest first.
+    """
+    return await jobs.get_jobs(db, status=status, type=type, limit=limit)
+
+@router.get("/jobs/{job_id}", response_model=schemas.Job)
+async def read_job(job_id: int, db: AsyncSession = Depends(get_read_db)):
+    """
+    Retrieve a job's status, progress and, once it has completed, its result.
+    """
+    job = await jobs.get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/jobs/{job_id}/cancel", response_model=schemas.Job)
+async def cancel_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Cancel a queued job, or stop a running one after its current batch.
+    """
+    try:
+        job = await jobs.cancel(db, job_id)
+    except jobs.JobError as error:
+        raise HTTPException(status_code=error.status_code, detail=str(error))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}/archive")
+async def download_export(job_id: int, db: AsyncSession = Depends(get_read_db)):
+    """
+    Download the archive written by a completed export job.
+    """
+    job = await jobs.get_job(db, job_id)
+    if job is None or job.type != "export":
+        raise HTTPException(status_code=404, detail="Export job not found")
+    path = jobs.export_path(job)
+    if path is None:
+        raise HTTPException(status_code=409, detail=f"The export is {job.status}")
+    archive_format = job.params["format"]
+    return FileResponse(path, media_type=export.ARCHIVE_FORMATS[archive_format], filename=f"site.{archive_format}")
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, HTTPException, Response
+
+import metrics
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def read_metrics():
+    """
+    Retrieve the metrics of this process in the Prometheus text format.
+
+    Not available when the METRICS_ENABLED environment variable is set to 0.
+    """
+    if not metrics.is_enabled():
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
@@ -1,10 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 
-import crud, schemas
-from database import SessionLocal, engine
-from models import Base
+import config, crud, schemas, serialization, template_changes
+from database import ReadSessionLocal, SessionLocal
+from pagination import InvalidCursor, decode_cursor, encode_cursor
 
 router = APIRouter()
 
@@ -13,6 +13,11 @@ async def get_db():
     async with SessionLocal() as session:
         yield session
 
+# Dependency to get a DB session from the read-only connection pool
+async def get_read_db():
+    async with ReadSessionLocal() as session:
+        yield session
+
 @router.post("/templates/", response_model=schemas.PageTemplate)
 async def create_template(template: schemas.PageTemplateCreate, db: AsyncSession = Depends(get_db)):
     """
@@ -23,16 +28,84 @@ async def create_template(template: schemas.PageTemplateCreate, db: AsyncSession
         raise HTTPException(status_code=400, detail="Template with this name already exists")
     return await crud.create_template(db=db, template=template)
 
+@router.post("/templates/batch", response_model=schemas.BatchResult)
+async def create_templates_batch(templates: List[schemas.PageTemplateCreate], db: AsyncSession = Depends(get_db)):
+    """
+    Create many page templates in a single transaction.
+
+    Templates whose name is already taken, or repeated within the batch, are reported
+    in `errors` by their index in the request and the rest are still created.
+    """
+    taken = await crud.get_existing_template_names(db, [template.name for template in templates])
+
+    valid_indexes, errors = [], []
+    for index, template in enumerate(templates):
+        if template.name in taken:
+            errors.append(schemas.BatchItemError(index=index, detail="Template with this name already exists"))
+        else:
+            taken.add(template.name)
+            valid_indexes.append(index)
+
+    template_ids = await crud.create_templates_bulk(db, [templates[index] for index in valid_indexes])
+    created = [schemas.BatchItemCreated(index=index, id=template_id) for index, template_id in zip(valid_indexes, template_ids)]
+    return schemas.BatchResult(created=created, errors=errors)
+
 @router.get("/templates/", response_model=List[schemas.PageTemplate])
-async def read_templates(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+async def read_templates(
+    request: Request,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=config.NDJSON_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+):
     """
-    Retrieve all page templates.
+    Retrieve page templates ordered by ID.
+
+    When a full page is returned, the `X-Next-Cursor` header holds an opaque token to
+    pass as `cursor` for the next page. Set `include_total` to get the number of
+    matching templates in `X-Total-Count`.
+
+    Pages are limited to LIST_MAX_LIMIT templates, unless the client accepts
+    `application/x-ndjson`: then up to NDJSON_MAX_LIMIT templates are streamed, one per line.
     """
-    templates = await crud.get_templates(db, skip=skip, limit=limit)
-    return templates
+    ndjson = serialization.wants_ndjson(request)
+    if limit > config.LIST_MAX_LIMIT and not ndjson:
+        raise HTTPException(
+            status_code=400,
+            detail=f"limit above {config.LIST_MAX_LIMIT} requires Accept: {serialization.NDJSON_MEDIA_TYPE}",
+        )
+
+    after_id = None
+    if cursor is not None:
+        try:
+            (after_id,) = decode_cursor(cursor, 1)
+            after_id = int(after_id)
+        except (InvalidCursor, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    headers = {}
+    if include_total:
+        headers["X-Total-Count"] = str(await crud.count_templates(db, name_prefix=name_prefix))
+
+    if ndjson:
+        # The headers go out before the page is read, so find its end up front
+        end = await crud.get_template_page_end(db, skip=skip, limit=limit, after_id=after_id, name_prefix=name_prefix)
+        if end is not None:
+            headers["X-Next-Cursor"] = encode_cursor([end])
+        chunks = crud.iter_template_rows(
+            db, limit, skip=skip, after_id=after_id, name_prefix=name_prefix, chunk_size=config.NDJSON_CHUNK_SIZE,
+        )
+        return serialization.ndjson_response(chunks, headers)
+
+    templates = await crud.get_template_rows(db, skip=skip, limit=limit, after_id=after_id, name_prefix=name_prefix)
+    if len(templates) == limit:
+        headers["X-Next-Cursor"] = encode_cursor([templates[-1]["id"]])
+    return serialization.FastJSONResponse(templates, headers=headers)
 
 @router.get("/templates/{template_id}", response_model=schemas.PageTemplate)
-async def read_template(template_id: int, db: AsyncSession = Depends(get_db)):
+async def read_template(template_id: int, db: AsyncSession = Depends(get_read_db)):
     """
     Retrieve a single page template by its ID.
     """
@@ -40,3 +113,44 @@ async def read_template(template_id: int, db: AsyncSession = Depends(get_db)):
     if db_template is None:
         raise HTTPException(status_code=404, detail="Template not found")
     return db_template
+
+@router.post("/templates/{template_id}/changes", response_model=schemas.TemplateChange, status_code=202)
+async def change_template(template_id: int, change: schemas.TemplateChangeCreate, db: AsyncSession = Depends(get_db)):
+    """
+    Add, rename or remove fields of a template that may already have content.
+
+    The operations are applied in order, and all or none of them take effect:
+
+    - `{"op": "add", "field": {...}, "default": value}` adds a field; existing items
+      get `default` as its value, unless it is null,
+    - `{"op": "rename", "field_id": 1, "name": "..."}` renames a field,
+    - `{"op": "remove", "field_id": 1}` removes a field and its values.
+
+    The template changes at once. Its content items are updated by a background job,
+    returned here; poll GET /templates/{template_id}/changes/{change_id} for its progress.
+    """
+    try:
+        job = await template_changes.apply_changes(db, template_id, change.operations)
+    except template_changes.TemplateChangeError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return job
+
+@router.get("/templates/{template_id}/changes", response_model=List[schemas.TemplateChange])
+async def read_template_changes(template_id: int, db: AsyncSession = Depends(get_read_db)):
+    """
+    List the changes of a template, newest first, with the progress of their jobs.
+    """
+    return await template_changes.get_changes(db, template_id)
+
+@router.get("/templates/{template_id}/changes/{change_id}", response_model=schemas.TemplateChange)
+async def read_template_change(template_id: int, change_id: int, db: AsyncSession = Depends(get_read_db)):
+    """
+    Retrieve a template change and the progress of its job: `processed` of `total`
+    items, and the items that no longer pass validation.
+    """
+    job = await template_changes.get_change(db, template_id, change_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Template change not found")
+    return job
@@ -0,0 +1,151 @@
+import dataclasses
+import time
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+import config, metrics, models, schemas
+from datatypes import CompiledField, InvalidValue, compile_field
+
+
+@dataclasses.dataclass(frozen=True)
+class TemplateSchema:
+    """
+    An immutable snapshot of a template's compiled fields, sufficient to validate and
+    render content without the database.
+    """
+    id: int
+    name: str
+    version: int
+    fields: Dict[int, CompiledField]
+    required_field_ids: Tuple[int, ...]
+    # Fields a template change is removing: their values are dropped, not rejected
+    removed_field_ids: FrozenSet[int] = frozenset()
+
+    @classmethod
+    def from_template(cls, template: models.PageTemplate, version: int,
+                      fields: Optional[Iterable[models.TemplateField]] = None) -> "TemplateSchema":
+        """
+        Compiles the template's fields. Pass `fields` to include fields being removed,
+        which template.fields leaves out.
+        """
+        fields = template.fields if fields is None else fields
+        active = {
+            field.id: compile_field(field.id, field.name, field.data_type, field.required)
+            for field in fields if field.removed_at is None
+        }
+        removed = frozenset(field.id for field in fields if field.removed_at is not None)
+        required = tuple(field.id for field in active.values() if field.required)
+        return cls(id=template.id, name=template.name, version=version, fields=active, required_field_ids=required,
+                   removed_field_ids=removed)
+
+    def without_removed(self, values: List[schemas.ContentValueCreate]) -> List[schemas.ContentValueCreate]:
+        """
+        Drops values of fields being removed, e.g. from an item read before the removal
+        and written back unchanged.
+        """
+        if not self.removed_field_ids:
+            return values
+        return [value for value in values if value.field_id not in self.removed_field_ids]
+
+    def validate(self, values: Iterable[schemas.ContentValueCreate]) -> List[str]:
+        """
+        Checks content values against the template. Returns a list of error messages.
+
+        Every value must belong to a field of the template, appear once, and match the
+        field's data type; every required field must have a non-null value. Values are
+        replaced by what the data type stores, e.g. numbers for numeric strings and
+        None for blank ones.
+        """
+        errors, seen = [], set()
+        for value in values:
+            field = self.fields.get(value.field_id)
+            if field is None:
+                errors.append(f"Field {value.field_id} does not belong to template {self.id}")
+                continue
+            if value.field_id in seen:
+                errors.append(f"Field '{field.name}' has more than one value")
+                continue
+            seen.add(value.field_id)
+            if value.value is None:
+                continue
+            try:
+                value.value = field.validate(value.value)
+            except InvalidValue as error:
+                errors.append(f"Field '{field.name}' {error}")
+
+        provided = {value.field_id for value in values if value.value is not None}
+        for field_id in self.required_field_ids:
+            if field_id not in provided:
+                errors.append(f"Missing required field '{self.fields[field_id].name}'")
+        return errors
+
+
+class TemplateSchemaCache:
+    """
+    A process-wide cache of template schemas, so content writes do not query the template.
+
+    Template writes in this process invalidate entries immediately and bump the cache
+    version; the TTL bounds how long another worker's template change can go unseen.
+    """
+
+    def __init__(self, ttl: float = config.TEMPLATE_SCHEMA_CACHE_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._schemas: Dict[int, Tuple[TemplateSchema, float]] = {}
+
+    async def get(self, db: AsyncSession, template_id: int) -> Optional[TemplateSchema]:
+        return (await self.get_many(db, [template_id])).get(template_id)
+
+    async def get_many(self, db: AsyncSession, template_ids: Iterable[int]) -> Dict[int, TemplateSchema]:
+        """
+        Returns the schemas of the given templates, loading any missing ones in one query.
+        Templates that do not exist are left out.
+        """
+        now = time.monotonic()
+        found, missing = {}, set()
+        for template_id in template_ids:
+            entry = self._schemas.get(template_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                found[template_id] = entry[0]
+            else:
+                missing.add(template_id)
+        self.hits += len(found)
+        self.misses += len(missing)
+
+        if missing:
+            version = self.version
+            query = (
+                select(models.PageTemplate)
+                .filter(models.PageTemplate.id.in_(missing))
+                .options(selectinload(models.PageTemplate.all_fields))
+            )
+            for template in (await db.execute(query)).scalars().all():
+                schema = TemplateSchema.from_template(template, version, template.all_fields)
+                found[template.id] = schema
+                # Skip caching if a template changed while we were loading
+                if version == self.version:
+                    self._schemas[template.id] = (schema, now)
+        return found
+
+    def invalidate(self, template_id: Optional[int] = None):
+        self.version += 1
+        if template_id is None:
+            self._schemas.clear()
+        else:
+            self._schemas.pop(template_id, None)
+
+
+# The process-wide template schema cache used by the API.
+schema_cache = TemplateSchemaCache()
+
+metrics.registry.register(metrics.CounterFunction(
+    "template_schema_cache_hits_total", "Template schemas served from the schema cache.", lambda: schema_cache.hits,
+))
+metrics.registry.register(metrics.CounterFunction(
+    "template_schema_cache_misses_total", "Template schemas loaded from the database.", lambda: schema_cache.misses,
+))
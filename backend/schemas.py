@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional, Any
+from pydantic import BaseModel, HttpUrl
+from typing import List, Literal, Optional, Any
 import datetime
 
 # Schemas for TemplateField
@@ -54,6 +54,10 @@ class ContentItemBase(BaseModel):
 class ContentItemCreate(ContentItemBase):
     values: List[ContentValueCreate]
 
+class ContentItemUpdate(BaseModel):
+    title: str
+    values: List[ContentValueCreate]
+
 class ContentItem(ContentItemBase):
     id: int
     created_at: datetime.datetime
@@ -61,3 +65,169 @@ class ContentItem(ContentItemBase):
 
     class Config:
         from_attributes = True
+
+# Schemas for content revisions
+class ContentRevision(BaseModel):
+    number: int
+    created_at: datetime.datetime
+    keyframe: bool
+    title_changed: bool
+    changed_field_ids: List[int]
+    removed_field_ids: List[int]
+
+class TitleChange(BaseModel):
+    old: str
+    new: str
+
+class FieldChange(BaseModel):
+    field_id: int
+    field_name: Optional[str] = None
+    change: str
+    old: Any = None
+    new: Any = None
+
+class RevisionDiff(BaseModel):
+    from_revision: int
+    to_revision: int
+    title: Optional[TitleChange] = None
+    changes: List[FieldChange] = []
+
+# Schemas for search results
+class SearchResult(BaseModel):
+    id: int
+    title: str
+    template_id: int
+    snippet: str
+    rank: float
+
+# Schemas for batch operations
+class BatchItemCreated(BaseModel):
+    index: int
+    id: int
+
+class BatchItemError(BaseModel):
+    index: int
+    detail: str
+
+class BatchResult(BaseModel):
+    created: List[BatchItemCreated] = []
+    errors: List[BatchItemError] = []
+
+# Schemas for the change feed and webhooks
+class ChangeEvent(BaseModel):
+    id: int
+    entity: str
+    entity_id: int
+    action: str
+    created_at: datetime.datetime
+
+    class Config:
+        from_attributes = True
+
+class ChangeFeed(BaseModel):
+    events: List[ChangeEvent] = []
+    # The ID to pass as `since` to read the events that follow
+    last_event_id: int
+
+class WebhookCreate(BaseModel):
+    url: HttpUrl
+    secret: Optional[str] = None
+    # Deliver events after this ID; defaults to only events recorded from now on
+    since: Optional[int] = None
+
+class Webhook(BaseModel):
+    id: int
+    url: str
+    active: bool
+    last_event_id: int
+    failures: int
+    next_attempt_at: Optional[datetime.datetime] = None
+    last_error: Optional[str] = None
+    created_at: datetime.datetime
+
+    class Config:
+        from_attributes = True
+
+# Schemas for template changes
+class TemplateFieldOperation(BaseModel):
+    op: Literal["add", "rename", "remove"]
+    # add: the new field, and the value given to existing items
+    field: Optional[TemplateFieldCreate] = None
+    default: Any = None
+    # rename and remove: the field to change
+    field_id: Optional[int] = None
+    # rename: the field's new name
+    name: Optional[str] = None
+
+class TemplateChangeCreate(BaseModel):
+    operations: List[TemplateFieldOperation]
+
+class ItemValidationError(BaseModel):
+    item_id: int
+    errors: List[str]
+
+class TemplateChange(BaseModel):
+    id: int
+    template_id: int
+    # The operations as applied, with the IDs of added fields
+    operations: List[dict]
+    status: str
+    processed: int
+    total: int
+    invalid: int
+    validation_errors: List[ItemValidationError] = []
+    error: Optional[str] = None
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+    finished_at: Optional[datetime.datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# Schemas for jobs
+class ExportJobParams(BaseModel):
+    format: str = "tar"
+    template_id: Optional[int] = None
+    created_after: Optional[datetime.datetime] = None
+    created_before: Optional[datetime.datetime] = None
+    front_matter: str = "yaml"
+
+class ImportJobParams(BaseModel):
+    # Relative to IMPORT_ROOT
+    path: str
+    template: Optional[str] = None
+    checkpoint: Optional[str] = None
+
+class BuildJobParams(BaseModel):
+    # Relative to BUILD_ROOT
+    output: str
+    force: bool = False
+    front_matter: str = "yaml"
+
+class JobCreate(BaseModel):
+    type: str
+    params: dict = {}
+    # Higher priorities run first
+    priority: int = 0
+
+class Job(BaseModel):
+    id: int
+    type: str
+    params: dict
+    priority: int
+    status: str
+    progress: int
+    total: Optional[int] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    cancel_requested: bool
+    attempts: int
+    created_at: datetime.datetime
+    started_at: Optional[datetime.datetime] = None
+    updated_at: datetime.datetime
+    finished_at: Optional[datetime.datetime] = None
+    worker_id: Optional[str] = None
+    heartbeat_at: Optional[datetime.datetime] = None
+
+    class Config:
+        from_attributes = True
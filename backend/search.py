@@ -0,0 +1,183 @@
+from typing import Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+import datatypes, models
+
+TABLE = models.CONTENT_SEARCH_TABLE
+
+# bm25 column weights for title, body and fields: title matches rank highest.
+BM25_WEIGHTS = (10.0, 1.0, 2.0)
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def is_supported(db: AsyncSession) -> bool:
+    return db.get_bind().dialect.name == "sqlite"
+
+
+def _searchable_strings(value) -> List[str]:
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [entry for entry in value if isinstance(entry, str)]
+    return []
+
+
+async def _load_documents(db: AsyncSession, item_ids: Iterable[int]):
+    """
+    Builds the search document (title, body, other string fields) for each item. The
+    body holds the values of body data types, such as Rich Text.
+    """
+    query = (
+        select(
+            models.ContentItem.id,
+            models.ContentItem.title,
+            models.ContentItem.template_id,
+            models.TemplateField.data_type,
+            models.ContentValue.value,
+        )
+        .outerjoin(models.ContentValue, models.ContentValue.item_id == models.ContentItem.id)
+        .outerjoin(models.TemplateField, models.ContentValue.field_id == models.TemplateField.id)
+        .filter(models.ContentItem.id.in_(list(item_ids)))
+        .order_by(models.ContentItem.id, models.ContentValue.id)
+    )
+    result = await db.execute(query)
+
+    documents = {}
+    for item_id, title, template_id, data_type, value in result.all():
+        document = documents.setdefault(
+            item_id, {"rowid": item_id, "title": title, "body": [], "fields": [], "template_id": template_id}
+        )
+        if data_type is None:
+            continue
+        target = document["body"] if datatypes.get_data_type(data_type).is_body else document["fields"]
+        target.extend(_searchable_strings(value))
+
+    for document in documents.values():
+        document["body"] = "\n".join(document["body"])
+        document["fields"] = "\n".join(document["fields"])
+    return list(documents.values())
+
+
+async def index_items(db: AsyncSession, item_ids: Iterable[int]):
+    """
+    Adds or refreshes the search entries of the given items within the caller's transaction.
+    """
+    item_ids = list(item_ids)
+    if not item_ids or not is_supported(db):
+        return
+
+    await remove_items(db, item_ids)
+    documents = await _load_documents(db, item_ids)
+    if documents:
+        await db.execute(
+            text(
+                f"INSERT INTO {TABLE} (rowid, title, body, fields, template_id) "
+                "VALUES (:rowid, :title, :body, :fields, :template_id)"
+            ),
+            documents,
+        )
+
+
+async def remove_items(db: AsyncSession, item_ids: Iterable[int]):
+    """
+    Removes the search entries of the given items within the caller's transaction.
+    """
+    item_ids = list(item_ids)
+    if not item_ids or not is_supported(db):
+        return
+    await db.execute(
+        text(f"DELETE FROM {TABLE} WHERE rowid IN ({','.join(str(int(item_id)) for item_id in item_ids)})")
+    )
+
+
+async def rebuild_index(db: AsyncSession, batch_size: int = REBUILD_BATCH_SIZE, commit: bool = True) -> int:
+    """
+    Re-creates the whole search index from the content tables. Returns the number of items indexed.
+    Pass commit=False to leave committing to the caller.
+    """
+    if not is_supported(db):
+        return 0
+
+    await db.execute(text(f"DELETE FROM {TABLE}"))
+    indexed, last_id = 0, 0
+    while True:
+        query = (
+            select(models.ContentItem.id)
+            .filter(models.ContentItem.id > last_id)
+            .order_by(models.ContentItem.id)
+            .limit(batch_size)
+        )
+        item_ids = (await db.execute(query)).scalars().all()
+        if not item_ids:
+            break
+        await index_items(db, item_ids)
+        indexed += len(item_ids)
+        last_id = item_ids[-1]
+
+    await db.execute(text(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')"))
+    if commit:
+        await db.commit()
+    return indexed
+
+
+def _like_pattern(query: str) -> str:
+    """
+    Returns a LIKE pattern matching the query anywhere, with its wildcards escaped by '\\'.
+    """
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def build_match_expression(query: str) -> str:
+    """
+    Turns free text into an FTS5 MATCH expression that ANDs its terms.
+
+    Every term is quoted, so FTS5 operators in user input are treated as plain text.
+    A trailing '*' on a term is kept as a prefix search.
+    """
+    terms = []
+    for term in query.split():
+        prefix = term.endswith("*")
+        term = term.rstrip("*")
+        if term:
+            terms.append('"' + term.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+async def search_content(db: AsyncSession, query: str, template_id: Optional[int] = None,
+                         limit: int = 20, offset: int = 0):
+    """
+    Searches content items, best matches first, returning ID, title, template ID, snippet and rank.
+    """
+    expression = build_match_expression(query)
+    if not expression:
+        return []
+
+    if not is_supported(db):
+        # Without FTS5, fall back to an unranked title match
+        statement = select(models.ContentItem.id, models.ContentItem.title, models.ContentItem.template_id) \
+            .filter(models.ContentItem.title.ilike(_like_pattern(query.strip()), escape="\\"))
+        if template_id is not None:
+            statement = statement.filter(models.ContentItem.template_id == template_id)
+        rows = (await db.execute(statement.order_by(models.ContentItem.id).limit(limit).offset(offset))).all()
+        return [
+            {"id": item_id, "title": title, "template_id": tid, "snippet": title, "rank": 0.0}
+            for item_id, title, tid in rows
+        ]
+
+    template_filter = "AND template_id = :template_id" if template_id is not None else ""
+    weights = ", ".join(str(weight) for weight in BM25_WEIGHTS)
+    statement = text(
+        f"SELECT rowid AS id, title, template_id, "
+        f"snippet({TABLE}, -1, '<mark>', '</mark>', '…', 12) AS snippet, "
+        f"bm25({TABLE}, {weights}) AS rank "
+        f"FROM {TABLE} WHERE {TABLE} MATCH :expression {template_filter} "
+        f"ORDER BY rank LIMIT :limit OFFSET :offset"
+    )
+    params = {"expression": expression, "template_id": template_id, "limit": limit, "offset": offset}
+    result = await db.execute(statement, params)
+    return [dict(row) for row in result.mappings().all()]
@@ -0,0 +1,97 @@
+"""
+Fast JSON encoding of large API responses.
+
+List endpoints build their rows as plain dicts shaped like their response models and
+return them through FastJSONResponse, skipping response model validation and
+FastAPI's generic encoder. Rows are encoded with orjson, which is in requirements.txt,
+and with the standard library where it is not installed; both produce the same JSON
+as the response models, except that orjson writes float exponents more tersely (1e16, not 1e+16).
+
+Clients that send `Accept: application/x-ndjson` get very large pages streamed as
+newline-delimited JSON, one row per line, so neither side holds the whole page.
+"""
+import datetime
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _default(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Encodes a value of plain JSON types and datetimes as compact UTF-8 JSON.
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _accepted_media_types(accept: str) -> Dict[str, float]:
+    """
+    Parses an Accept header into {media range: quality}.
+    """
+    accepted = {}
+    for media_range in accept.split(","):
+        media_type, *params = (piece.strip() for piece in media_range.split(";"))
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[media_type.lower()] = quality
+    return accepted
+
+
+def wants_ndjson(request: Request) -> bool:
+    """
+    Checks whether the client asks for NDJSON by name, and prefers it at least as much
+    as JSON. Wildcards alone keep the default JSON.
+    """
+    accepted = _accepted_media_types(request.headers.get("accept", ""))
+    ndjson = accepted.get(NDJSON_MEDIA_TYPE, 0.0)
+    json_quality = max(accepted.get(media_type, 0.0) for media_type in ("application/json", "application/*", "*/*"))
+    return ndjson > 0 and ndjson >= json_quality
+
+
+async def _ndjson_lines(chunks: AsyncIterator[List[Any]]) -> AsyncIterator[bytes]:
+    async for rows in chunks:
+        yield b"".join(dumps(row) + b"\n" for row in rows)
+
+
+def ndjson_response(chunks: AsyncIterator[List[Any]], headers: Optional[dict] = None) -> StreamingResponse:
+    """
+    Streams chunks of rows as NDJSON, one write per chunk.
+    """
+    return StreamingResponse(_ndjson_lines(chunks), media_type=NDJSON_MEDIA_TYPE, headers=headers)
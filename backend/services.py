@@ -1,32 +1,89 @@
-import yaml
-import models
+import functools
+import re
+import time
+import unicodedata
 
-def generate_markdown_from_item(item: models.ContentItem) -> str:
+import datatypes, frontmatter, metrics, models
+
+def generate_markdown_from_item(item: models.ContentItem, template=None, front_matter_format: str = "yaml") -> str:
     """
-    Generates a Markdown string with YAML front matter from a ContentItem.
+    Generates a Markdown string with front matter from a ContentItem.
+
+    `template` is an optional TemplateSchema for the item's template. When given, its
+    compiled fields are used as is; otherwise each value's field (which must then be
+    eagerly loaded) is looked up in a cache of compiled fields. Values of fields that
+    are not (or no longer) part of the template are left out.
+
+    `front_matter_format` is "yaml" (between --- lines) or "toml" (between +++ lines).
     """
+    if not metrics.is_enabled():
+        return _generate_markdown(item, template, front_matter_format)
+    start = time.perf_counter()
+    try:
+        return _generate_markdown(item, template, front_matter_format)
+    finally:
+        metrics.render_seconds.observe(time.perf_counter() - start)
+
+
+def _generate_markdown(item: models.ContentItem, template, front_matter_format: str) -> str:
     front_matter = {
         "title": item.title,
         "date": item.created_at.isoformat(),
         "template_id": item.template_id,
     }
     main_content = ""
+    fields = template.fields if template is not None else {}
 
-    # This function expects that item.values and value.field have been eagerly loaded.
     for value in item.values:
-        # Simple convention: a field with data_type 'Rich Text' is the main content.
-        if value.field.data_type == "Rich Text":
+        if template is not None:
+            field = fields.get(value.field_id)
+        else:
+            field = _compiled_field(value.field) if value.field.removed_at is None else None
+        if field is None:
+            # The field is being removed from the template by a template change
+            continue
+        # Body types (Rich Text) are the main content, everything else goes into front matter
+        if field.is_body:
             # Ensure value is a string, as it's stored as JSON
             main_content = str(value.value) if value.value is not None else ""
+        elif field.serialize is None:
+            front_matter[field.name] = value.value
         else:
-            # Add other fields to the front matter.
-            front_matter[value.field.name] = value.value
+            front_matter[field.name] = field.serialize(value.value)
 
-    # Use yaml.dump to create the front matter string.
-    # sort_keys=False preserves the order of the fields.
-    front_matter_yaml = yaml.dump(front_matter, default_flow_style=False, sort_keys=False, allow_unicode=True)
+    # The fields follow the order of the item's values in the front matter.
+    front_matter_text = frontmatter.dump(front_matter, front_matter_format)
+    delimiter = frontmatter.DELIMITERS[front_matter_format]
 
     # Combine front matter and main content into a single string.
-    markdown_output = f"---\n{front_matter_yaml}---\n\n{main_content}"
+    markdown_output = f"{delimiter}\n{front_matter_text}{delimiter}\n\n{main_content}"
 
     return markdown_output
+
+
+@functools.lru_cache(maxsize=4096)
+def _compile_field_cached(field_id: int, name: str, data_type: str) -> datatypes.CompiledField:
+    return datatypes.compile_field(field_id, name, data_type)
+
+
+def _compiled_field(field: models.TemplateField) -> datatypes.CompiledField:
+    return _compile_field_cached(field.id, field.name, field.data_type)
+
+
+def slugify(text: str) -> str:
+    """
+    Converts a title into a lowercase, filesystem- and URL-safe slug.
+    """
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    text = re.sub(r"[^\w\s-]", "", text).strip().lower()
+    return re.sub(r"[-\s_]+", "-", text) or "untitled"
+
+
+def markdown_path_for_item(item: models.ContentItem, template_name: str) -> str:
+    """
+    Returns the relative path of an item's Markdown file within an exported site.
+
+    Items are grouped in one directory per template. The item ID is appended to the
+    slug so that two items with the same title never collide.
+    """
+    return f"{slugify(template_name)}/{slugify(item.title)}-{item.id}.md"
@@ -0,0 +1,366 @@
+"""
+Adding, renaming and removing the fields of templates that already have content.
+
+apply_changes() changes a template's fields at once, in one short transaction, and
+queues a TemplateChange job that carries the change over to the template's content
+items in the background:
+
+- items without a value for an added field get the field's default, if it has one,
+- values of removed fields are deleted, and then the fields themselves,
+- every item is validated against the new fields; items that no longer pass, e.g.
+  because a required field was added without a default, are counted and listed,
+- changed items get a revision and a fresh search entry, and every item gets a
+  content_item "updated" change event, as its rendering changed.
+
+The runner walks a template's items in ID order, TEMPLATE_CHANGE_BATCH_SIZE at a
+time. Each batch is its own short transaction that also advances the job's cursor,
+and the runner pauses after each batch for longer than the batch took (see
+TEMPLATE_CHANGE_DUTY_CYCLE), so API writes wait for at most one batch and an
+interrupted job resumes after its last committed batch. Each batch takes one of the
+admission slots of heavy operations (see jobs.py). Until a job completes,
+removed fields are hidden from the template: their leftover values are not rendered,
+and writes drop them.
+"""
+import asyncio
+import datetime
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+import changes, config, crud, documents, jobs, models, revisions, schemas, search
+from cache import render_cache
+from database import SessionLocal
+from datatypes import InvalidValue, compile_field
+from schema_cache import schema_cache
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class TemplateChangeError(ValueError):
+    pass
+
+
+async def apply_changes(
+    db: AsyncSession, template_id: int, operations: List[schemas.TemplateFieldOperation]
+) -> Optional[models.TemplateChange]:
+    """
+    Applies the operations to the template's fields, in order, and queues the job that
+    updates its content. Raises TemplateChangeError, changing nothing, if an operation
+    is invalid. Returns None if the template does not exist.
+    """
+    template = await crud.get_template(db, template_id)
+    if template is None:
+        return None
+
+    by_name = {field.name: field for field in template.fields}
+    now = datetime.datetime.utcnow()
+    applied = []
+    for index, operation in enumerate(operations):
+        if operation.op == "add":
+            if operation.field is None:
+                raise TemplateChangeError(f"Operation {index}: 'add' needs a field")
+            if operation.field.name in by_name:
+                raise TemplateChangeError(f"Operation {index}: the template already has a field '{operation.field.name}'")
+            default = operation.default
+            if default is not None:
+                compiled = compile_field(0, operation.field.name, operation.field.data_type)
+                try:
+                    default = compiled.validate(default)
+                except InvalidValue as error:
+                    raise TemplateChangeError(f"Operation {index}: default of '{compiled.name}' {error}")
+            field = models.TemplateField(**operation.field.model_dump(), template_id=template_id)
+            db.add(field)
+            by_name[field.name] = field
+            applied.append(({"op": "add", "name": field.name, "default": default}, field))
+            continue
+
+        if operation.field_id is None:
+            raise TemplateChangeError(f"Operation {index}: '{operation.op}' needs a field_id")
+        field = next((field for field in by_name.values() if field.id == operation.field_id), None)
+        if field is None:
+            raise TemplateChangeError(f"Operation {index}: field {operation.field_id} is not a field of the template")
+        if operation.op == "rename":
+            if not operation.name:
+                raise TemplateChangeError(f"Operation {index}: 'rename' needs a name")
+            if operation.name in by_name and by_name[operation.name] is not field:
+                raise TemplateChangeError(f"Operation {index}: the template already has a field '{operation.name}'")
+            applied.append(({"op": "rename", "old_name": field.name, "name": operation.name}, field))
+            del by_name[field.name]
+            field.name = operation.name
+            by_name[field.name] = field
+        else:
+            applied.append(({"op": "remove", "name": field.name}, field))
+            del by_name[field.name]
+            field.removed_at = now
+
+    # Flush to get the IDs of added fields
+    await db.flush()
+    await db.execute(update(models.PageTemplate).where(models.PageTemplate.id == template_id).values(updated_at=now))
+    total = (await db.execute(
+        select(func.count(models.ContentItem.id)).filter(models.ContentItem.template_id == template_id)
+    )).scalar()
+    job = models.TemplateChange(
+        template_id=template_id,
+        operations=[{**operation, "field_id": field.id} for operation, field in applied],
+        status=PENDING,
+        total=total,
+        validation_errors=[],
+    )
+    db.add(job)
+    await changes.record(db, changes.TEMPLATE, changes.UPDATED, [template_id])
+
+    await db.commit()
+    changes.notify()
+    render_cache.invalidate_template(template_id)
+    schema_cache.invalidate(template_id)
+    runner.wake()
+    await db.refresh(job)
+    return job
+
+
+async def get_changes(db: AsyncSession, template_id: int) -> List[models.TemplateChange]:
+    """
+    Lists a template's changes, newest first.
+    """
+    query = (
+        select(models.TemplateChange)
+        .filter(models.TemplateChange.template_id == template_id)
+        .order_by(models.TemplateChange.id.desc())
+    )
+    return (await db.execute(query)).scalars().all()
+
+
+async def get_change(db: AsyncSession, template_id: int, change_id: int) -> Optional[models.TemplateChange]:
+    query = select(models.TemplateChange).filter(
+        models.TemplateChange.id == change_id, models.TemplateChange.template_id == template_id
+    )
+    return (await db.execute(query)).scalar_one_or_none()
+
+
+class TemplateChangeRunner:
+    """
+    Runs template change jobs, oldest first, either continuously with start() or until
+    none is left with run_pending().
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        batch_size: int = config.TEMPLATE_CHANGE_BATCH_SIZE,
+        duty_cycle: float = config.TEMPLATE_CHANGE_DUTY_CYCLE,
+        max_errors: int = config.TEMPLATE_CHANGE_MAX_ERRORS,
+        poll_interval: float = config.CHANGES_POLL_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.duty_cycle = config.duty_cycle(duty_cycle)
+        self.max_errors = max_errors
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.run_pending()
+            except Exception:
+                logger.exception("Running template changes failed")
+            # Also poll, for jobs queued by other processes
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_pending(self) -> int:
+        """
+        Runs queued and interrupted jobs to completion. Returns the number of jobs run.
+        """
+        count = 0
+        while True:
+            async with self.session_factory() as db:
+                job_id = (await db.execute(
+                    select(models.TemplateChange.id)
+                    .filter(models.TemplateChange.status.in_((PENDING, RUNNING)))
+                    .order_by(models.TemplateChange.id)
+                    .limit(1)
+                )).scalar()
+            if job_id is None:
+                return count
+            await self.run_job(job_id)
+            count += 1
+
+    async def run_job(self, job_id: int):
+        try:
+            while True:
+                # Batches count as heavy operations, see jobs.admission
+                async with jobs.admission.slot():
+                    start = time.perf_counter()
+                    finished = await self.run_batch(job_id)
+                if finished:
+                    break
+                await asyncio.sleep((time.perf_counter() - start) * (1 - self.duty_cycle) / self.duty_cycle)
+        except Exception as error:
+            logger.exception("Template change %s failed", job_id)
+            async with self.session_factory() as db:
+                await db.execute(
+                    update(models.TemplateChange)
+                    .where(models.TemplateChange.id == job_id)
+                    .values(status=FAILED, error=f"{type(error).__name__}: {error}", finished_at=datetime.datetime.utcnow())
+                )
+                await db.commit()
+
+    async def run_batch(self, job_id: int) -> bool:
+        """
+        Carries the change over to the next batch of items, or finishes the job if none
+        is left. Returns True once the job is finished.
+        """
+        async with self.session_factory() as db:
+            job = await db.get(models.TemplateChange, job_id)
+            job.status = RUNNING
+            added = {
+                operation["field_id"]: operation["default"]
+                for operation in job.operations if operation["op"] == "add" and operation["default"] is not None
+            }
+            removed = [operation["field_id"] for operation in job.operations if operation["op"] == "remove"]
+
+            items = (await db.execute(
+                select(models.ContentItem.id, models.ContentItem.title)
+                .filter(models.ContentItem.template_id == job.template_id, models.ContentItem.id > job.last_item_id)
+                .order_by(models.ContentItem.id)
+                .limit(self.batch_size)
+                .with_for_update()
+            )).all()
+            if not items:
+                await self._finish(db, job, added, removed)
+                return True
+
+            item_ids = [item.id for item in items]
+            states, changed = await self._carry_over(db, items, added, removed)
+
+            template = await schema_cache.get(db, job.template_id)
+            invalid = []
+            for item_id, (_, new) in states.items():
+                item_values = template.without_removed([
+                    schemas.ContentValueCreate(field_id=field_id, value=value) for field_id, value in new.values.items()
+                ])
+                errors = template.validate(item_values)
+                if errors:
+                    invalid.append({"item_id": item_id, "errors": errors})
+            if invalid:
+                job.invalid += len(invalid)
+                room = self.max_errors - len(job.validation_errors)
+                if room > 0:
+                    job.validation_errors = job.validation_errors + invalid[:room]
+
+            job.processed += len(item_ids)
+            job.last_item_id = item_ids[-1]
+            template_id = job.template_id
+            await db.commit()
+
+        changes.notify()
+        for item_id in changed:
+            render_cache.invalidate(item_id, template_id)
+        return False
+
+    async def _carry_over(self, db: AsyncSession, items, added: Dict[int, Any], removed: List[int]):
+        """
+        Gives the items, as (id, title) rows, the defaults of added fields and deletes
+        their values of removed ones within the caller's transaction, keeping their
+        revisions, search entries, documents and change events in step. Returns the
+        (old, new) states by item ID and the IDs of the items that changed.
+        """
+        item_ids = [item.id for item in items]
+        values = {item_id: {} for item_id in item_ids}
+        value_rows = await db.execute(
+            select(models.ContentValue.item_id, models.ContentValue.field_id, models.ContentValue.value)
+            .filter(models.ContentValue.item_id.in_(item_ids))
+            .order_by(models.ContentValue.id)
+        )
+        for item_id, field_id, value in value_rows:
+            values[item_id][field_id] = value
+
+        states, defaults = {}, []
+        for item_id, title in items:
+            old = revisions.RevisionState(title, values[item_id])
+            new_values = {field_id: value for field_id, value in old.values.items() if field_id not in removed}
+            for field_id, default in added.items():
+                if field_id not in new_values:
+                    new_values[field_id] = default
+                    defaults.append({"item_id": item_id, "field_id": field_id, "value": default})
+            states[item_id] = (old, revisions.RevisionState(title, new_values))
+
+        if removed:
+            await db.execute(delete(models.ContentValue).where(
+                models.ContentValue.item_id.in_(item_ids), models.ContentValue.field_id.in_(removed)
+            ))
+        if defaults:
+            await db.execute(insert(models.ContentValue), defaults)
+        changed = await revisions.record_changes(db, states)
+        if changed:
+            await db.execute(
+                update(models.ContentItem)
+                .where(models.ContentItem.id.in_(changed))
+                .values(updated_at=datetime.datetime.utcnow())
+            )
+            await search.index_items(db, changed)
+            await documents.refresh(db, changed)
+        await changes.record(db, changes.CONTENT_ITEM, changes.UPDATED, item_ids)
+        return states, changed
+
+    async def _finish(self, db: AsyncSession, job: models.TemplateChange, added: Dict[int, Any], removed: List[int]):
+        changed = []
+        if removed:
+            # Values written by processes that had not seen the change yet, including to
+            # items already carried over, are carried over like a batch
+            while True:
+                stragglers = (await db.execute(
+                    select(models.ContentItem.id, models.ContentItem.title)
+                    .filter(models.ContentItem.id.in_(
+                        select(models.ContentValue.item_id).filter(models.ContentValue.field_id.in_(removed))
+                    ))
+                    .order_by(models.ContentItem.id)
+                    .limit(self.batch_size)
+                    .with_for_update()
+                )).all()
+                if not stragglers:
+                    break
+                changed += (await self._carry_over(db, stragglers, added, removed))[1]
+            await db.execute(delete(models.TemplateField).where(models.TemplateField.id.in_(removed)))
+        template_id = job.template_id
+        job.status = COMPLETED
+        job.finished_at = datetime.datetime.utcnow()
+        await db.commit()
+        schema_cache.invalidate(template_id)
+        if changed:
+            changes.notify()
+        for item_id in changed:
+            render_cache.invalidate(item_id, template_id)
+
+
+runner = TemplateChangeRunner()
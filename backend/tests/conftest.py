@@ -7,11 +7,19 @@ import sys
 # Add the parent directory to the path to allow imports from the 'backend' module
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import config, render_pool
 from main import app
 from database import Base
+from cache import render_cache
+from pagination import count_cache
+from schema_cache import schema_cache
 # Import the get_db dependency from the routers to override it
-from routers.templates import get_db as templates_get_db
-from routers.content import get_db as content_get_db
+from routers.templates import get_db as templates_get_db, get_read_db as templates_get_read_db
+from routers.content import get_db as content_get_db, get_read_db as content_get_read_db
+from routers.export import get_db as export_get_db
+from routers.imports import get_db as imports_get_db
+from routers.jobs import get_db as jobs_get_db, get_read_db as jobs_get_read_db
+from routers.changes import get_db as changes_get_db, get_read_db as changes_get_read_db
 
 # Use a separate SQLite database for testing
 TEST_DATABASE_URL = "sqlite+aiosqlite:///./test_blog.db"
@@ -27,9 +35,35 @@ async def override_get_db():
     async with TestingSessionLocal() as session:
         yield session
 
-# Override the get_db dependency in the main app for both routers
+# Override the get_db dependency in the main app for all routers
 app.dependency_overrides[templates_get_db] = override_get_db
 app.dependency_overrides[content_get_db] = override_get_db
+app.dependency_overrides[templates_get_read_db] = override_get_db
+app.dependency_overrides[content_get_read_db] = override_get_db
+app.dependency_overrides[export_get_db] = override_get_db
+app.dependency_overrides[imports_get_db] = override_get_db
+app.dependency_overrides[jobs_get_db] = override_get_db
+app.dependency_overrides[jobs_get_read_db] = override_get_db
+app.dependency_overrides[changes_get_db] = override_get_db
+app.dependency_overrides[changes_get_read_db] = override_get_db
+
+
+@pytest.fixture(scope="session", autouse=True)
+def render_workers():
+    """
+    Stops the render worker processes started by the tests, as the app's shutdown does.
+    """
+    yield
+    render_pool.render_executor.shutdown()
+
+
+@pytest.fixture(params=[False, True], ids=["content-tables", "content-documents"])
+def both_read_models(request, monkeypatch):
+    """
+    Runs a test once reading content from the content tables, and once from the
+    content documents read model.
+    """
+    monkeypatch.setattr(config, "CONTENT_DOCUMENTS_ENABLED", request.param)
 
 
 @pytest.fixture(scope="function")
@@ -40,6 +74,9 @@ async def client():
     """
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    render_cache.clear()
+    count_cache.clear()
+    schema_cache.invalidate()
 
     async with AsyncClient(app=app, base_url="http://test") as c:
         yield c
@@ -47,6 +84,9 @@ async def client():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
 
+    # Close pooled connections so the next test does not reuse a handle to the deleted file
+    await engine.dispose()
+
     # Clean up the test database file after the test runs
     if os.path.exists("./test_blog.db"):
         os.remove("./test_blog.db")
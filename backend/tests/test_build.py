@@ -0,0 +1,74 @@
+import json
+import os
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import update
+
+import build, models
+from .conftest import TestingSessionLocal
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.usefixtures("both_read_models")]
+
+async def create_blog(client: AsyncClient):
+    template_data = {
+        "name": "Blog Post",
+        "fields": [
+            {"name": "Body", "data_type": "Rich Text", "required": True},
+            {"name": "Author", "data_type": "Text", "required": True},
+        ]
+    }
+    response = await client.post("/api/v1/templates/", json=template_data)
+    template = response.json()
+    field_ids = {field["name"]: field["id"] for field in template["fields"]}
+
+    for title in ["First", "Second"]:
+        content_data = {
+            "title": title,
+            "template_id": template["id"],
+            "values": [
+                {"field_id": field_ids["Body"], "value": f"{title} body"},
+                {"field_id": field_ids["Author"], "value": "Jules"},
+            ]
+        }
+        response = await client.post("/api/v1/content/", json=content_data)
+        assert response.status_code == 200, response.text
+    return field_ids
+
+async def test_incremental_build(client: AsyncClient, tmp_path):
+    """
+    Tests that a rebuild only rewrites changed items and removes orphaned files.
+    """
+    field_ids = await create_blog(client)
+
+    async with TestingSessionLocal() as db:
+        result = await build.build_site(db, str(tmp_path))
+    assert (result.written, result.unchanged, result.deleted) == (2, 0, 0)
+    with open(tmp_path / "blog-post" / "first-1.md", encoding="utf-8") as markdown_file:
+        assert markdown_file.read().endswith("First body")
+
+    # A rebuild without changes touches nothing
+    async with TestingSessionLocal() as db:
+        result = await build.build_site(db, str(tmp_path))
+    assert (result.written, result.unchanged, result.deleted) == (0, 2, 0)
+
+    # Change one value and leave a stale entry for an item that no longer exists
+    async with TestingSessionLocal() as db:
+        await db.execute(
+            update(models.ContentValue)
+            .where(models.ContentValue.item_id == 2, models.ContentValue.field_id == field_ids["Body"])
+            .values(value="Edited body")
+        )
+        await db.commit()
+    os.makedirs(tmp_path / "old-template")
+    (tmp_path / "old-template" / "gone-99.md").write_text("stale")
+    manifest_path = tmp_path / build.MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text())
+    manifest["items"]["99"] = {"hash": "x", "path": "old-template/gone-99.md"}
+    manifest_path.write_text(json.dumps(manifest))
+
+    async with TestingSessionLocal() as db:
+        result = await build.build_site(db, str(tmp_path))
+    assert (result.written, result.unchanged, result.deleted) == (1, 1, 1)
+    assert (tmp_path / "blog-post" / "second-2.md").read_text().endswith("Edited body")
+    assert not (tmp_path / "old-template").exists()
@@ -0,0 +1,60 @@
+from cache import DiskRenderCache, LRURenderCache, TieredRenderCache
+
+
+def test_lru_cache_evicts_least_recently_used_by_size():
+    cache = LRURenderCache(max_entries=10, max_bytes=10)
+    cache.set(1, "a", 1, "xxxx")
+    cache.set(2, "a", 1, "yyyy")
+    assert cache.get(1, "a", 1) == "xxxx"
+
+    # Item 2 is now the least recently used and is evicted to make room
+    cache.set(3, "a", 2, "zzzz")
+    assert cache.get(2, "a", 1) is None
+    assert cache.get(1, "a", 1) == "xxxx"
+    assert cache.get(3, "a", 2) == "zzzz"
+
+
+def test_lru_cache_misses_on_stale_stamp_and_invalidates_by_template():
+    cache = LRURenderCache()
+    cache.set(1, "v1", 1, "old")
+    cache.set(2, "v1", 2, "other")
+    assert cache.get(1, "v2", 1) is None
+
+    cache.invalidate_template(1)
+    assert len(cache) == 1
+    assert cache.get(2, "v1", 2) == "other"
+
+
+def test_disk_cache_is_shared_through_the_tiered_cache(tmp_path):
+    first = TieredRenderCache(LRURenderCache(), DiskRenderCache(str(tmp_path)))
+    first.set(1, "v1", 7, "---\ntitle: x\n---\n\nbody\n")
+
+    # A second process sees the entry through the shared directory
+    second = TieredRenderCache(LRURenderCache(), DiskRenderCache(str(tmp_path)))
+    assert second.get(1, "v1", 7) == "---\ntitle: x\n---\n\nbody\n"
+    assert second.get(1, "v2", 7) is None
+
+    second.invalidate(1, 7)
+    assert DiskRenderCache(str(tmp_path)).get(1, "v1", 7) is None
+
+
+def test_lru_cache_bounds_utf8_size():
+    cache = LRURenderCache(max_entries=10, max_bytes=8)
+    cache.set(1, "a", 1, "éé")
+    cache.set(2, "a", 1, "éé")
+    # Four characters but eight bytes: a third entry evicts the first
+    cache.set(3, "a", 1, "é")
+    assert cache.get(1, "a", 1) is None
+    assert cache.get(2, "a", 1) == "éé"
+    cache.set(4, "a", 1, "ééééé")
+    assert cache.get(4, "a", 1) is None
+
+
+def test_disk_cache_clear_skips_other_files(tmp_path):
+    cache = DiskRenderCache(str(tmp_path))
+    cache.set(1, "v1", 7, "body")
+    (tmp_path / ".DS_Store").write_text("")
+    (tmp_path / "notes").mkdir()
+    cache.clear()
+    assert cache.get(1, "v1", 7) is None
+    assert (tmp_path / ".DS_Store").exists()
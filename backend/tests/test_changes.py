@@ -0,0 +1,140 @@
+import asyncio
+import datetime
+import json
+
+import httpx
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import update
+
+import models, webhooks
+from .conftest import TestingSessionLocal
+
+pytestmark = pytest.mark.asyncio
+
+async def create_template(client: AsyncClient, name="Post"):
+    response = await client.post("/api/v1/templates/", json={
+        "name": name,
+        "fields": [{"name": "Body", "data_type": "Rich Text", "required": True}],
+    })
+    template = response.json()
+    return template["id"], template["fields"][0]["id"]
+
+async def create_item(client: AsyncClient, template_id, field_id, title="Post"):
+    response = await client.post("/api/v1/content/", json={
+        "title": title, "template_id": template_id, "values": [{"field_id": field_id, "value": "Body"}],
+    })
+    return response.json()["id"]
+
+async def test_change_feed(client: AsyncClient):
+    """
+    Tests that creates and updates are recorded in the feed, that it can be read
+    incrementally and that a long-poll returns as soon as a change is made.
+    """
+    template_id, field_id = await create_template(client)
+    item_id = await create_item(client, template_id, field_id)
+    response = await client.put(f"/api/v1/content/{item_id}", json={
+        "title": "Renamed", "values": [{"field_id": field_id, "value": "Body"}],
+    })
+    assert response.status_code == 200
+    response = await client.post("/api/v1/content/batch", json=[
+        {"title": f"Batch {n}", "template_id": template_id, "values": [{"field_id": field_id, "value": "Body"}]}
+        for n in range(2)
+    ])
+    batch_ids = [created["id"] for created in response.json()["created"]]
+
+    response = await client.get("/api/v1/changes")
+    assert response.status_code == 200
+    feed = response.json()
+    assert [(event["entity"], event["entity_id"], event["action"]) for event in feed["events"]] == [
+        ("template", template_id, "created"),
+        ("content_item", item_id, "created"),
+        ("content_item", item_id, "updated"),
+        ("content_item", batch_ids[0], "created"),
+        ("content_item", batch_ids[1], "created"),
+    ]
+    assert feed["last_event_id"] == feed["events"][-1]["id"]
+
+    response = await client.get("/api/v1/changes", params={"since": feed["events"][1]["id"], "limit": 2})
+    assert [event["id"] for event in response.json()["events"]] == [event["id"] for event in feed["events"][2:4]]
+
+    # Nothing new: the cursor stays put
+    response = await client.get("/api/v1/changes", params={"since": feed["last_event_id"]})
+    assert response.json() == {"events": [], "last_event_id": feed["last_event_id"]}
+
+    # A waiting request is answered by the next change
+    poll = asyncio.create_task(client.get("/api/v1/changes", params={"since": feed["last_event_id"], "timeout": 10}))
+    await asyncio.sleep(0.1)
+    assert not poll.done()
+    new_id = await create_item(client, template_id, field_id, "Late")
+    response = await asyncio.wait_for(poll, 5)
+    assert [(event["entity_id"], event["action"]) for event in response.json()["events"]] == [(new_id, "created")]
+
+async def test_webhook_delivery_with_retries(client: AsyncClient):
+    """
+    Tests batched, signed delivery to a stub receiver, and that failed deliveries are
+    retried with backoff without skipping events.
+    """
+    received = []
+    failing = True
+
+    def receiver(request: httpx.Request):
+        if failing:
+            return httpx.Response(503)
+        received.append(request)
+        return httpx.Response(200)
+
+    template_id, field_id = await create_template(client)
+    response = await client.post("/api/v1/webhooks/", json={"url": "http://builder.test/hook", "secret": "s3cret"})
+    assert response.status_code == 200, response.text
+    webhook = response.json()
+    # Only changes made after registering are delivered
+    assert webhook["last_event_id"] == 1
+    item_ids = [await create_item(client, template_id, field_id, f"Post {n}") for n in range(3)]
+
+    dispatcher = webhooks.WebhookDispatcher(
+        TestingSessionLocal, httpx.AsyncClient(transport=httpx.MockTransport(receiver)), batch_size=2,
+    )
+    retry_at = await dispatcher.dispatch()
+    assert retry_at is not None
+    webhook = (await client.get("/api/v1/webhooks/")).json()[0]
+    assert (webhook["last_event_id"], webhook["failures"], webhook["last_error"]) == (1, 1, "HTTP 503")
+
+    # Not retried before its backoff has passed
+    failing = False
+    assert await dispatcher.dispatch() == retry_at
+    assert received == []
+
+    # Retried once it has; retries back off exponentially
+    assert [dispatcher.backoff(failures) for failures in (1, 2, 3)] == [1, 2, 4]
+    async with TestingSessionLocal() as db:
+        await db.execute(update(models.Webhook).values(next_attempt_at=retry_at - datetime.timedelta(seconds=1)))
+        await db.commit()
+    assert await dispatcher.dispatch() is None
+    batches = [json.loads(request.content) for request in received]
+    assert [[event["entity_id"] for event in batch["events"]] for batch in batches] == [item_ids[:2], item_ids[2:]]
+    assert all(
+        request.headers[webhooks.SIGNATURE_HEADER] == webhooks.sign("s3cret", request.content)
+        for request in received
+    )
+    webhook = (await client.get("/api/v1/webhooks/")).json()[0]
+    assert (webhook["last_event_id"], webhook["failures"], webhook["last_error"]) == (4, 0, None)
+
+    # Running in the background, a change is delivered without waiting for the next poll
+    dispatcher.poll_interval = 60
+    dispatcher.start()
+    try:
+        await asyncio.sleep(0.1)
+        item_id = await create_item(client, template_id, field_id, "Late")
+        for _ in range(50):
+            if len(received) == 3:
+                break
+            await asyncio.sleep(0.02)
+        assert [event["entity_id"] for event in json.loads(received[-1].content)["events"]] == [item_id]
+    finally:
+        await dispatcher.stop()
+
+    response = await client.delete(f"/api/v1/webhooks/{webhook['id']}")
+    assert response.status_code == 204
+    assert (await client.get("/api/v1/webhooks/")).json() == []
+    assert (await client.delete(f"/api/v1/webhooks/{webhook['id']}")).status_code == 404
@@ -1,8 +1,16 @@
+import json
+
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import update
 import yaml
 
-pytestmark = pytest.mark.asyncio
+import config, models, schemas
+from cache import render_cache
+from schema_cache import schema_cache
+from .conftest import TestingSessionLocal
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.usefixtures("both_read_models")]
 
 async def test_create_content_and_generate_markdown(client: AsyncClient):
     """
@@ -64,3 +72,238 @@ async def test_create_content_and_generate_markdown(client: AsyncClient):
     assert front_matter["Headline"] == "New System is Live"
     assert front_matter["Author"] == "Jules"
     assert front_matter["Is Published"] is False
+
+async def test_markdown_is_cached_and_supports_conditional_requests(client: AsyncClient):
+    """
+    Tests that rendered Markdown is served from the cache and that a matching ETag yields a 304.
+    """
+    response = await client.post("/api/v1/templates/", json={
+        "name": "Note",
+        "fields": [{"name": "Body", "data_type": "Rich Text", "required": True}],
+    })
+    field_id = response.json()["fields"][0]["id"]
+    response = await client.post("/api/v1/content/", json={
+        "title": "Cached",
+        "template_id": response.json()["id"],
+        "values": [{"field_id": field_id, "value": "Cached body"}],
+    })
+    item_id = response.json()["id"]
+
+    hits_before = render_cache.hits
+    first = await client.get(f"/api/v1/content/{item_id}/markdown")
+    second = await client.get(f"/api/v1/content/{item_id}/markdown")
+    assert first.status_code == second.status_code == 200
+    assert first.text == second.text
+    assert render_cache.hits == hits_before + 1
+    assert "last-modified" in first.headers
+
+    etag = first.headers["etag"]
+    response = await client.get(f"/api/v1/content/{item_id}/markdown", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = await client.get(f"/api/v1/content/{item_id}/markdown", headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+
+    # A write that leaves updated_at alone still changes the ETag and the cached copy
+    async with TestingSessionLocal() as db:
+        await db.execute(
+            update(models.ContentValue).where(models.ContentValue.item_id == item_id).values(value="Edited body")
+        )
+        await db.commit()
+    response = await client.get(f"/api/v1/content/{item_id}/markdown", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.text.endswith("Edited body")
+    etag = response.headers["etag"]
+
+    # TOML front matter is a different representation, with its own ETag
+    response = await client.get(f"/api/v1/content/{item_id}/markdown", params={"front_matter": "toml"})
+    assert response.status_code == 200
+    assert response.text.startswith('+++\ntitle = "Cached"\n')
+    assert response.text.endswith("+++\n\nEdited body")
+    assert response.headers["etag"] != etag
+
+    response = await client.get(f"/api/v1/content/{item_id}/markdown", params={"front_matter": "json"})
+    assert response.status_code == 400
+
+    # TOML has no null, so a list with one cannot be written
+    template = (await client.post("/api/v1/templates/", json={"name": "Data", "fields": [
+        {"name": "Points", "data_type": "JSON", "required": True},
+    ]})).json()
+    response = await client.post("/api/v1/content/", json={"title": "Gaps", "template_id": template["id"], "values": [
+        {"field_id": template["fields"][0]["id"], "value": [1, None, 3]},
+    ]})
+    response = await client.get(f"/api/v1/content/{response.json()['id']}/markdown", params={"front_matter": "toml"})
+    assert response.status_code == 422
+
+    response = await client.get("/api/v1/content/999/markdown")
+    assert response.status_code == 404
+
+async def test_create_content_batch_reports_per_item_errors(client: AsyncClient):
+    """
+    Tests that a content batch creates the valid items and reports the invalid ones.
+    """
+    response = await client.post("/api/v1/templates/", json={
+        "name": "Note",
+        "fields": [{"name": "Body", "data_type": "Rich Text", "required": True}],
+    })
+    template_id = response.json()["id"]
+    field_id = response.json()["fields"][0]["id"]
+
+    batch = [
+        {"title": "One", "template_id": template_id, "values": [{"field_id": field_id, "value": "1"}]},
+        {"title": "Missing template", "template_id": 999, "values": []},
+        {"title": "Missing body", "template_id": template_id, "values": []},
+        {"title": "Two", "template_id": template_id, "values": [{"field_id": field_id, "value": "2"}]},
+    ]
+    response = await client.post("/api/v1/content/batch", json=batch)
+    assert response.status_code == 200, response.text
+    result = response.json()
+
+    assert [created["index"] for created in result["created"]] == [0, 3]
+    assert [error["index"] for error in result["errors"]] == [1, 2]
+    assert "not found" in result["errors"][0]["detail"]
+
+    item_id = result["created"][1]["id"]
+    response = await client.get(f"/api/v1/content/{item_id}/markdown")
+    assert response.status_code == 200
+    assert response.text.endswith("---\n\n2")
+
+async def test_list_content_with_cursor_and_filters(client: AsyncClient):
+    """
+    Tests keyset pagination through the content list and the list filters.
+    """
+    response = await client.post("/api/v1/templates/batch", json=[
+        {"name": "Post", "fields": []},
+        {"name": "Page", "fields": []},
+    ])
+    post_id, page_id = (created["id"] for created in response.json()["created"])
+    batch = [{"title": f"Post {n}", "template_id": post_id, "values": []} for n in range(5)]
+    batch.append({"title": "About", "template_id": page_id, "values": []})
+    await client.post("/api/v1/content/batch", json=batch)
+
+    titles, cursor = [], None
+    while True:
+        params = {"limit": 2, "template_id": post_id, "include_total": True}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/api/v1/content/", params=params)
+        assert response.status_code == 200, response.text
+        assert response.headers["x-total-count"] == "5"
+        titles.extend(item["title"] for item in response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert titles == [f"Post {n}" for n in range(5)]
+
+    response = await client.get("/api/v1/content/", params={"title_prefix": "Ab"})
+    assert [item["title"] for item in response.json()] == ["About"]
+
+    response = await client.get("/api/v1/content/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+async def test_list_content_rows_match_schema_and_stream_as_ndjson(client: AsyncClient, monkeypatch):
+    """
+    Tests that list rows built from column tuples match the ContentItem schema, and
+    that large pages are streamed as NDJSON in chunks with the same cursor.
+    """
+    response = await client.post("/api/v1/templates/", json={
+        "name": "Post", "fields": [{"name": "Body", "data_type": "Rich Text", "required": True},
+                                   {"name": "Tags", "data_type": "Tags", "required": False}],
+    })
+    template = response.json()
+    body_id, tags_id = (field["id"] for field in template["fields"])
+    response = await client.post("/api/v1/content/batch", json=[
+        {"title": f"Post {n}", "template_id": template["id"], "values": [
+            {"field_id": body_id, "value": f"Body {n}"}, {"field_id": tags_id, "value": ["a", "caf\u00e9"]},
+        ][:1 + n % 2]}
+        for n in range(7)
+    ])
+    assert len(response.json()["created"]) == 7
+
+    response = await client.get("/api/v1/content/", params={"limit": 5})
+    assert response.headers["content-type"] == "application/json"
+    items = response.json()
+    for item in items:
+        single = (await client.get(f"/api/v1/content/{item['id']}")).json()
+        assert item == single
+        assert list(item) == list(single) and schemas.ContentItem.model_validate(item)
+
+    monkeypatch.setattr(config, "NDJSON_CHUNK_SIZE", 2)
+    headers = {"Accept": "application/x-ndjson"}
+    response = await client.get("/api/v1/content/", params={"limit": 5}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == items
+    assert response.headers["x-next-cursor"] == (await client.get("/api/v1/content/", params={"limit": 5})).headers["x-next-cursor"]
+
+    params = {"limit": 5, "cursor": response.headers["x-next-cursor"]}
+    response = await client.get("/api/v1/content/", params=params, headers=headers)
+    assert [json.loads(line)["title"] for line in response.text.splitlines()] == ["Post 5", "Post 6"]
+    assert "x-next-cursor" not in response.headers
+
+    # Pages above the JSON limit must be streamed
+    response = await client.get("/api/v1/content/", params={"limit": 5000})
+    assert response.status_code == 400
+    response = await client.get("/api/v1/content/", params={"limit": 5000, "skip": 3}, headers=headers)
+    assert len(response.text.splitlines()) == 4
+
+async def test_create_content_validates_against_template_schema(client: AsyncClient):
+    """
+    Tests in-memory validation of new content and that the template is not re-queried per create.
+    """
+    response = await client.post("/api/v1/templates/", json={
+        "name": "Event",
+        "fields": [
+            {"name": "Body", "data_type": "Rich Text", "required": True},
+            {"name": "Seats", "data_type": "Number", "required": True},
+            {"name": "Starts", "data_type": "Date", "required": False},
+            {"name": "Price", "data_type": "Number", "required": False},
+        ]
+    })
+    template = response.json()
+    body_id, seats_id, starts_id, price_id = (field["id"] for field in template["fields"])
+
+    def content(*values):
+        return {"title": "Launch", "template_id": template["id"], "values": [
+            {"field_id": field_id, "value": value} for field_id, value in values
+        ]}
+
+    response = await client.post("/api/v1/content/", json=content((body_id, "Hi"), (seats_id, "many")))
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Field 'Seats' must be a number"
+
+    response = await client.post("/api/v1/content/", json=content((body_id, "Hi")))
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Missing required field 'Seats'"
+
+    # Form inputs send numbers as strings, and a blank one counts as missing
+    response = await client.post("/api/v1/content/", json=content((body_id, "Hi"), (seats_id, "12"), (price_id, "")))
+    assert response.status_code == 200, response.text
+    assert {value["field_id"]: value["value"] for value in response.json()["values"]} == {
+        body_id: "Hi", seats_id: 12, price_id: None,
+    }
+    response = await client.post("/api/v1/content/", json=content((body_id, "Hi"), (seats_id, ""), (price_id, "9.5")))
+    assert response.json()["detail"] == "Missing required field 'Seats'"
+
+    response = await client.post("/api/v1/content/", json=content((body_id, "Hi"), (seats_id, 5), (999, "x")))
+    assert response.status_code == 400
+    assert "does not belong" in response.json()["detail"]
+
+    response = await client.post("/api/v1/content/", json=content((body_id, "Hi"), (seats_id, 5), (starts_id, "soon")))
+    assert response.status_code == 400
+    response = await client.post("/api/v1/content/", json=content((body_id, "Hi"), (seats_id, 5), (starts_id, "2025-06-01")))
+    assert response.status_code == 200, response.text
+
+    # Optional fields may be omitted. Only the first create after invalidation loads
+    # the template and its fields; the second is validated from the cache.
+    schema_cache.invalidate()
+    first = await client.post("/api/v1/content/", json=content((body_id, "Hi"), (seats_id, 5)))
+    assert first.status_code == 200, first.text
+    second = await client.post("/api/v1/content/", json=content((body_id, "Hello"), (seats_id, 6)))
+    assert second.status_code == 200, second.text
+    assert int(first.headers["x-db-query-count"]) - int(second.headers["x-db-query-count"]) == 2
+
+    response = await client.post("/api/v1/content/", json={"title": "x", "template_id": 999, "values": []})
+    assert response.status_code == 404
@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy import text
+
+from database import create_engine_for_url
+
+pytestmark = pytest.mark.asyncio
+
+async def test_sqlite_connections_are_tuned(tmp_path):
+    """
+    Tests that every new SQLite connection gets WAL journaling and the configured pragmas.
+    """
+    engine = create_engine_for_url(f"sqlite+aiosqlite:///{tmp_path}/tuned.db", pool_size=1, max_overflow=0)
+    try:
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+            # NORMAL
+            assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1
+            assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 5000
+            assert (await conn.execute(text("PRAGMA cache_size"))).scalar() == -64 * 1024
+        assert engine.pool.size() == 1
+    finally:
+        await engine.dispose()
+
+async def test_in_memory_sqlite_is_not_pooled():
+    engine = create_engine_for_url("sqlite+aiosqlite://", pool_size=5, max_overflow=10)
+    try:
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("SELECT 1"))).scalar() == 1
+    finally:
+        await engine.dispose()
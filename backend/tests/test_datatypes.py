@@ -0,0 +1,92 @@
+import datetime
+import pickle
+
+import pytest
+
+import datatypes, models, services
+from schema_cache import TemplateSchema
+
+
+def make_item(fields, values):
+    template = models.PageTemplate(id=1, name="Post", fields=[
+        models.TemplateField(id=field_id, name=name, data_type=data_type, required=True)
+        for field_id, name, data_type in fields
+    ])
+    by_id = {field.id: field for field in template.fields}
+    item = models.ContentItem(
+        id=1, title="Hello", template_id=1, created_at=datetime.datetime(2024, 1, 2, 3, 4, 5),
+        values=[models.ContentValue(field_id=field_id, value=value, field=by_id[field_id]) for field_id, value in values],
+    )
+    return template, item
+
+
+def test_builtin_validators():
+    assert datatypes.get_data_type("Number").validate(3.5) == 3.5
+    assert datatypes.get_data_type("Number").validate("3.5") == 3.5
+    assert datatypes.get_data_type("Number").validate("") is None
+    with pytest.raises(datatypes.InvalidValue):
+        datatypes.get_data_type("Number").validate("inf")
+    with pytest.raises(datatypes.InvalidValue):
+        datatypes.get_data_type("Number").validate(True)
+    with pytest.raises(datatypes.InvalidValue):
+        datatypes.get_data_type("URL").validate("not a url")
+    with pytest.raises(datatypes.InvalidValue):
+        datatypes.get_data_type("Email").validate("jules@")
+    assert datatypes.get_data_type("Email").validate("jules@example.com") == "jules@example.com"
+    # Empty form inputs are stored as null, except for text types
+    for name in ("URL", "Email", "Date", "Tags"):
+        assert datatypes.get_data_type(name).validate("") is None
+    assert datatypes.get_data_type("Text").validate("") == ""
+    # The names the frontend's template editor uses
+    assert datatypes.get_data_type("Date/DateTime").validate("2024-05-01 12:00") == "2024-05-01 12:00"
+    with pytest.raises(datatypes.InvalidValue):
+        datatypes.get_data_type("Date/DateTime").validate("May 1st")
+    assert datatypes.get_data_type("Image").validate("/images/cover.png") == "/images/cover.png"
+    assert datatypes.get_data_type("Image").validate("") is None
+    # Compiled fields are sent to the render workers
+    for name in datatypes.registered_data_types():
+        pickle.dumps(datatypes.compile_field(1, name, name))
+    # Unknown data types accept anything
+    assert datatypes.get_data_type("Gallery").validate({"images": []}) == {"images": []}
+
+
+def test_compiled_schema_renders_like_field_lookup():
+    template, item = make_item(
+        [(1, "Body", "Rich Text"), (2, "Author", "Text"), (3, "Tags", "Tags")],
+        [(1, "Body text"), (2, "Jules"), (3, ["a", "b"])],
+    )
+    schema = TemplateSchema.from_template(template, 0)
+    expected = "---\ntitle: Hello\ndate: '2024-01-02T03:04:05'\ntemplate_id: 1\nAuthor: Jules\nTags:\n- a\n- b\n---\n\nBody text"
+    assert services.generate_markdown_from_item(item) == expected
+    assert services.generate_markdown_from_item(item, schema) == expected
+
+
+def test_builtin_types_render_numbers_and_dates_canonically():
+    template, item = make_item(
+        [(1, "Rating", "Number"), (2, "Weight", "Number"), (3, "Published", "Date/DateTime"), (4, "Day", "Date")],
+        [(1, 4.0), (2, 2.5), (3, "2024-05-01 12:00"), (4, "2024-05-01")],
+    )
+    schema = TemplateSchema.from_template(template, 0)
+    markdown = services.generate_markdown_from_item(item, schema)
+    assert "Rating: 4\n" in markdown
+    assert "Weight: 2.5\n" in markdown
+    assert "Published: '2024-05-01T12:00:00'\n" in markdown
+    assert "Day: '2024-05-01'\n" in markdown
+
+
+def test_registered_data_type_controls_validation_and_rendering():
+    def validate_rating(value):
+        if value not in range(1, 6):
+            raise datatypes.InvalidValue("must be between 1 and 5")
+        return value
+
+    datatypes.register_data_type(datatypes.DataType("Rating", validate_rating, serialize=lambda value: "*" * value))
+    try:
+        template, item = make_item([(1, "Stars", "Rating")], [(1, 3)])
+        schema = TemplateSchema.from_template(template, 0)
+        assert "Stars: '***'" in services.generate_markdown_from_item(item, schema)
+        assert schema.fields[1].validate(5) == 5
+        with pytest.raises(datatypes.InvalidValue):
+            schema.fields[1].validate(9)
+    finally:
+        datatypes._registry.pop("Rating")
@@ -0,0 +1,107 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+
+import config, documents, template_changes
+from cache import render_cache
+from .conftest import TestingSessionLocal
+
+pytestmark = pytest.mark.asyncio
+
+@pytest.fixture
+def read_model(monkeypatch):
+    monkeypatch.setattr(config, "CONTENT_DOCUMENTS_ENABLED", True)
+
+async def seed(client: AsyncClient):
+    response = await client.post("/api/v1/templates/", json={
+        "name": "Post",
+        "fields": [
+            {"name": "Body", "data_type": "Rich Text", "required": True},
+            {"name": "Tags", "data_type": "Tags", "required": False},
+        ]
+    })
+    template = response.json()
+    body_id, tags_id = (field["id"] for field in template["fields"])
+    await client.post("/api/v1/content/", json={"title": "First", "template_id": template["id"], "values": [
+        {"field_id": body_id, "value": "Hello"}, {"field_id": tags_id, "value": ["a", "b"]},
+    ]})
+    await client.post("/api/v1/content/batch", json=[
+        {"title": f"Post {n}", "template_id": template["id"], "values": [{"field_id": body_id, "value": f"Body {n}"}]}
+        for n in range(3)
+    ])
+    await client.put("/api/v1/content/2", json={"title": "Edited", "values": [
+        {"field_id": body_id, "value": "Changed"}, {"field_id": tags_id, "value": ["c"]},
+    ]})
+    return template["id"], body_id, tags_id
+
+async def read_all(client: AsyncClient):
+    responses = [await client.get("/api/v1/content/", params={"limit": 3})]
+    responses.append(await client.get("/api/v1/content/", params={"cursor": responses[0].headers["x-next-cursor"]}))
+    for item_id in range(1, 5):
+        responses.append(await client.get(f"/api/v1/content/{item_id}"))
+        render_cache.clear()
+        responses.append(await client.get(f"/api/v1/content/{item_id}/markdown"))
+    return [(response.status_code, response.headers.get("x-next-cursor"), response.content) for response in responses]
+
+async def test_reads_from_documents_match_the_content_tables(client: AsyncClient, read_model, monkeypatch):
+    """
+    Tests that every write keeps the documents current, and that reads served from
+    them return exactly what reads from the content tables return, in one query.
+    """
+    await seed(client)
+    async with TestingSessionLocal() as db:
+        assert (await documents.check(db)).ok
+
+    from_documents = await read_all(client)
+    response = await client.get("/api/v1/content/2")
+    assert response.json()["title"] == "Edited"
+    assert response.headers["x-db-query-count"] == "1"
+
+    monkeypatch.setattr(config, "CONTENT_DOCUMENTS_ENABLED", False)
+    assert await read_all(client) == from_documents
+
+async def test_check_and_rebuild_documents(client: AsyncClient, read_model, monkeypatch):
+    """
+    Tests that the checker finds missing, outdated, mismatched and orphaned documents,
+    that reads skip outdated ones, and that repairing or rebuilding fixes them.
+    """
+    template_id, body_id, _ = await seed(client)
+
+    # An item written while the read model was off
+    monkeypatch.setattr(config, "CONTENT_DOCUMENTS_ENABLED", False)
+    await client.put("/api/v1/content/3", json={"title": "Offline", "values": [{"field_id": body_id, "value": "x"}]})
+    monkeypatch.setattr(config, "CONTENT_DOCUMENTS_ENABLED", True)
+    assert (await client.get("/api/v1/content/3")).json()["title"] == "Offline"
+
+    async with TestingSessionLocal() as db:
+        await db.execute(text("DELETE FROM content_documents WHERE item_id = 1"))
+        await db.execute(text("UPDATE content_documents SET document = '{}' WHERE item_id = 2"))
+        await db.execute(text("INSERT INTO content_documents (item_id, version, document) VALUES (99, NULL, '{}')"))
+        await db.commit()
+
+        result = await documents.check(db)
+        assert (result.checked, result.missing, result.mismatched, result.orphaned) == (4, [1, 3], [2], [99])
+
+        # Values changed by hand leave the document behind, which reads then skip
+        await db.execute(text("UPDATE content_values SET value = '\"By hand\"' WHERE item_id = 4"))
+        await db.commit()
+        assert (await documents.check(db)).missing == [1, 3, 4]
+        assert not (await documents.check(db, repair=True)).ok
+        assert (await documents.check(db)).ok
+
+        await db.execute(text("DELETE FROM content_documents"))
+        await db.commit()
+        assert await documents.rebuild(db, batch_size=3) == 4
+        assert (await documents.check(db)).ok
+    assert (await client.get("/api/v1/content/3")).json()["title"] == "Offline"
+    assert (await client.get("/api/v1/content/4")).json()["values"][0]["value"] == "By hand"
+
+    # A template change keeps the documents of the items it changes current
+    response = await client.post(f"/api/v1/templates/{template_id}/changes", json={"operations": [
+        {"op": "add", "field": {"name": "Category", "data_type": "Text", "required": False}, "default": "News"},
+    ]})
+    assert response.status_code == 202, response.text
+    runner = template_changes.TemplateChangeRunner(session_factory=TestingSessionLocal, duty_cycle=1)
+    assert await runner.run_pending() == 1
+    async with TestingSessionLocal() as db:
+        assert (await documents.check(db)).ok
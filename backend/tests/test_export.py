@@ -0,0 +1,71 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+from httpx import AsyncClient
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.usefixtures("both_read_models")]
+
+async def create_template_with_items(client: AsyncClient, name: str, titles):
+    template_data = {
+        "name": name,
+        "description": f"{name} template",
+        "fields": [
+            {"name": "Body", "data_type": "Rich Text", "required": True},
+            {"name": "Author", "data_type": "Text", "required": True},
+        ]
+    }
+    response = await client.post("/api/v1/templates/", json=template_data)
+    assert response.status_code == 200, response.text
+    template = response.json()
+    field_ids = {field["name"]: field["id"] for field in template["fields"]}
+
+    for title in titles:
+        content_data = {
+            "title": title,
+            "template_id": template["id"],
+            "values": [
+                {"field_id": field_ids["Body"], "value": f"Body of {title}"},
+                {"field_id": field_ids["Author"], "value": "Jules"},
+            ]
+        }
+        response = await client.post("/api/v1/content/", json=content_data)
+        assert response.status_code == 200, response.text
+    return template
+
+async def test_export_tar_archive(client: AsyncClient):
+    """
+    Tests that the bulk export streams a tar archive containing one Markdown file per item.
+    """
+    await create_template_with_items(client, "Blog Post", ["Hello World", "Second Post"])
+    await create_template_with_items(client, "Landing Page", ["Home"])
+
+    response = await client.get("/api/v1/export", params={"format": "tar"})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/x-tar"
+
+    with tarfile.open(fileobj=io.BytesIO(response.content)) as archive:
+        names = sorted(archive.getnames())
+        assert names == ["blog-post/hello-world-1.md", "blog-post/second-post-2.md", "landing-page/home-3.md"]
+        markdown = archive.extractfile("landing-page/home-3.md").read().decode("utf-8")
+
+    assert markdown.startswith("---\ntitle: Home\n")
+    assert markdown.endswith("---\n\nBody of Home")
+
+async def test_export_zip_archive_filtered_by_template(client: AsyncClient):
+    """
+    Tests the zip export format and filtering by template.
+    """
+    await create_template_with_items(client, "Blog Post", ["Hello World"])
+    landing = await create_template_with_items(client, "Landing Page", ["Home", "About"])
+
+    response = await client.get("/api/v1/export", params={"format": "zip", "template_id": landing["id"]})
+    assert response.status_code == 200, response.text
+
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert sorted(archive.namelist()) == ["landing-page/about-3.md", "landing-page/home-2.md"]
+
+async def test_export_rejects_unknown_format(client: AsyncClient):
+    response = await client.get("/api/v1/export", params={"format": "rar"})
+    assert response.status_code == 400
@@ -0,0 +1,79 @@
+import json
+import pathlib
+import random
+
+import pytest
+import yaml
+
+import frontmatter
+
+GOLDEN_DIR = pathlib.Path(__file__).parent / "golden"
+GOLDEN_CASES = sorted(path.stem for path in GOLDEN_DIR.glob("*.json"))
+
+
+def reference_dump(data):
+    # The pure-Python dumper, which the Markdown generator used before frontmatter existed
+    return yaml.dump(data, default_flow_style=False, sort_keys=False, allow_unicode=True)
+
+
+def load_case(name):
+    with open(GOLDEN_DIR / f"{name}.json", encoding="utf-8") as case_file:
+        return json.load(case_file)
+
+
+def read_golden(name, extension):
+    with open(GOLDEN_DIR / f"{name}.{extension}", encoding="utf-8", newline="") as golden_file:
+        return golden_file.read()
+
+
+@pytest.mark.parametrize("name", GOLDEN_CASES)
+def test_yaml_matches_golden_file(name):
+    data = load_case(name)
+    expected = read_golden(name, "yaml")
+    assert frontmatter.dump_yaml(data) == expected
+    assert reference_dump(data) == expected
+
+
+@pytest.mark.parametrize("name", GOLDEN_CASES)
+def test_toml_matches_golden_file(name):
+    assert frontmatter.dump_toml(load_case(name)) == read_golden(name, "toml")
+
+
+def test_toml_quotes_keys_that_are_not_bare():
+    assert frontmatter.dump_toml({"Y\n": 1, "ok-key_2": 2}) == '"Y\\n" = 1\nok-key_2 = 2\n'
+
+
+def test_toml_refuses_null_list_entries():
+    assert frontmatter.dump_toml({"Empty": None, "Image": {"alt": None, "src": "a.png"}}) == 'Image = { src = "a.png" }\n'
+    with pytest.raises(frontmatter.FrontMatterError):
+        frontmatter.dump_toml({"Tags": ["a", None, "b"]})
+
+
+def test_shared_lists_keep_anchors():
+    tags = ["a", "b"]
+    data = {"Tags": tags, "Categories": tags}
+    assert frontmatter.dump_yaml(data) == reference_dump(data)
+    assert "&id001" in frontmatter.dump_yaml(data)
+
+
+def test_yaml_matches_reference_dumper_on_random_front_matter():
+    rng = random.Random(13)
+    alphabet = "ab Z09:#-'\",[]{}!&*?|>%@`\\._/()+=~;$\t\n\x85\x7f\u2028\ufeff\xe9\u6771\U0001f680"
+    words = ["yes", "No", "null", "~", "123", "1.5", "1e3", "0x1F", "2024-01-02", "2024-01-02T03:04:05",
+             "12:30", ".inf", "<<", "=", "", "https://example.com/a?b=1#c", "C#", "Note:", "a: b", "a #b"]
+
+    def text():
+        if rng.random() < 0.3:
+            return rng.choice(words)
+        return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, rng.choice([5, 20, 90]))))
+
+    for _ in range(2000):
+        data = {
+            "title": text(),
+            text(): [text(), rng.randint(-3, 3), None, True, {text(): text()}],
+            "k" * rng.randint(118, 130): text(),
+            # libyaml limits simple keys by bytes rather than characters
+            rng.choice(["\u30bf\u30a4\u30c8\u30eb\u306e\u8aac\u660e\u6587", "\xe9t\xe9"]) * rng.randint(2, 20): rng.choice([1.5, text()]),
+            text(): rng.choice([None, 1, 2.5, False, text(), [], {}, {text(): [text()]}]),
+        }
+        assert frontmatter.dump_yaml(data) == reference_dump(data), data
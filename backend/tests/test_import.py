@@ -0,0 +1,109 @@
+import json
+
+import pytest
+from httpx import AsyncClient
+
+import config, importer, jobs
+from .conftest import TestingSessionLocal
+
+pytestmark = pytest.mark.asyncio
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+async def test_import_directory_creates_templates_fields_and_items(client: AsyncClient, tmp_path):
+    """
+    Tests importing front matter and bodies, inferring templates and resuming from a checkpoint.
+    """
+    source = tmp_path / "site"
+    write(source / "posts" / "hello.md", "---\ntitle: Hello\ndate: 2024-01-02T03:04:05\nAuthor: Jules\ntags:\n- a\n- b\n---\n\nHello **world**")
+    write(source / "posts" / "second.md", "---\ntitle: Second\nDraft: true\n---\n\nSecond body")
+    write(source / "pages" / "about.md", "No front matter here")
+    write(source / "broken.md", "---\ntitle: [unclosed\n---\n")
+    checkpoint = tmp_path / "checkpoint.json"
+
+    async with TestingSessionLocal() as db:
+        result = await importer.import_directory(db, str(source), checkpoint_path=str(checkpoint), workers=1)
+    assert (result.imported, result.failed, result.templates_created) == (3, 1, 2)
+    assert result.errors[0]["path"] == "broken.md"
+    assert len(json.loads(checkpoint.read_text())["completed"]) == 3
+
+    response = await client.get("/api/v1/templates/", params={"name_prefix": "posts"})
+    posts = response.json()[0]
+    assert {field["name"]: field["data_type"] for field in posts["fields"]} == {
+        "Body": "Rich Text", "Author": "Text", "tags": "Tags", "Draft": "Boolean",
+    }
+
+    response = await client.get("/api/v1/content/search", params={"q": "Hello"})
+    item_id = response.json()[0]["id"]
+    markdown = (await client.get(f"/api/v1/content/{item_id}/markdown")).text
+    assert markdown.startswith("---\ntitle: Hello\ndate: '2024-01-02T03:04:05'\n")
+    assert markdown.endswith("---\n\nHello **world**")
+
+    # A second run resumes from the checkpoint and only retries the failed file
+    write(source / "posts" / "third.md", "---\ntitle: Third\n---\n\nThird")
+    async with TestingSessionLocal() as db:
+        result = await importer.import_directory(db, str(source), checkpoint_path=str(checkpoint), workers=1)
+    assert (result.imported, result.skipped, result.failed, result.templates_created) == (1, 3, 1, 0)
+
+async def test_import_directory_checks_front_matter(client: AsyncClient, tmp_path):
+    """
+    Tests that dates with a time zone are stored in UTC, and that front matter that
+    does not fit a content item fails its file only.
+    """
+    source = tmp_path / "site"
+    write(source / "posts" / "zoned.md", "---\ntitle: Zoned\ndate: 2024-01-02T03:04:05+02:00\n---\n\nZoned")
+    write(source / "posts" / "body.md", "---\ntitle: Body\nBody: Front matter body\n---\n\nReal body")
+    write(source / "posts" / "numbered.md", "---\ntitle: Numbered\ntemplate: 5\n---\n\nNumbered")
+
+    async with TestingSessionLocal() as db:
+        result = await importer.import_directory(db, str(source), workers=1)
+    assert (result.imported, result.failed) == (1, 2)
+    assert {error["path"]: error["error"] for error in result.errors} == {
+        "posts/body.md": "Front matter key 'Body' clashes with the body field",
+        "posts/numbered.md": "The template must be a string, not int",
+    }
+    item = (await client.get("/api/v1/content/")).json()[0]
+    assert item["created_at"].startswith("2024-01-02T01:04:05")
+
+async def test_import_endpoint_is_confined_to_import_root(client: AsyncClient, tmp_path, monkeypatch):
+    response = await client.post("/api/v1/import", json={"path": "."})
+    assert response.status_code == 403
+
+    monkeypatch.setattr(config, "IMPORT_ROOT", str(tmp_path))
+    monkeypatch.setattr(config, "IMPORT_WORKERS", 1)
+    response = await client.post("/api/v1/import", json={"path": "../.."})
+    assert response.status_code == 400
+
+    write(tmp_path / "notes" / "one.md", "---\ntitle: One\n---\n\nBody")
+    response = await client.post("/api/v1/import", json={"path": "notes", "template": "Note"})
+    assert response.status_code == 202, response.text
+    job_id = response.json()["id"]
+
+    # The import runs as a job
+    monkeypatch.setattr(config, "JOB_OUTPUT_DIR", str(tmp_path / "jobs"))
+    assert await jobs.JobPool(session_factory=TestingSessionLocal, read_session_factory=TestingSessionLocal, duty_cycle=1).run_pending() == 1
+    job = (await client.get(f"/api/v1/jobs/{job_id}")).json()
+    assert (job["status"], job["progress"], job["total"]) == ("completed", 1, 1)
+    assert job["result"]["imported"] == 1
+
+async def test_import_directory_validates_against_template(client: AsyncClient, tmp_path):
+    """
+    Tests that imported items are validated like items created through the API, and
+    that only the first errors are listed.
+    """
+    await client.post("/api/v1/templates/", json={"name": "events", "fields": [
+        {"name": "Body", "data_type": "Rich Text", "required": False},
+        {"name": "Seats", "data_type": "Number", "required": True},
+    ]})
+    source = tmp_path / "site"
+    write(source / "events" / "valid.md", "---\ntitle: Valid\nSeats: 10\n---\n\nValid")
+    write(source / "events" / "text.md", "---\ntitle: Text\nSeats: many\n---\n\nText")
+    write(source / "events" / "missing.md", "---\ntitle: Missing\n---\n\nMissing")
+
+    async with TestingSessionLocal() as db:
+        result = await importer.import_directory(db, str(source), workers=1, max_errors=1)
+    assert (result.imported, result.failed) == (1, 2)
+    assert result.errors == [{"path": "events/missing.md", "error": "Missing required field 'Seats'"}]
+    assert [item["title"] for item in (await client.get("/api/v1/content/")).json()] == ["Valid"]
@@ -0,0 +1,355 @@
+import asyncio
+import dataclasses
+import datetime
+import io
+import tarfile
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from starlette.requests import ClientDisconnect
+
+import config, jobs, models, schemas
+from database import create_engine_for_url
+from routers import export as export_router
+from .conftest import TEST_DATABASE_URL, TestingSessionLocal
+
+pytestmark = pytest.mark.asyncio
+
+@pytest.fixture
+def job_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "JOB_OUTPUT_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setattr(config, "BUILD_ROOT", str(tmp_path / "builds"))
+    return tmp_path
+
+def pool(**kwargs):
+    kwargs.setdefault("duty_cycle", 1)
+    return jobs.JobPool(session_factory=TestingSessionLocal, read_session_factory=TestingSessionLocal, **kwargs)
+
+async def seed(client: AsyncClient, item_count: int):
+    response = await client.post("/api/v1/templates/", json={"name": "Post", "fields": [
+        {"name": "Body", "data_type": "Rich Text", "required": True},
+    ]})
+    body_id = response.json()["fields"][0]["id"]
+    await client.post("/api/v1/content/batch", json=[
+        {"title": f"Post {n}", "template_id": 1, "values": [{"field_id": body_id, "value": f"Body {n}"}]}
+        for n in range(item_count)
+    ])
+
+async def test_export_and_build_jobs(client: AsyncClient, job_dirs):
+    """
+    Tests that jobs run by priority, report their progress and results, and that an
+    export job writes the same archive as the streamed export.
+    """
+    await seed(client, 5)
+    build = (await client.post("/api/v1/jobs/", json={"type": "build", "params": {"output": "site"}})).json()
+    response = await client.post("/api/v1/jobs/", json={"type": "export", "params": {"format": "tar"}, "priority": 5})
+    assert response.status_code == 202, response.text
+    export = response.json()
+    assert (export["status"], export["progress"], export["attempts"]) == ("pending", 0, 0)
+    assert (await client.get(f"/api/v1/jobs/{export['id']}/archive")).status_code == 409
+
+    assert await pool(workers=1).run_next() == export["id"]
+    export = (await client.get(f"/api/v1/jobs/{export['id']}")).json()
+    assert (export["status"], export["progress"], export["total"], export["attempts"]) == ("completed", 5, 5, 1)
+    archive = (await client.get(f"/api/v1/jobs/{export['id']}/archive")).content
+    assert archive == (await client.get("/api/v1/export")).content
+    assert len(tarfile.open(fileobj=io.BytesIO(archive)).getnames()) == 5
+
+    assert await pool().run_pending() == 1
+    build = (await client.get(f"/api/v1/jobs/{build['id']}")).json()
+    assert build["status"] == "completed"
+    assert build["result"] == {"written": 5, "unchanged": 0, "deleted": 0}
+    assert len(list((job_dirs / "builds" / "site" / "post").iterdir())) == 5
+    assert [job["type"] for job in (await client.get("/api/v1/jobs/", params={"status": "completed"})).json()] == ["export", "build"]
+
+async def test_invalid_jobs_are_rejected(client: AsyncClient, job_dirs, monkeypatch):
+    invalid = [
+        ({"type": "backup"}, 400),
+        ({"type": "export", "params": {"format": "rar"}}, 400),
+        ({"type": "build", "params": {}}, 400),
+        ({"type": "build", "params": {"output": "../outside"}}, 400),
+        ({"type": "import", "params": {"path": "."}}, 403),
+    ]
+    for job, status_code in invalid:
+        assert (await client.post("/api/v1/jobs/", json=job)).status_code == status_code, job
+
+    monkeypatch.setattr(config, "JOB_MAX_QUEUED", 1)
+    assert (await client.post("/api/v1/jobs/", json={"type": "export"})).status_code == 202
+    assert (await client.post("/api/v1/jobs/", json={"type": "export"})).status_code == 429
+
+@pytest.fixture
+def waiting_job(monkeypatch):
+    """
+    Registers a job type that reports progress until it is released.
+    """
+    release = asyncio.Event()
+
+    async def run(context, params):
+        batches = 0
+        while not release.is_set():
+            batches += 1
+            await context.progress(batches)
+            await asyncio.sleep(0.01)
+        return {"batches": batches}
+
+    monkeypatch.setitem(jobs.JOB_TYPES, "wait", jobs.JobType("wait", schemas.BuildJobParams, run, heavy=False))
+    return release
+
+async def submit_waiting_job() -> int:
+    async with TestingSessionLocal() as db:
+        return (await jobs.submit(db, schemas.JobCreate(type="wait", params={"output": "-"}))).id
+
+async def test_cancelling_jobs(client: AsyncClient, waiting_job):
+    """
+    Tests that queued jobs are cancelled at once, and running ones after their current
+    batch, whether they run in this process or in another.
+    """
+    job_pool = pool()
+
+    queued = await submit_waiting_job()
+    assert (await client.post(f"/api/v1/jobs/{queued}/cancel")).json()["status"] == "cancelled"
+    assert (await client.post(f"/api/v1/jobs/{queued}/cancel")).status_code == 409
+    assert (await client.post("/api/v1/jobs/999/cancel")).status_code == 404
+    assert (await client.get("/api/v1/jobs/", params={"limit": 1001})).status_code == 422
+
+    # A job running in this process stops at its next progress report
+    running = await submit_waiting_job()
+    task = asyncio.create_task(job_pool.run_next())
+    while (await client.get(f"/api/v1/jobs/{running}")).json()["progress"] < 2:
+        await asyncio.sleep(0.01)
+    response = await client.post(f"/api/v1/jobs/{running}/cancel")
+    assert response.json()["cancel_requested"] is True
+    cancelled_at = response.json()["progress"]
+    assert await task == running
+    job = (await client.get(f"/api/v1/jobs/{running}")).json()
+    assert job["status"] == "cancelled" and job["progress"] in (cancelled_at, cancelled_at + 1)
+
+    # A job running elsewhere stops at its next progress report
+    remote = await submit_waiting_job()
+    task = asyncio.create_task(job_pool.run_next())
+    while (await client.get(f"/api/v1/jobs/{remote}")).json()["status"] != "running":
+        await asyncio.sleep(0.01)
+    async with TestingSessionLocal() as db:
+        await db.execute(update(models.Job).where(models.Job.id == remote).values(cancel_requested=True))
+        await db.commit()
+    assert await task == remote
+    job = (await client.get(f"/api/v1/jobs/{remote}")).json()
+    assert (job["status"], job["result"]) == ("cancelled", None)
+
+async def test_interrupted_jobs_are_resumed(client: AsyncClient, waiting_job):
+    """
+    Tests that jobs left running by a stopped process are started again, until they
+    have been started too often, and that a stopping pool queues its jobs again.
+    """
+    waiting_job.set()
+    interrupted, crashing = await submit_waiting_job(), await submit_waiting_job()
+    async with TestingSessionLocal() as db:
+        await db.execute(update(models.Job).where(models.Job.id == interrupted).values(status="running", attempts=1))
+        await db.execute(update(models.Job).where(models.Job.id == crashing).values(status="running", attempts=3))
+        await db.commit()
+
+    assert await pool(max_attempts=3).run_pending() == 2
+    job = (await client.get(f"/api/v1/jobs/{interrupted}")).json()
+    assert (job["status"], job["attempts"], job["result"]) == ("completed", 2, {"batches": 0})
+    job = (await client.get(f"/api/v1/jobs/{crashing}")).json()
+    assert (job["status"], job["error"]) == ("failed", "Interrupted 3 times")
+
+    waiting_job.clear()
+    job_pool = pool(workers=1, poll_interval=0.01)
+    stopped = await submit_waiting_job()
+    job_pool.start()
+    while (await client.get(f"/api/v1/jobs/{stopped}")).json()["progress"] < 1:
+        await asyncio.sleep(0.01)
+    await job_pool.stop()
+    job = (await client.get(f"/api/v1/jobs/{stopped}")).json()
+    assert (job["status"], job["worker_id"], job["heartbeat_at"]) == ("pending", None, None)
+
+    waiting_job.set()
+    assert await pool().run_pending() == 1
+    assert (await client.get(f"/api/v1/jobs/{stopped}")).json()["status"] == "completed"
+
+async def test_only_jobs_with_stale_heartbeats_are_recovered(client: AsyncClient, waiting_job, monkeypatch):
+    """
+    Tests that a pool leaves the jobs other processes are running alone while their
+    heartbeat is fresh, refreshes the heartbeat of its own jobs, and stops a job that
+    was queued again while it ran without touching it.
+    """
+    waiting_job.set()
+    alive, abandoned = await submit_waiting_job(), await submit_waiting_job()
+    now = datetime.datetime.utcnow()
+    async with TestingSessionLocal() as db:
+        await db.execute(update(models.Job).where(models.Job.id == alive).values(
+            status="running", attempts=1, worker_id="other", heartbeat_at=now,
+        ))
+        await db.execute(update(models.Job).where(models.Job.id == abandoned).values(
+            status="running", attempts=1, worker_id="gone", heartbeat_at=now - datetime.timedelta(seconds=120),
+        ))
+        await db.commit()
+
+    assert await pool(heartbeat_timeout=60).run_pending() == 1
+    job = (await client.get(f"/api/v1/jobs/{alive}")).json()
+    assert (job["status"], job["worker_id"], job["attempts"]) == ("running", "other", 1)
+    job = (await client.get(f"/api/v1/jobs/{abandoned}")).json()
+    assert (job["status"], job["attempts"]) == ("completed", 2)
+
+    # A job queued again and taken over by another pool stops at its next progress
+    # report, and leaves the job to that pool
+    waiting_job.clear()
+    taken_over = await submit_waiting_job()
+    task = asyncio.create_task(pool().run_next())
+    while (await client.get(f"/api/v1/jobs/{taken_over}")).json()["progress"] < 1:
+        await asyncio.sleep(0.01)
+    async with TestingSessionLocal() as db:
+        await db.execute(update(models.Job).where(models.Job.id == taken_over).values(worker_id="other"))
+        await db.commit()
+    assert await task == taken_over
+    job = (await client.get(f"/api/v1/jobs/{taken_over}")).json()
+    assert (job["status"], job["worker_id"]) == ("running", "other")
+
+    # A job between progress reports keeps its heartbeat fresh
+    release = asyncio.Event()
+
+    async def run_silently(context, params):
+        await release.wait()
+        return {}
+
+    monkeypatch.setitem(jobs.JOB_TYPES, "wait", jobs.JobType("wait", schemas.BuildJobParams, run_silently, heavy=False))
+    job_pool = pool(heartbeat_timeout=0.06, worker_id="this")
+    silent = await submit_waiting_job()
+    task = asyncio.create_task(job_pool.run_next())
+    while (await client.get(f"/api/v1/jobs/{silent}")).json()["status"] != "running":
+        await asyncio.sleep(0.01)
+    started = (await client.get(f"/api/v1/jobs/{silent}")).json()
+    await asyncio.sleep(0.1)
+    job = (await client.get(f"/api/v1/jobs/{silent}")).json()
+    assert job["worker_id"] == "this" and job["heartbeat_at"] > started["heartbeat_at"]
+    await job_pool.recover()
+    assert (await client.get(f"/api/v1/jobs/{silent}")).json()["status"] == "running"
+    release.set()
+    assert await task == silent
+    assert (await client.get(f"/api/v1/jobs/{silent}")).json()["status"] == "completed"
+
+async def test_paused_jobs_give_up_their_slot(client: AsyncClient, waiting_job, monkeypatch):
+    """
+    Tests that a heavy job lets other heavy operations run while it pauses between
+    batches, and waits its turn for a slot to go on.
+    """
+    monkeypatch.setitem(jobs.JOB_TYPES, "wait", dataclasses.replace(jobs.JOB_TYPES["wait"], heavy=True))
+    admission = jobs.AdmissionControl(slots=1)
+    job_id = await submit_waiting_job()
+    task = asyncio.create_task(pool(duty_cycle=0.1, admission_control=admission).run_next())
+    while (await client.get(f"/api/v1/jobs/{job_id}")).json()["progress"] < 1:
+        await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(admission.acquire(), 1)
+    progress = (await client.get(f"/api/v1/jobs/{job_id}")).json()["progress"]
+    await asyncio.sleep(0.3)
+    # The job does not go on while the slot is taken
+    assert (await client.get(f"/api/v1/jobs/{job_id}")).json()["progress"] == progress
+    waiting_job.set()
+    admission.release()
+    assert await task == job_id
+    assert (await client.get(f"/api/v1/jobs/{job_id}")).json()["status"] == "completed"
+    assert admission.in_use == 0
+
+async def test_admission_control(client: AsyncClient, job_dirs, monkeypatch):
+    """
+    Tests that heavy operations wait for, or are refused, a slot while all are in use.
+    """
+    admission = jobs.AdmissionControl(slots=1)
+    monkeypatch.setattr(jobs, "admission", admission)
+    await seed(client, 2)
+    export = (await client.post("/api/v1/jobs/", json={"type": "export"})).json()
+
+    await admission.acquire()
+    # No heavy job is started, and streamed exports are refused
+    assert await pool(admission_control=admission).run_pending() == 0
+    response = await client.get("/api/v1/export")
+    assert (response.status_code, response.headers["retry-after"]) == (503, "30")
+
+    order = []
+    async def wait(name):
+        async with admission.slot():
+            order.append(name)
+    waiters = [asyncio.create_task(wait(name)) for name in ("first", "second")]
+    await asyncio.sleep(0)
+    cancelled = asyncio.create_task(wait("cancelled"))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    admission.release()
+    await asyncio.gather(*waiters)
+    assert order == ["first", "second"] and admission.in_use == 0
+
+    assert (await client.get("/api/v1/export")).status_code == 200
+    assert admission.in_use == 0
+    assert await pool(admission_control=admission).run_pending() == 1
+    assert (await client.get(f"/api/v1/jobs/{export['id']}")).json()["status"] == "completed"
+
+async def send_export(admission, fail_on: str) -> list:
+    """
+    Gets the streamed export response and sends it to a client that goes away when it
+    is sent the message of type `fail_on`. Returns the types of the messages sent.
+    """
+    scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "method": "GET"}
+    sent = []
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message["type"])
+        if message["type"] == fail_on:
+            raise OSError("Connection reset by peer")
+
+    async with TestingSessionLocal() as db:
+        response = await export_router.export_site(
+            format="tar", template_id=None, created_after=None, created_before=None, front_matter="yaml", db=db,
+        )
+        assert admission.in_use == 1
+        with pytest.raises(ClientDisconnect):
+            await response(scope, receive, send)
+    return sent
+
+async def test_abandoned_exports_release_their_slot(client: AsyncClient, monkeypatch):
+    """
+    Tests that a streamed export gives its admission slot back when its client goes
+    away before the response starts, or before it has read the body.
+    """
+    admission = jobs.AdmissionControl(slots=1)
+    monkeypatch.setattr(jobs, "admission", admission)
+    await seed(client, 2)
+
+    assert await send_export(admission, "http.response.start") == ["http.response.start"]
+    assert admission.in_use == 0
+    assert await send_export(admission, "http.response.body") == ["http.response.start", "http.response.body"]
+    assert admission.in_use == 0
+    assert (await client.get("/api/v1/export")).status_code == 200
+    assert admission.in_use == 0
+
+async def test_import_job_with_single_writer_connection(client: AsyncClient, job_dirs, monkeypatch):
+    """
+    Tests that an import job does not wait on its own writer connection when it
+    reports progress, with the single-connection writer pool used on SQLite.
+    """
+    monkeypatch.setattr(config, "DB_POOL_TIMEOUT", 1)
+    monkeypatch.setattr(config, "IMPORT_ROOT", str(job_dirs))
+    monkeypatch.setattr(config, "IMPORT_WORKERS", 1)
+    source = job_dirs / "notes"
+    source.mkdir()
+    (source / "broken.md").write_text("---\ntitle: [unclosed\n---\n", encoding="utf-8")
+    (source / "unterminated.md").write_text("---\ntitle: Open\n", encoding="utf-8")
+
+    writer = create_engine_for_url(TEST_DATABASE_URL, pool_size=1, max_overflow=0)
+    session_factory = async_sessionmaker(autocommit=False, autoflush=False, bind=writer)
+    try:
+        async with session_factory() as db:
+            job_id = (await jobs.submit(db, schemas.JobCreate(type="import", params={"path": "notes", "template": "Note"}))).id
+        job_pool = jobs.JobPool(session_factory=session_factory, read_session_factory=TestingSessionLocal, duty_cycle=1)
+        assert await job_pool.run_pending() == 1
+    finally:
+        await writer.dispose()
+    job = (await client.get(f"/api/v1/jobs/{job_id}")).json()
+    assert (job["status"], job["progress"], job["total"]) == ("completed", 2, 2), job["error"]
+    assert (job["result"]["imported"], job["result"]["failed"]) == (0, 2)
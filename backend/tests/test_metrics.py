@@ -0,0 +1,96 @@
+import re
+import threading
+import time
+
+import pytest
+from httpx import AsyncClient
+
+import config, instrumentation, metrics, profiling
+
+def sample(text: str, name: str, **labels) -> float:
+    """
+    Returns the value of one sample of the /metrics output.
+    """
+    label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    series = f"{name}{{{label_text}}}" if labels else name
+    match = re.search(rf"^{re.escape(series)} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(client: AsyncClient):
+    """
+    Tests that requests are counted and timed per route, and that render times and
+    cache hits are reported in the Prometheus text format.
+    """
+    await client.post("/api/v1/templates/", json={"name": "Post", "fields": [{"name": "Body", "data_type": "Rich Text"}]})
+    await client.post("/api/v1/content/", json={"title": "First", "template_id": 1, "values": [{"field_id": 1, "value": "Hi"}]})
+    before = (await client.get("/metrics")).text
+
+    for _ in range(3):
+        assert (await client.get("/api/v1/content/1/markdown")).status_code == 200
+    assert (await client.get("/api/v1/content/999")).status_code == 404
+
+    response = await client.get("/metrics")
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE
+    after = response.text
+    route = {"method": "GET", "route": "/api/v1/content/{item_id}/markdown"}
+
+    def increase(name, **labels):
+        return sample(after, name, **labels) - sample(before, name, **labels)
+
+    assert increase("http_request_duration_seconds_count", **route) == 3
+    assert increase("http_request_duration_seconds_bucket", **route, le="+Inf") == 3
+    assert increase("http_requests_total", **route, status="200") == 3
+    assert increase("http_requests_total", method="GET", route="/api/v1/content/{item_id}", status="404") == 1
+    # The first request reads the item and renders it, the others are served from the render cache
+    assert increase("http_request_db_queries_total", **route) >= 3
+    assert increase("markdown_render_seconds_count") == 1
+    assert increase("render_cache_misses_total") == 1
+    assert increase("render_cache_hits_total") == 2
+    assert "# TYPE http_request_duration_seconds histogram" in after
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("test_seconds", "Test.", ("kind",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 5):
+        histogram.observe(value, 'say "hi"')
+    assert list(histogram.samples()) == [
+        'test_seconds_bucket{kind="say \\"hi\\"",le="0.1"} 2',
+        'test_seconds_bucket{kind="say \\"hi\\"",le="1.0"} 3',
+        'test_seconds_bucket{kind="say \\"hi\\"",le="+Inf"} 4',
+        'test_seconds_sum{kind="say \\"hi\\""} 5.65',
+        'test_seconds_count{kind="say \\"hi\\""} 4',
+    ]
+
+def busy(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def test_sampling_profiler_collapses_stacks():
+    profiler = profiling.SamplingProfiler(threading.get_ident(), 0.001)
+    profiler.start()
+    busy(0.1)
+    profiler.stop()
+
+    assert profiler.samples > 0
+    lines = profiler.collapsed().splitlines()
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == profiler.samples
+    assert any(";busy (tests/test_metrics.py:" in line for line in lines)
+
+@pytest.mark.asyncio
+async def test_profile_header(client: AsyncClient, monkeypatch):
+    """
+    Tests that the profile header is ignored unless the debug endpoints are enabled,
+    and otherwise replaces the response by its profile.
+    """
+    response = await client.get("/api/v1/templates/", headers={"X-Profile": "1"})
+    assert response.headers["content-type"] == "application/json"
+
+    monkeypatch.setattr(instrumentation, "DEBUG_ENDPOINTS_ENABLED", True)
+    monkeypatch.setattr(config, "PROFILE_SAMPLE_INTERVAL", 0.0001)
+    response = await client.get("/api/v1/templates/", headers={"X-Profile": "1"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert response.headers["x-profile-status"] == "200"
+    assert "x-db-query-count" in response.headers
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in response.text.splitlines()) == int(response.headers["x-profile-samples"])
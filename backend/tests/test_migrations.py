@@ -0,0 +1,130 @@
+import datetime
+
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import migrations, search
+from database import Base
+
+pytestmark = pytest.mark.asyncio
+
+
+def describe_schema(connection):
+    inspector = inspect(connection)
+    schema = {}
+    for table in inspector.get_table_names():
+        if table == migrations.VERSION_TABLE:
+            continue
+        schema[table] = {
+            "columns": {
+                column["name"]: (str(column["type"]), column["nullable"]) for column in inspector.get_columns(table)
+            },
+            "indexes": sorted(
+                (index["name"], tuple(index["column_names"]), bool(index["unique"]))
+                for index in inspector.get_indexes(table)
+            ),
+            "foreign_keys": sorted(
+                (tuple(key["constrained_columns"]), key["referred_table"], tuple(key["referred_columns"]))
+                for key in inspector.get_foreign_keys(table)
+            ),
+        }
+    schema["triggers"] = sorted(connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger'").scalars())
+    return schema
+
+
+@pytest.fixture
+async def make_engine(tmp_path):
+    engines = []
+
+    def make(name):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}")
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        await engine.dispose()
+
+
+async def test_migrations_create_the_schema_of_the_models(make_engine):
+    migrated, created = make_engine("migrated.db"), make_engine("created.db")
+    applied = await migrations.migrate(migrated)
+    assert [step.version for step in applied] == list(range(1, migrations.HEAD + 1))
+    async with created.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with migrated.connect() as conn:
+        migrated_schema = await conn.run_sync(describe_schema)
+    async with created.connect() as conn:
+        created_schema = await conn.run_sync(describe_schema)
+    assert migrated_schema == created_schema
+
+    # Nothing is left to apply, and the startup check passes
+    assert await migrations.migrate(migrated) == []
+    await migrations.check(migrated)
+
+
+async def test_database_created_before_migrations_is_upgraded(make_engine):
+    """
+    Tests upgrading a database created by create_all before any of the later changes,
+    with content already in it.
+    """
+    engine = make_engine("legacy.db")
+    await migrations.migrate(engine, target=1)
+    created_at = datetime.datetime(2024, 5, 1, 12, 0)
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP TABLE {migrations.VERSION_TABLE}"))
+        await conn.execute(text("INSERT INTO page_templates (id, name) VALUES (1, 'Post')"))
+        await conn.execute(text(
+            "INSERT INTO template_fields (id, name, data_type, required, template_id) "
+            "VALUES (1, 'Body', 'Rich Text', 1, 1)"
+        ))
+        await conn.execute(
+            text("INSERT INTO content_items (id, title, created_at, template_id) VALUES (1, 'Hello', :created_at, 1)"),
+            {"created_at": created_at},
+        )
+        await conn.execute(text("INSERT INTO content_values (item_id, field_id, value) VALUES (1, 1, '\"Old words\"')"))
+
+    with pytest.raises(migrations.SchemaVersionError, match="version 0"):
+        await migrations.check(engine)
+
+    steps = []
+    await migrations.migrate(engine, progress=steps.append)
+    assert [step.version for step in steps] == list(range(1, migrations.HEAD + 1))
+    await migrations.check(engine)
+
+    async with AsyncSession(engine) as db:
+        assert await migrations.current_version(db) == migrations.HEAD
+        updated_at = (await db.execute(text("SELECT updated_at FROM content_items"))).scalar()
+        assert updated_at == created_at.isoformat(" ")
+        # Existing content is searchable
+        assert [row["id"] for row in await search.search_content(db, "words")] == [1]
+
+
+async def test_content_items_are_versioned_by_the_database(make_engine):
+    """
+    Tests that existing items start at version 1 once content documents are added, and
+    that the database bumps the version on every write to an item or its values.
+    """
+    engine = make_engine("documents.db")
+    await migrations.migrate(engine, target=7)
+    async with engine.begin() as conn:
+        await conn.execute(text("INSERT INTO page_templates (id, name) VALUES (1, 'Post')"))
+        await conn.execute(text(
+            "INSERT INTO template_fields (id, name, data_type, required, template_id) VALUES (1, 'Body', 'Rich Text', 1, 1)"
+        ))
+        for item_id in (1, 2):
+            await conn.execute(text(
+                "INSERT INTO content_items (id, title, updated_at, template_id) VALUES (:id, 'Hello', '2024-05-01 12:00:00', 1)"
+            ), {"id": item_id})
+
+    await migrations.migrate(engine)
+    async with engine.begin() as conn:
+        assert (await conn.execute(text("SELECT id, version FROM content_items ORDER BY id"))).all() == [(1, 1), (2, 1)]
+        await conn.execute(text("INSERT INTO content_values (item_id, field_id, value) VALUES (1, 1, '\"Words\"')"))
+        await conn.execute(text("UPDATE content_values SET value = '\"Other words\"'"))
+        await conn.execute(text("UPDATE content_items SET title = 'Renamed' WHERE id = 1"))
+        await conn.execute(text("UPDATE content_items SET updated_at = NULL WHERE id = 2"))
+        await conn.execute(text("DELETE FROM content_values"))
+        assert (await conn.execute(text("SELECT id, version FROM content_items ORDER BY id"))).all() == [(1, 5), (2, 1)]
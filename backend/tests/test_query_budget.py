@@ -0,0 +1,92 @@
+import pytest
+from httpx import AsyncClient
+
+import instrumentation
+
+pytestmark = pytest.mark.asyncio
+
+async def seed(client: AsyncClient, item_count: int):
+    response = await client.post("/api/v1/templates/", json={
+        "name": "Post",
+        "fields": [
+            {"name": "Body", "data_type": "Rich Text", "required": True},
+            {"name": "Author", "data_type": "Text", "required": True},
+            {"name": "Tags", "data_type": "Tags", "required": True},
+        ]
+    })
+    template = response.json()
+    body_id, author_id, tags_id = (field["id"] for field in template["fields"])
+    batch = [
+        {"title": f"Post {n}", "template_id": template["id"], "values": [
+            {"field_id": body_id, "value": f"Body {n}"},
+            {"field_id": author_id, "value": "Jules"},
+            {"field_id": tags_id, "value": ["a", "b"]},
+        ]}
+        for n in range(item_count)
+    ]
+    await client.post("/api/v1/content/batch", json=batch)
+    return template["id"]
+
+async def query_count(client: AsyncClient, method: str, url: str, **kwargs) -> int:
+    response = await client.request(method, url, **kwargs)
+    assert response.status_code == 200, response.text
+    return int(response.headers["x-db-query-count"])
+
+# The maximum number of SQL statements each endpoint may run, regardless of data size.
+QUERY_BUDGETS = {
+    "list_content": 2,
+    "list_templates": 2,
+    "read_content": 2,
+    "read_template": 2,
+    "markdown": 3,
+}
+
+async def test_endpoints_stay_within_query_budget(client: AsyncClient):
+    """
+    Tests that list and detail endpoints run a fixed number of queries, independent of row count.
+    """
+    template_id = await seed(client, 1)
+    small = {
+        "list_content": await query_count(client, "GET", "/api/v1/content/"),
+        "list_templates": await query_count(client, "GET", "/api/v1/templates/"),
+    }
+
+    await seed_more(client, template_id, 24)
+    counts = {
+        "list_content": await query_count(client, "GET", "/api/v1/content/"),
+        "list_templates": await query_count(client, "GET", "/api/v1/templates/"),
+        "read_content": await query_count(client, "GET", "/api/v1/content/1"),
+        "read_template": await query_count(client, "GET", f"/api/v1/templates/{template_id}"),
+        "markdown": await query_count(client, "GET", "/api/v1/content/1/markdown"),
+    }
+
+    for endpoint, budget in QUERY_BUDGETS.items():
+        assert counts[endpoint] <= budget, f"{endpoint} ran {counts[endpoint]} queries, budget is {budget}"
+    # Listing 25 items costs the same as listing one
+    assert counts["list_content"] == small["list_content"]
+    assert counts["list_templates"] == small["list_templates"]
+
+async def seed_more(client: AsyncClient, template_id: int, item_count: int):
+    template = (await client.get(f"/api/v1/templates/{template_id}")).json()
+    batch = [
+        {"title": f"More {n}", "template_id": template_id, "values": [
+            {"field_id": field["id"], "value": ["x"] if field["data_type"] == "Tags" else "x"}
+            for field in template["fields"]
+        ]}
+        for n in range(item_count)
+    ]
+    response = await client.post("/api/v1/content/batch", json=batch)
+    assert len(response.json()["created"]) == item_count
+
+async def test_debug_endpoint_reports_recent_requests(client: AsyncClient, monkeypatch):
+    response = await client.get("/api/v1/debug/queries")
+    assert response.status_code == 404
+
+    monkeypatch.setattr(instrumentation, "DEBUG_ENDPOINTS_ENABLED", True)
+    await client.get("/api/v1/templates/")
+    response = await client.get("/api/v1/debug/queries")
+    assert response.status_code == 200
+    latest = response.json()[0]
+    assert latest["path"] == "/api/v1/templates/"
+    assert latest["query_count"] >= 1
+    assert latest["slowest"][0]["statement"].startswith("SELECT")
@@ -0,0 +1,121 @@
+import asyncio
+import concurrent.futures
+import datetime
+import multiprocessing
+import os
+
+import pytest
+
+import datatypes, models, services
+from render_pool import ItemSnapshot, RenderExecutor, pipeline
+from schema_cache import TemplateSchema
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_items(count, data_type="Text"):
+    template = models.PageTemplate(id=1, name="Post", fields=[
+        models.TemplateField(id=1, name="Body", data_type="Rich Text", required=True),
+        models.TemplateField(id=2, name="Extra", data_type=data_type, required=True),
+    ])
+    items = [
+        models.ContentItem(
+            id=n, title=f"Item {n}", template_id=1, created_at=datetime.datetime(2024, 1, 1, 0, 0, n % 60),
+            values=[models.ContentValue(field_id=1, value=f"Body {n}"), models.ContentValue(field_id=2, value=n)],
+        )
+        for n in range(count)
+    ]
+    return {1: TemplateSchema.from_template(template, 0)}, items
+
+
+async def test_pool_renders_snapshots_like_inline_rendering():
+    templates, items = make_items(25)
+    expected = [services.generate_markdown_from_item(item, templates[1], "toml") for item in items]
+    snapshots = [ItemSnapshot.from_item(item) for item in items]
+
+    executor = RenderExecutor(workers=2)
+    try:
+        assert await executor.render_many(snapshots, templates, "toml") == expected
+    finally:
+        executor.shutdown()
+    assert await RenderExecutor(workers=0).render_many(snapshots, templates, "toml") == expected
+
+
+async def test_unpicklable_data_types_are_rendered_inline():
+    datatypes.register_data_type(datatypes.DataType("Stars", datatypes.get_data_type("Number").validate,
+                                                    serialize=lambda value: "*" * value))
+    executor = RenderExecutor(workers=1)
+    try:
+        templates, items = make_items(3, data_type="Stars")
+        rendered = await executor.render_many([ItemSnapshot.from_item(item) for item in items], templates)
+        assert "Extra: '**'" in rendered[2]
+    finally:
+        executor.shutdown()
+        datatypes._registry.pop("Stars")
+
+
+def fail_in_worker(value):
+    if multiprocessing.parent_process() is not None:
+        raise TypeError("Not a number")
+    return str(value)
+
+
+def exit_worker(value):
+    os._exit(1)
+
+
+@pytest.fixture
+def serializer(request):
+    """
+    Registers a "Custom" data type with the given serializer.
+    """
+    datatypes.register_data_type(datatypes.DataType("Custom", datatypes.get_data_type("Number").validate,
+                                                    serialize=request.param))
+    yield
+    datatypes._registry.pop("Custom")
+
+
+@pytest.mark.parametrize("serializer", [fail_in_worker], indirect=True)
+async def test_worker_errors_are_raised(serializer):
+    """
+    Tests that an error in a worker is raised rather than hidden by rendering inline.
+    """
+    executor = RenderExecutor(workers=2)
+    try:
+        templates, items = make_items(4, data_type="Custom")
+        with pytest.raises(TypeError, match="Not a number"):
+            await executor.render_many([ItemSnapshot.from_item(item) for item in items], templates)
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.parametrize("serializer", [exit_worker], indirect=True)
+async def test_pool_is_restarted_after_a_worker_dies(serializer):
+    executor = RenderExecutor(workers=1)
+    try:
+        templates, items = make_items(2, data_type="Custom")
+        with pytest.raises(concurrent.futures.process.BrokenProcessPool):
+            await executor.render_many([ItemSnapshot.from_item(item) for item in items], templates)
+        templates, items = make_items(2)
+        rendered = await executor.render_many([ItemSnapshot.from_item(item) for item in items], templates)
+        assert "Extra: 1" in rendered[1]
+    finally:
+        executor.shutdown()
+
+
+async def test_pipeline_keeps_order_and_renders_ahead():
+    started = []
+
+    async def batches():
+        for n in range(4):
+            yield n
+            # By the time the next batch is fetched, the previous one is being rendered
+            await asyncio.sleep(0)
+            assert n in started
+
+    async def render(batch):
+        started.append(batch)
+        await asyncio.sleep(0.01 * (4 - batch))
+        return batch * 10
+
+    assert [pair async for pair in pipeline(batches(), render)] == [(0, 0), (1, 10), (2, 20), (3, 30)]
@@ -0,0 +1,148 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+import models, revisions
+from .conftest import TestingSessionLocal
+
+pytestmark = pytest.mark.asyncio
+
+async def create_post(client: AsyncClient):
+    response = await client.post("/api/v1/templates/", json={
+        "name": "Post",
+        "fields": [
+            {"name": "Body", "data_type": "Rich Text", "required": True},
+            {"name": "Author", "data_type": "Text", "required": False},
+            {"name": "Tags", "data_type": "Tags", "required": False},
+        ],
+    })
+    field_ids = {field["name"]: field["id"] for field in response.json()["fields"]}
+    response = await client.post("/api/v1/content/", json={
+        "title": "Draft",
+        "template_id": response.json()["id"],
+        "values": [
+            {"field_id": field_ids["Body"], "value": "First body"},
+            {"field_id": field_ids["Author"], "value": "Jules"},
+        ],
+    })
+    return response.json()["id"], field_ids
+
+async def test_updates_record_revisions_with_keyframes(client: AsyncClient, monkeypatch):
+    """
+    Tests that every update appends a delta revision, with periodic keyframes, and that
+    each revision renders exactly as the item did at the time.
+    """
+    monkeypatch.setattr(revisions, "KEYFRAME_INTERVAL", 3)
+    item_id, field_ids = await create_post(client)
+    rendered = [(await client.get(f"/api/v1/content/{item_id}/markdown")).text]
+
+    for n in range(2, 6):
+        response = await client.put(f"/api/v1/content/{item_id}", json={
+            "title": "Published" if n >= 3 else "Draft",
+            "values": [
+                {"field_id": field_ids["Body"], "value": f"Body {n}"},
+                {"field_id": field_ids["Author"], "value": "Jules"},
+                {"field_id": field_ids["Tags"], "value": ["news"]},
+            ][:3 if n % 2 else 2],
+        })
+        assert response.status_code == 200, response.text
+        rendered.append((await client.get(f"/api/v1/content/{item_id}/markdown")).text)
+    assert "Body 5" in rendered[-1] and "title: Published" in rendered[-1]
+
+    # Saving the same content again records nothing
+    response = await client.put(f"/api/v1/content/{item_id}", json={
+        "title": "Published",
+        "values": [
+            {"field_id": field_ids["Body"], "value": "Body 5"},
+            {"field_id": field_ids["Author"], "value": "Jules"},
+            {"field_id": field_ids["Tags"], "value": ["news"]},
+        ],
+    })
+    assert response.status_code == 200
+
+    response = await client.get(f"/api/v1/content/{item_id}/revisions")
+    listed = response.json()
+    assert [revision["number"] for revision in listed] == [1, 2, 3, 4, 5]
+    assert [revision["keyframe"] for revision in listed] == [True, False, False, True, False]
+    assert listed[2]["title_changed"] and listed[2]["changed_field_ids"] == [field_ids["Body"], field_ids["Tags"]]
+    assert listed[3]["removed_field_ids"] == [field_ids["Tags"]]
+
+    for number, expected in enumerate(rendered, start=1):
+        response = await client.get(f"/api/v1/content/{item_id}/revisions/{number}/markdown")
+        assert response.status_code == 200
+        assert response.text == expected
+
+    # Only the delta rows store changes; keyframes hold the full item
+    async with TestingSessionLocal() as db:
+        rows = (await db.execute(
+            select(models.ContentRevision.number, models.ContentRevision.data)
+            .filter(models.ContentRevision.item_id == item_id)
+            .order_by(models.ContentRevision.number)
+        )).all()
+    assert rows[1].data == {"values": {str(field_ids["Body"]): "Body 2"}}
+    assert set(rows[3].data) == {"title", "values"}
+
+async def test_changing_the_keyframe_interval_keeps_history_readable(client: AsyncClient, monkeypatch):
+    """
+    Tests that revisions written under one keyframe interval are reconstructed from
+    their stored keyframes after the interval changes.
+    """
+    monkeypatch.setattr(revisions, "KEYFRAME_INTERVAL", 10)
+    item_id, field_ids = await create_post(client)
+    rendered = [(await client.get(f"/api/v1/content/{item_id}/markdown")).text]
+
+    async def update(n):
+        response = await client.put(f"/api/v1/content/{item_id}", json={
+            "title": "Draft", "values": [{"field_id": field_ids["Body"], "value": f"Body {n}"}],
+        })
+        assert response.status_code == 200, response.text
+        rendered.append((await client.get(f"/api/v1/content/{item_id}/markdown")).text)
+
+    for n in range(2, 8):
+        await update(n)
+    monkeypatch.setattr(revisions, "KEYFRAME_INTERVAL", 5)
+    for n in range(8, 10):
+        await update(n)
+
+    listed = (await client.get(f"/api/v1/content/{item_id}/revisions")).json()
+    # Revision 6 stays a delta; revision 8 is the first more than 5 after a stored keyframe
+    assert [revision["number"] for revision in listed if revision["keyframe"]] == [1, 8]
+    for number, expected in enumerate(rendered, start=1):
+        response = await client.get(f"/api/v1/content/{item_id}/revisions/{number}/markdown")
+        assert response.status_code == 200, number
+        assert response.text == expected
+
+async def test_diff_between_revisions(client: AsyncClient):
+    """
+    Tests the field-level diff of two revisions and the error cases of the revision endpoints.
+    """
+    item_id, field_ids = await create_post(client)
+    response = await client.put(f"/api/v1/content/{item_id}", json={
+        "title": "Final",
+        "values": [
+            {"field_id": field_ids["Body"], "value": "Second body"},
+            {"field_id": field_ids["Tags"], "value": ["a"]},
+        ],
+    })
+    assert response.status_code == 200, response.text
+
+    response = await client.get(f"/api/v1/content/{item_id}/revisions/diff", params={"from": 1, "to": 2})
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["title"] == {"old": "Draft", "new": "Final"}
+    assert [(change["field_name"], change["change"]) for change in result["changes"]] == [
+        ("Body", "changed"), ("Tags", "added"), ("Author", "removed"),
+    ]
+    assert result["changes"][0]["old"] == "First body" and result["changes"][0]["new"] == "Second body"
+
+    response = await client.get(f"/api/v1/content/{item_id}/revisions/diff", params={"from": 1, "to": 3})
+    assert response.status_code == 404
+    response = await client.get(f"/api/v1/content/{item_id}/revisions/0/markdown")
+    assert response.status_code == 404
+    response = await client.get("/api/v1/content/999/revisions")
+    assert response.status_code == 404
+
+    # Updates are validated like creates
+    response = await client.put(f"/api/v1/content/{item_id}", json={"title": "Bad", "values": []})
+    assert response.status_code == 400
+    assert "Missing required field 'Body'" in response.json()["detail"]
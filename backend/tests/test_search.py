@@ -0,0 +1,79 @@
+import pytest
+from httpx import AsyncClient
+
+import search
+from .conftest import TestingSessionLocal
+
+pytestmark = pytest.mark.asyncio
+
+async def create_posts(client: AsyncClient, template_name: str, posts):
+    response = await client.post("/api/v1/templates/", json={
+        "name": template_name,
+        "fields": [
+            {"name": "Body", "data_type": "Rich Text", "required": True},
+            {"name": "Tags", "data_type": "Tags", "required": True},
+        ]
+    })
+    template = response.json()
+    body_id, tags_id = (field["id"] for field in template["fields"])
+    batch = [
+        {"title": title, "template_id": template["id"], "values": [
+            {"field_id": body_id, "value": body},
+            {"field_id": tags_id, "value": tags},
+        ]}
+        for title, body, tags in posts
+    ]
+    response = await client.post("/api/v1/content/batch", json=batch)
+    assert response.status_code == 200, response.text
+    return template["id"]
+
+async def test_search_ranks_title_matches_first(client: AsyncClient):
+    """
+    Tests ranking, snippets, tag matches and template filtering of full-text search.
+    """
+    blog_id = await create_posts(client, "Blog Post", [
+        ("Baking bread", "Sourdough needs patience.", ["food"]),
+        ("Weekend notes", "We baked sourdough bread and went hiking.", ["life"]),
+    ])
+    await create_posts(client, "Recipe", [
+        ("Bread rolls", "Soft bread rolls.", ["bread"]),
+    ])
+
+    response = await client.get("/api/v1/content/search", params={"q": "bread"})
+    assert response.status_code == 200, response.text
+    results = response.json()
+    assert len(results) == 3
+    assert results[-1]["title"] == "Weekend notes"
+    assert "<mark>bread</mark>" in results[-1]["snippet"]
+
+    response = await client.get("/api/v1/content/search", params={"q": "bread", "template_id": blog_id})
+    assert [result["title"] for result in response.json()] == ["Baking bread", "Weekend notes"]
+
+    response = await client.get("/api/v1/content/search", params={"q": "hik*"})
+    assert [result["title"] for result in response.json()] == ["Weekend notes"]
+
+    # FTS5 syntax in the query is treated as plain text
+    response = await client.get("/api/v1/content/search", params={"q": '"life'})
+    assert response.status_code == 200
+    assert [result["title"] for result in response.json()] == ["Weekend notes"]
+
+async def test_rebuild_search_index(client: AsyncClient):
+    await create_posts(client, "Blog Post", [("Hello", "World", [])])
+
+    async with TestingSessionLocal() as db:
+        assert await search.rebuild_index(db) == 1
+        results = await search.search_content(db, "world")
+    assert [result["title"] for result in results] == ["Hello"]
+
+async def test_title_match_fallback_treats_wildcards_as_text(client: AsyncClient, monkeypatch):
+    """
+    Tests the title match used without FTS5, where LIKE wildcards in the query must
+    match only themselves.
+    """
+    await create_posts(client, "Blog Post", [("100% rye", "", []), ("1000 rolls", "", []), ("snake_case", "", [])])
+    monkeypatch.setattr(search, "is_supported", lambda db: False)
+
+    async with TestingSessionLocal() as db:
+        assert [result["title"] for result in await search.search_content(db, "100%")] == ["100% rye"]
+        assert [result["title"] for result in await search.search_content(db, "e_c")] == ["snake_case"]
+        assert await search.search_content(db, "k_c") == []
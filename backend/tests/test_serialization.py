@@ -0,0 +1,47 @@
+import datetime
+import json
+
+import pytest
+from starlette.requests import Request
+
+import serialization
+
+ROWS = [
+    {
+        "id": 1,
+        "title": "Café 東京 \U0001f680 \"quoted\" \\ \n",
+        "created_at": datetime.datetime(2024, 1, 2, 3, 4, 5, 678901),
+        "values": [{"field_id": 2, "value": [1, 2.5, -0.0, 0.1, 12345.678, None, True, {"nested": ["a"]}]}],
+    },
+    {"id": 2, "title": "", "created_at": datetime.datetime(2024, 1, 2), "values": []},
+]
+
+
+@pytest.mark.parametrize("encoder", ["orjson", "json"])
+def test_encoders_produce_the_same_json(encoder, monkeypatch):
+    expected = json.dumps(ROWS, default=lambda value: value.isoformat(), ensure_ascii=False, separators=(",", ":"))
+    if encoder == "orjson":
+        assert serialization.orjson is not None, "orjson is listed in requirements.txt"
+    else:
+        monkeypatch.setattr(serialization, "orjson", None)
+    encoded = serialization.dumps(ROWS)
+    assert encoded == expected.encode()
+    assert serialization.loads(encoded)[0]["title"] == ROWS[0]["title"]
+    # Exponents are written differently, e.g. 1e16 and 1e+16, but read back the same
+    assert serialization.loads(serialization.dumps([1e-07, 1e16])) == [1e-07, 1e16]
+
+
+@pytest.mark.parametrize("accept, ndjson", [
+    ("application/x-ndjson", True),
+    ("application/json, application/x-ndjson", True),
+    ("Application/X-NDJSON; charset=utf-8", True),
+    ("application/x-ndjson;q=0", False),
+    ("application/x-ndjson; q=0.5, application/json", False),
+    ("application/x-ndjson;q=0.5, */*;q=0.1", True),
+    ("application/x-ndjson-seq", False),
+    ("*/*", False),
+    ("", False),
+])
+def test_wants_ndjson_parses_the_accept_header(accept, ndjson):
+    request = Request({"type": "http", "headers": [(b"accept", accept.encode())]})
+    assert serialization.wants_ndjson(request) is ndjson
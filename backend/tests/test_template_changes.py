@@ -0,0 +1,181 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.future import select
+
+import changes, cli, config, models, revisions, search, template_changes
+from .conftest import TestingSessionLocal
+
+pytestmark = pytest.mark.asyncio
+
+async def seed(client: AsyncClient, item_count: int):
+    response = await client.post("/api/v1/templates/", json={
+        "name": "Post",
+        "fields": [
+            {"name": "Body", "data_type": "Rich Text", "required": True},
+            {"name": "Author", "data_type": "Text", "required": True},
+            {"name": "Legacy", "data_type": "Text", "required": False},
+        ]
+    })
+    template = response.json()
+    body_id, author_id, legacy_id = (field["id"] for field in template["fields"])
+    response = await client.post("/api/v1/content/batch", json=[
+        {"title": f"Post {n}", "template_id": template["id"], "values": [
+            {"field_id": body_id, "value": f"Body {n}"},
+            {"field_id": author_id, "value": "Jules"},
+            {"field_id": legacy_id, "value": "obsolete"},
+        ]}
+        for n in range(item_count)
+    ])
+    assert len(response.json()["created"]) == item_count
+    return template["id"], body_id, author_id, legacy_id
+
+def runner(**kwargs):
+    return template_changes.TemplateChangeRunner(session_factory=TestingSessionLocal, duty_cycle=1, **kwargs)
+
+async def test_template_change_is_carried_over_to_content(client: AsyncClient):
+    """
+    Tests that adding, renaming and removing fields changes the template at once, and
+    that the job backfills defaults, deletes removed values and records each change.
+    """
+    template_id, body_id, author_id, legacy_id = await seed(client, 5)
+    async with TestingSessionLocal() as db:
+        since = await changes.latest_event_id(db)
+
+    response = await client.post(f"/api/v1/templates/{template_id}/changes", json={"operations": [
+        {"op": "add", "field": {"name": "Category", "data_type": "Text", "required": False}, "default": "News"},
+        {"op": "rename", "field_id": author_id, "name": "Writer"},
+        {"op": "remove", "field_id": legacy_id},
+    ]})
+    assert response.status_code == 202, response.text
+    job = response.json()
+    assert (job["status"], job["total"], job["processed"]) == ("pending", 5, 0)
+    category_id = job["operations"][0]["field_id"]
+
+    # The template changes before its content does
+    fields = (await client.get(f"/api/v1/templates/{template_id}")).json()["fields"]
+    assert [field["name"] for field in fields] == ["Body", "Writer", "Category"]
+    markdown = (await client.get("/api/v1/content/1/markdown")).text
+    assert "Writer: Jules" in markdown and "obsolete" not in markdown
+    # Writing back an item read before the change drops the removed field's value
+    item = (await client.get("/api/v1/content/1")).json()
+    response = await client.put("/api/v1/content/1", json={
+        "title": "Edited", "values": [{"field_id": value["field_id"], "value": value["value"]} for value in item["values"]],
+    })
+    assert response.status_code == 200, response.text
+    assert legacy_id not in [value["field_id"] for value in response.json()["values"]]
+
+    assert await runner(batch_size=2).run_pending() == 1
+
+    job = (await client.get(f"/api/v1/templates/{template_id}/changes/{job['id']}")).json()
+    assert (job["status"], job["processed"], job["invalid"]) == ("completed", 5, 0)
+    for item_id in range(1, 6):
+        values = {value["field_id"]: value["value"] for value in (await client.get(f"/api/v1/content/{item_id}")).json()["values"]}
+        assert values == {body_id: f"Body {item_id - 1}", author_id: "Jules", category_id: "News"}
+    assert "Category: News" in (await client.get("/api/v1/content/2/markdown")).text
+    assert (await client.get("/api/v1/content/search", params={"q": "obsolete"})).json() == []
+
+    revisions = (await client.get("/api/v1/content/2/revisions")).json()
+    assert revisions[-1]["changed_field_ids"] == [category_id]
+    assert revisions[-1]["removed_field_ids"] == [legacy_id]
+    feed = (await client.get("/api/v1/changes", params={"since": since})).json()["events"]
+    updated = {event["entity_id"] for event in feed if event["entity"] == "content_item"}
+    assert updated == {1, 2, 3, 4, 5}
+
+    # The removed field is gone once no value refers to it
+    async with TestingSessionLocal() as db:
+        assert await db.get(models.TemplateField, legacy_id) is None
+    assert len((await client.get(f"/api/v1/templates/{template_id}/changes")).json()) == 1
+
+async def test_template_change_resumes_and_reports_invalid_items(client: AsyncClient):
+    """
+    Tests that a job stopped between batches resumes after its last batch, and that
+    items left invalid by the change are reported.
+    """
+    template_id, *_ = await seed(client, 5)
+    response = await client.post(f"/api/v1/templates/{template_id}/changes", json={"operations": [
+        {"op": "add", "field": {"name": "Summary", "data_type": "Text", "required": True}},
+    ]})
+    job_id = response.json()["id"]
+
+    assert await runner(batch_size=2, max_errors=2).run_batch(job_id) is False
+    job = (await client.get(f"/api/v1/templates/{template_id}/changes/{job_id}")).json()
+    assert (job["status"], job["processed"]) == ("running", 2)
+
+    # A new runner, as after a restart, continues after the last committed batch
+    assert await runner(batch_size=2, max_errors=2).run_pending() == 1
+    job = (await client.get(f"/api/v1/templates/{template_id}/changes/{job_id}")).json()
+    assert (job["status"], job["processed"], job["invalid"]) == ("completed", 5, 5)
+    assert job["validation_errors"] == [
+        {"item_id": 1, "errors": ["Missing required field 'Summary'"]},
+        {"item_id": 2, "errors": ["Missing required field 'Summary'"]},
+    ]
+    async with TestingSessionLocal() as db:
+        later_revisions = (await db.execute(
+            select(models.ContentRevision.item_id).filter(models.ContentRevision.number > 1)
+        )).scalars().all()
+    # Nothing was backfilled, so no item changed
+    assert later_revisions == []
+
+async def test_late_values_of_removed_fields_are_carried_over(client: AsyncClient):
+    """
+    Tests that values of a removed field written after their item's batch, by a
+    process that had not seen the change, are removed like those of a batch.
+    """
+    template_id, body_id, author_id, legacy_id = await seed(client, 2)
+    response = await client.post(f"/api/v1/templates/{template_id}/changes", json={"operations": [
+        {"op": "remove", "field_id": legacy_id},
+    ]})
+    job_id = response.json()["id"]
+    assert await runner(batch_size=10).run_batch(job_id) is False
+
+    async with TestingSessionLocal() as db:
+        db.add(models.ContentValue(item_id=1, field_id=legacy_id, value="straggling"))
+        await db.flush()
+        await search.index_items(db, [1])
+        old = revisions.RevisionState("Post 0", {body_id: "Body 0", author_id: "Jules"})
+        await revisions.record_change(db, 1, old, revisions.RevisionState(old.title, {**old.values, legacy_id: "straggling"}))
+        await db.commit()
+        since = await changes.latest_event_id(db)
+    assert len((await client.get("/api/v1/content/search", params={"q": "straggling"})).json()) == 1
+
+    assert await runner(batch_size=10).run_batch(job_id) is True
+    assert (await client.get("/api/v1/content/search", params={"q": "straggling"})).json() == []
+    listed = (await client.get("/api/v1/content/1/revisions")).json()
+    assert listed[-1]["removed_field_ids"] == [legacy_id]
+    feed = (await client.get("/api/v1/changes", params={"since": since})).json()["events"]
+    assert [(event["entity"], event["entity_id"]) for event in feed] == [("content_item", 1)]
+    values = (await client.get("/api/v1/content/1")).json()["values"]
+    assert {value["field_id"] for value in values} == {body_id, author_id}
+
+async def test_invalid_template_changes_are_rejected(client: AsyncClient):
+    """
+    Tests that a change with an invalid operation is rejected as a whole.
+    """
+    template_id, body_id, author_id, _ = await seed(client, 1)
+    invalid = [
+        [{"op": "add", "field": {"name": "Author", "data_type": "Text"}}],
+        [{"op": "add", "field": {"name": "Seats", "data_type": "Number"}, "default": "many"}],
+        [{"op": "rename", "field_id": 999, "name": "Writer"}],
+        [{"op": "rename", "field_id": author_id, "name": "Writer"}, {"op": "rename", "field_id": body_id, "name": "Writer"}],
+        [{"op": "remove", "field_id": author_id}, {"op": "remove", "field_id": author_id}],
+        [{"op": "remove"}],
+    ]
+    for operations in invalid:
+        response = await client.post(f"/api/v1/templates/{template_id}/changes", json={"operations": operations})
+        assert response.status_code == 400, operations
+
+    fields = (await client.get(f"/api/v1/templates/{template_id}")).json()["fields"]
+    assert [field["name"] for field in fields] == ["Body", "Author", "Legacy"]
+    assert (await client.get(f"/api/v1/templates/{template_id}/changes")).json() == []
+    response = await client.post("/api/v1/templates/999/changes", json={"operations": []})
+    assert response.status_code == 404
+
+async def test_duty_cycle_must_be_a_fraction():
+    assert config.duty_cycle("1") == 1.0
+    for value in ("0", "-0.5", "1.5", "nan"):
+        with pytest.raises(ValueError, match="duty cycle"):
+            config.duty_cycle(value)
+    with pytest.raises(ValueError):
+        template_changes.TemplateChangeRunner(duty_cycle=0)
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(["template-changes", "--duty-cycle", "0"])
@@ -1,3 +1,5 @@
+import json
+
 import pytest
 from httpx import AsyncClient
 
@@ -53,3 +55,49 @@ async def test_create_duplicate_template_fails(client: AsyncClient):
     response = await client.post("/api/v1/templates/", json=template_data)
     assert response.status_code == 400, response.text
     assert "already exists" in response.json()["detail"]
+
+async def test_create_templates_batch(client: AsyncClient):
+    """
+    Tests that a template batch is created in one go and that name clashes are reported per item.
+    """
+    response = await client.post("/api/v1/templates/", json={"name": "Existing", "fields": []})
+    assert response.status_code == 200, response.text
+
+    batch = [
+        {"name": "Post", "fields": [{"name": "Body", "data_type": "Rich Text"}]},
+        {"name": "Existing", "fields": []},
+        {"name": "Page", "fields": [{"name": "Body", "data_type": "Rich Text"}, {"name": "Hero", "data_type": "Text"}]},
+        {"name": "Post", "fields": []},
+    ]
+    response = await client.post("/api/v1/templates/batch", json=batch)
+    assert response.status_code == 200, response.text
+    result = response.json()
+
+    assert [created["index"] for created in result["created"]] == [0, 2]
+    assert [error["index"] for error in result["errors"]] == [1, 3]
+
+    page_id = result["created"][1]["id"]
+    response = await client.get(f"/api/v1/templates/{page_id}")
+    assert response.json()["name"] == "Page"
+    assert [field["name"] for field in response.json()["fields"]] == ["Body", "Hero"]
+
+async def test_list_templates_with_cursor(client: AsyncClient):
+    """
+    Tests keyset pagination and name prefix filtering of the template list.
+    """
+    await client.post("/api/v1/templates/batch", json=[{"name": name, "fields": []} for name in ["A1", "A2", "A3", "B1"]])
+
+    response = await client.get("/api/v1/templates/", params={"limit": 2, "name_prefix": "A", "include_total": True})
+    assert [template["name"] for template in response.json()] == ["A1", "A2"]
+    assert response.headers["x-total-count"] == "3"
+
+    response = await client.get("/api/v1/templates/", params={"limit": 2, "cursor": response.headers["x-next-cursor"], "name_prefix": "A"})
+    assert [template["name"] for template in response.json()] == ["A3"]
+    assert "x-next-cursor" not in response.headers
+
+    # Streamed as NDJSON, with the cursor of the same page
+    response = await client.get("/api/v1/templates/", params={"limit": 3}, headers={"Accept": "application/x-ndjson"})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == (await client.get("/api/v1/templates/", params={"limit": 3})).json()
+    response = await client.get("/api/v1/templates/", params={"limit": 2, "cursor": response.headers["x-next-cursor"]}, headers={"Accept": "application/x-ndjson"})
+    assert [json.loads(line)["name"] for line in response.text.splitlines()] == ["B1"]
@@ -0,0 +1,182 @@
+"""
+Delivery of change events to registered webhooks.
+
+The dispatcher runs as a background task of the application. When events are
+recorded, and every CHANGES_POLL_INTERVAL seconds to catch events written by other
+processes, it POSTs each active webhook the events after its `last_event_id`, up to
+WEBHOOK_BATCH_SIZE per request:
+
+    {"webhook_id": 1, "events": [{"id": 42, "entity": "content_item", "entity_id": 7,
+                                  "action": "updated", "created_at": "..."}]}
+
+A 2xx response advances the webhook's cursor. Any other response, or a connection
+error, is retried after 1, 2, 4, ... seconds (up to WEBHOOK_MAX_BACKOFF) while later
+events wait, so every receiver gets all events, in order, at least once. Requests to
+webhooks with a secret carry an `X-Webhook-Signature: sha256=<hex>` header, the
+HMAC-SHA256 of the body.
+
+Webhooks are delivered to concurrently over one pooled HTTP client, and no database
+connection is held while waiting for a receiver.
+"""
+import asyncio
+import datetime
+import hashlib
+import hmac
+import json
+import logging
+from typing import TYPE_CHECKING, Optional
+
+from sqlalchemy import update
+from sqlalchemy.future import select
+
+import changes, config, models, schemas
+from database import SessionLocal
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = "X-Webhook-Signature"
+
+
+def sign(secret: str, body: bytes) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+class WebhookDispatcher:
+    """
+    Delivers change events to webhooks, either continuously with start() or one round at
+    a time with dispatch().
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        client: Optional["httpx.AsyncClient"] = None,
+        batch_size: int = config.WEBHOOK_BATCH_SIZE,
+        max_backoff: float = config.WEBHOOK_MAX_BACKOFF,
+        poll_interval: float = config.CHANGES_POLL_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self._client = client
+        self._owns_client = client is None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            # httpx is a sizeable share of the application's import time, and most
+            # processes never deliver a webhook, so it is only imported when needed
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                timeout=config.WEBHOOK_TIMEOUT,
+                limits=httpx.Limits(max_connections=config.WEBHOOK_MAX_CONNECTIONS),
+            )
+        return self._client
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def run(self):
+        while True:
+            try:
+                retry_at = await self.dispatch()
+            except Exception:
+                logger.exception("Webhook dispatch failed")
+                retry_at = None
+            timeout = self.poll_interval
+            if retry_at is not None:
+                until_retry = (retry_at - datetime.datetime.utcnow()).total_seconds()
+                timeout = max(0.0, min(timeout, until_retry))
+            await changes.wait(timeout)
+
+    def backoff(self, failures: int) -> float:
+        return min(self.max_backoff, 2.0 ** (failures - 1))
+
+    async def dispatch(self) -> Optional[datetime.datetime]:
+        """
+        Delivers pending events to every active webhook that is not waiting to retry.
+
+        Returns the earliest time a failed delivery should be retried, or None if no
+        delivery is waiting to be retried.
+        """
+        now = datetime.datetime.utcnow()
+        async with self.session_factory() as db:
+            webhooks = (await db.execute(
+                select(models.Webhook).filter(models.Webhook.active.is_(True))
+            )).scalars().all()
+            latest = await changes.latest_event_id(db)
+
+        pending = [webhook for webhook in webhooks if webhook.last_event_id < latest]
+        due = [webhook for webhook in pending if webhook.next_attempt_at is None or webhook.next_attempt_at <= now]
+        retries = [webhook.next_attempt_at for webhook in pending if webhook not in due]
+        retries.extend(await asyncio.gather(*(self._deliver(webhook) for webhook in due)))
+        retries = [retry_at for retry_at in retries if retry_at is not None]
+        return min(retries, default=None)
+
+    async def _deliver(self, webhook: models.Webhook) -> Optional[datetime.datetime]:
+        """
+        Sends a webhook its pending events in batches until they are delivered or a
+        request fails. Returns the time to retry at if a request failed.
+        """
+        import httpx
+
+        cursor = webhook.last_event_id
+        while True:
+            async with self.session_factory() as db:
+                events = await changes.get_changes(db, cursor, self.batch_size)
+            if not events:
+                return None
+
+            body = json.dumps({
+                "webhook_id": webhook.id,
+                "events": [schemas.ChangeEvent.model_validate(event).model_dump(mode="json") for event in events],
+            }).encode()
+            headers = {"Content-Type": "application/json"}
+            if webhook.secret:
+                headers[SIGNATURE_HEADER] = sign(webhook.secret, body)
+
+            try:
+                response = await self.client.post(webhook.url, content=body, headers=headers)
+                error = None if response.is_success else f"HTTP {response.status_code}"
+            except httpx.HTTPError as exc:
+                error = f"{type(exc).__name__}: {exc}"
+
+            if error is not None:
+                failures = webhook.failures + 1
+                retry_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=self.backoff(failures))
+                await self._update(webhook, failures=failures, next_attempt_at=retry_at, last_error=error)
+                return retry_at
+
+            cursor = events[-1].id
+            await self._update(webhook, last_event_id=cursor, failures=0, next_attempt_at=None, last_error=None)
+            if len(events) < self.batch_size:
+                return None
+
+    async def _update(self, webhook: models.Webhook, **values):
+        async with self.session_factory() as db:
+            await db.execute(update(models.Webhook).where(models.Webhook.id == webhook.id).values(**values))
+            await db.commit()
+        for name, value in values.items():
+            setattr(webhook, name, value)
+
+
+dispatcher = WebhookDispatcher()